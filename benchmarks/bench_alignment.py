@@ -0,0 +1,102 @@
+"""
+benchmark alignment.align_ranges_bilou against
+alignment.align_tokens_and_annotations_bilou
+on long documents with paragraph-length spans,
+and alignment.align_batch against a per-document loop
+on many short documents
+
+run from the top of the repository with
+
+    python benchmarks/bench_alignment.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import random
+import timeit
+
+from typing import List, Tuple
+
+from label_alignment import alignment
+from label_alignment.simple_tokenizers import wss_tokenizer
+from label_alignment.types import LabeledSpan
+
+
+def synthetic_document(n_paragraphs : int, words_per_paragraph : int,
+        seed : int = 5) -> Tuple[str, List[LabeledSpan]]:
+    """
+    text made of random words, with one span covering most of
+    each paragraph and a few short spans inside it
+    """
+    rng = random.Random(seed)
+    vocab = ['whereas', 'party', 'agreement', 'shall', 'the', 'of',
+            'hereinafter', 'pursuant', 'section', 'clause', 'notwithstanding']
+    chunks : List[str] = []
+    spans : List[LabeledSpan] = []
+    offset = 0
+    for p in range(n_paragraphs):
+        words = [rng.choice(vocab) for i in range(words_per_paragraph)]
+        paragraph = ' '.join(words)
+        spans.append(LabeledSpan(start=offset + len(words[0]) + 1,
+            end=offset + len(paragraph), label='CLAUSE'))
+        for i in range(3):
+            start = offset + rng.randrange(len(paragraph) - 20)
+            spans.append(LabeledSpan(start=start, end=start + 15,
+                label='PARTY'))
+        chunks.append(paragraph)
+        offset += len(paragraph) + 1
+    return '\n'.join(chunks), spans
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paragraphs', type=int, default=200)
+    parser.add_argument('--words', type=int, default=300)
+    parser.add_argument('--short-docs', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    text, spans = synthetic_document(args.paragraphs, args.words)
+    tokenized = wss_tokenizer().tokenize(text)
+    print(f'{len(text)} characters, {len(tokenized.tokens)} tokens, '
+            f'{len(spans)} spans')
+
+    by_chars = alignment.align_tokens_and_annotations_bilou(tokenized, spans)
+    by_ranges = alignment.align_ranges_bilou(tokenized, spans)
+    assert(by_chars == by_ranges)
+
+    for name, func in [
+            ('align_tokens_and_annotations_bilou',
+                alignment.align_tokens_and_annotations_bilou),
+            ('align_ranges_bilou', alignment.align_ranges_bilou),
+            ]:
+        best = min(timeit.repeat(lambda: func(tokenized, spans),
+            number=1, repeat=args.repeat))
+        print(f'{name:46s} {best * 1000:10.2f} ms')
+
+    tokenizer = wss_tokenizer()
+    docs = [synthetic_document(1, 20, seed=i) for i in range(args.short_docs)]
+    tokenized_batch = [tokenizer.tokenize(text) for text, spans in docs]
+    annotations_batch = [spans for text, spans in docs]
+    print(f'{len(docs)} short documents')
+
+    def loop():
+        return [alignment.align_tokens_and_annotations_bilou(t, a)
+                for t, a in zip(tokenized_batch, annotations_batch)]
+    def batch():
+        return alignment.align_batch(tokenized_batch, annotations_batch)
+    assert(loop() == batch())
+    for name, func in [
+            ('loop over align_tokens_and_annotations_bilou', loop),
+            ('align_batch', batch),
+            ]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f'{name:46s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -0,0 +1,90 @@
+"""
+benchmark binary_corpus.CorpusReader: reading the offsets and label
+ids of documents in random order (as a data loader would), from a
+JSON-lines file of label strings and offsets, against views into a
+memory-mapped binary corpus file
+
+run from the top of the repository with
+
+    python benchmarks/bench_binary_corpus.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import json
+import tempfile
+import timeit
+
+from pathlib import Path
+
+import numpy as np
+
+from label_alignment.alignment import align_tokens_and_annotations_bilou
+from label_alignment.binary_corpus import CorpusReader, write_corpus
+from label_alignment.label_codec import LabelCodec
+from label_alignment.simple_tokenizers import wss_tokenizer
+
+from bench_alignment import synthetic_document
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--paragraphs', type=int, default=5)
+    parser.add_argument('--words', type=int, default=60)
+    args = parser.parse_args()
+
+    tokenizer = wss_tokenizer()
+    documents = []
+    for seed in range(args.docs):
+        text, spans = synthetic_document(args.paragraphs, args.words,
+                seed=seed)
+        tokenized = tokenizer.tokenize(text)
+        documents.append((list(tokenized.offsets),
+            align_tokens_and_annotations_bilou(tokenized, spans)))
+    codec = LabelCodec.from_labels(label for offsets, labels in documents
+            for label in labels)
+    order = np.random.default_rng(0).permutation(args.docs).tolist()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = Path(tmp) / 'corpus.jsonl'
+        with open(jsonl, 'w', encoding='utf-8') as out:
+            for offsets, labels in documents:
+                out.write(json.dumps({'offsets': offsets, 'labels': labels}))
+                out.write('\n')
+        binary = Path(tmp) / 'corpus.bin'
+        write_corpus(binary, documents, codec)
+        print(f'JSON lines: {jsonl.stat().st_size} bytes, '
+                f'binary: {binary.stat().st_size} bytes')
+
+        # (the byte position of each line, as an indexed loader would keep)
+        positions = [0]
+        with open(jsonl, 'rb') as f:
+            for line in f:
+                positions.append(positions[-1] + len(line))
+
+        def from_json() -> None:
+            with open(jsonl, 'rb') as f:
+                for doc_ix in order:
+                    f.seek(positions[doc_ix])
+                    record = json.loads(f.readline())
+                    np.array(record['offsets'], dtype=np.int32)
+                    codec.encode_many(record['labels'])
+
+        def from_binary() -> None:
+            corpus = CorpusReader(binary)
+            for doc_ix in order:
+                offsets, label_ids = corpus[doc_ix]
+
+        for name, run in (('JSON lines', from_json),
+                ('CorpusReader', from_binary)):
+            best = min(timeit.repeat(run, number=1, repeat=3))
+            print(f'{name:40s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -0,0 +1,61 @@
+"""
+benchmark cache.AlignmentCache: several epochs of tokenizing and
+aligning the same documents (with two variants of their
+annotations), without a cache and with one
+
+run from the top of the repository with
+
+    python benchmarks/bench_cache.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import timeit
+
+from label_alignment.alignment import align_tokens_and_annotations_bilou
+from label_alignment.cache import AlignmentCache
+from label_alignment.simple_tokenizers import wss_tokenizer
+
+from bench_alignment import synthetic_document
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--paragraphs', type=int, default=5)
+    parser.add_argument('--words', type=int, default=60)
+    parser.add_argument('--epochs', type=int, default=5)
+    args = parser.parse_args()
+
+    docs = [synthetic_document(args.paragraphs, args.words, seed=seed)
+            for seed in range(args.docs)]
+    # the second variant drops every other annotation
+    variants = [[(text, spans), (text, spans[::2])] for text, spans in docs]
+    tokenizer = wss_tokenizer()
+
+    def uncached() -> None:
+        for epoch in range(args.epochs):
+            for doc in variants:
+                for text, spans in doc:
+                    align_tokens_and_annotations_bilou(
+                            tokenizer.tokenize(text), spans)
+
+    cache = AlignmentCache(tokenizer)
+    def cached() -> None:
+        for epoch in range(args.epochs):
+            for doc in variants:
+                for text, spans in doc:
+                    cache.align(text, spans)
+
+    for name, run in (('uncached', uncached), ('AlignmentCache', cached)):
+        best = timeit.timeit(run, number=1)
+        print(f'{name:40s} {best * 1000:10.2f} ms')
+    print(cache.stats())
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
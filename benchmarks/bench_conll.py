@@ -0,0 +1,76 @@
+"""
+benchmark conll.conll_spans: streaming the sentences of synthetic
+gzip-compressed CoNLL files of growing size into iob2spans,
+reporting the time taken and the peak memory allocated, which
+should not grow with the size of the file
+
+run from the top of the repository with
+
+    python benchmarks/bench_conll.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+import numpy as np
+
+from label_alignment.conll import conll_spans, write_conll
+
+
+def synthetic_sentences(n_sentences : int, words : int, seed : int = 0):
+    """
+    sentences of about words tokens each, labeled in IOB2
+    """
+    rng = np.random.default_rng(seed)
+    classes = ['PER', 'LOC', 'ORG']
+    for i in range(n_sentences):
+        n = int(rng.integers(words // 2, 2 * words))
+        tokens = [f'w{j}' for j in rng.integers(0, 10000, n).tolist()]
+        labels = []
+        while len(labels) < n:
+            if rng.random() < 0.8:
+                labels.append('O')
+                continue
+            label_class = classes[int(rng.integers(0, len(classes)))]
+            length = min(n - len(labels), int(rng.integers(1, 4)))
+            labels.extend([f'B-{label_class}']
+                    + [f'I-{label_class}'] * (length - 1))
+        yield (tokens, labels)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sentences', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in (1, 4):
+            path = Path(tmp) / f'synthetic{scale}.conll.gz'
+            write_conll(path, synthetic_sentences(scale * args.sentences,
+                args.words))
+            start = time.perf_counter()
+            n_spans = sum(len(spans) for text, spans in conll_spans(path,
+                table=True))
+            elapsed = time.perf_counter() - start
+            # (traced separately, as tracing slows everything down)
+            tracemalloc.start()
+            for text, spans in conll_spans(path, table=True):
+                pass
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{scale * args.sentences:8d} sentences, {n_spans:8d} spans '
+                    f'{elapsed * 1000:10.2f} ms, peak {peak / 1024:8.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
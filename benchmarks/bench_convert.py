@@ -0,0 +1,80 @@
+"""
+benchmark conversion of aligned BILOU labels to IOB2: decoding
+each document to spans with tok2spans.iob2spans and aligning them
+again with an IOB2 codec, against convert.convert on the whole
+corpus (as label strings, and as arrays of tag ids)
+
+run from the top of the repository with
+
+    python benchmarks/bench_convert.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import timeit
+
+from typing import List
+
+import numpy as np
+
+from label_alignment.alignment import align_ranges_ids
+from label_alignment.convert import convert
+from label_alignment.label_codec import LabelCodec
+from label_alignment.simple_tokenizers import TokenizedImpl
+from label_alignment.tok2spans import iob2spans
+
+from bench_decoding import synthetic_predictions
+
+
+def realign(tokens : List[str], labels : List[str],
+        codec : LabelCodec) -> np.ndarray:
+    """
+    IOB2 tag ids for labels, by way of spans
+    """
+    spans = iob2spans(tokens, labels)
+    starts = np.zeros(len(tokens), dtype=np.int64)
+    np.cumsum([len(token) + 1 for token in tokens[:-1]], out=starts[1:])
+    bounds = np.stack([starts, starts + [len(token) for token in tokens]],
+            axis=1)
+    tokenized = TokenizedImpl.from_arrays(tokens, bounds)
+    return align_ranges_ids(tokenized,
+            [span.to_labeled_span() for span in spans], codec)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--doc-len', type=int, default=250)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bilou = LabelCodec(['PER', 'LOC', 'ORG'], scheme='BILOU')
+    iob2 = LabelCodec(['PER', 'LOC', 'ORG'], scheme='IOB2')
+    docs = [synthetic_predictions(args.doc_len, bilou, seed=seed)
+            for seed in range(args.docs)]
+    tokens = [doc[0] for doc in docs]
+    labels = [doc[1] for doc in docs]
+    tag_ids = [doc[2] for doc in docs]
+    print(f'{args.docs} documents of {args.doc_len} tokens')
+
+    expected = [realign(t, l, iob2) for t, l in zip(tokens, labels)]
+    converted = convert(tag_ids, bilou, iob2)
+    assert(all((a == b).all() for a, b in zip(expected, converted)))
+
+    timings = {
+            'iob2spans + align_ranges_ids': lambda: [realign(t, l, iob2)
+                for t, l in zip(tokens, labels)],
+            'convert, label strings': lambda: convert(labels, 'BILOU', 'IOB2'),
+            'convert, tag id arrays': lambda: convert(tag_ids, bilou, iob2),
+            }
+    for name, run in timings.items():
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f'{name:40s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
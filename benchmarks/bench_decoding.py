@@ -0,0 +1,136 @@
+"""
+benchmark decoding of label sequences into spans:
+tok2spans.iob2spans (on label strings, with both engines) against
+ids2spans.ids2spans (on arrays of tag ids), and per-row iob2spans
+against ids2spans.iob2spans_batch on a padded batch
+
+run from the top of the repository with
+
+    python benchmarks/bench_decoding.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import random
+import timeit
+
+from typing import List, Tuple
+
+import numpy as np
+
+from label_alignment.ids2spans import ids2spans, iob2spans_batch
+from label_alignment.label_codec import LabelCodec
+from label_alignment.tok2spans import iob2spans
+
+
+def synthetic_predictions(n_tokens : int, codec : LabelCodec,
+        seed : int = 3) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    random tokens, with well-formed BILOU chunks of 1-5 tokens
+    covering roughly a third of them
+    """
+    rng = random.Random(seed)
+    tokens = [rng.choice(['the', 'whale', 'Ned', 'Land', 'harpoon', 'of'])
+            for i in range(n_tokens)]
+    labels : List[str] = []
+    while len(labels) < n_tokens:
+        if rng.random() < 0.7:
+            labels.append('O')
+            continue
+        label_class = rng.choice(codec.classes)
+        n = rng.randint(1, 5)
+        if n == 1:
+            labels.append(f'U-{label_class}')
+        else:
+            labels.extend([f'B-{label_class}']
+                    + [f'I-{label_class}'] * (n - 2)
+                    + [f'L-{label_class}'])
+    labels = labels[:n_tokens]
+    if labels[-1][0] in 'BI':
+        labels[-1] = 'O'
+    return tokens, labels, codec.encode_many(labels)
+
+def padded_batch(n_docs : int, seq_len : int, codec : LabelCodec,
+        seed : int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    padded tag ids of shape (n_docs, seq_len), as a model would
+    predict them for documents of random lengths wrapped in [CLS]
+    and [SEP], with the attention mask and special tokens mask
+    """
+    rng = random.Random(seed)
+    tag_ids = np.full((n_docs, seq_len), -100, dtype=np.int64)
+    attention_mask = np.zeros((n_docs, seq_len), dtype=np.int8)
+    special = np.zeros((n_docs, seq_len), dtype=np.int8)
+    for doc in range(n_docs):
+        n_tokens = rng.randint(3, seq_len)
+        tokens, labels, ids = synthetic_predictions(n_tokens - 2, codec,
+                seed=seed + doc)
+        tag_ids[doc, 1:n_tokens - 1] = ids
+        attention_mask[doc, :n_tokens] = 1
+        special[doc, [0, n_tokens - 1]] = 1
+    return tag_ids, attention_mask, special
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seq-len', type=int, default=128)
+    args = parser.parse_args()
+
+    codec = LabelCodec(['PER', 'LOC', 'ORG', 'DATE'])
+    tokens, labels, tag_ids = synthetic_predictions(args.tokens, codec)
+    lengths = np.array([len(token) for token in tokens])
+    print(f'{len(tokens)} tokens')
+
+    def state_machine():
+        return list(iob2spans(tokens, labels))
+    def table():
+        return list(iob2spans(tokens, labels, engine='table'))
+    def arrays():
+        return ids2spans(tag_ids, codec, lengths=lengths)
+
+    spans = state_machine()
+    starts, ends, classes = arrays()
+    assert([(s.start, s.end) for s in spans] == list(zip(starts, ends)))
+    assert(table() == spans)
+
+    for name, func in [
+            ('iob2spans', state_machine),
+            ('iob2spans(engine="table")', table),
+            ('ids2spans', arrays),
+            ]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f'{name:40s} {best * 1000:10.2f} ms')
+
+    n_docs = args.tokens // args.seq_len
+    batch, attention_mask, special = padded_batch(n_docs, args.seq_len, codec)
+    print(f'padded batch of {n_docs} x {args.seq_len}')
+
+    def per_row():
+        # slice each row and decode it as label strings
+        spans = []
+        for doc in range(n_docs):
+            keep = (attention_mask[doc] == 1) & (special[doc] == 0)
+            row_labels = codec.decode_many(batch[doc, keep])
+            spans.append(list(iob2spans(['x'] * len(row_labels), row_labels)))
+        return spans
+    def batched():
+        return iob2spans_batch(batch, codec, attention_mask=attention_mask,
+                special_tokens_mask=special)
+
+    assert(sum(map(len, per_row())) == len(batched()))
+    for name, func in [
+            ('per-row iob2spans', per_row),
+            ('iob2spans_batch', batched),
+            ]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f'{name:40s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
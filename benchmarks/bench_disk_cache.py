@@ -0,0 +1,70 @@
+"""
+benchmark disk_cache.cached_align: parsing and aligning a directory
+of annotated XML files, without a cache, on a first run which fills
+a DiskCache, and on a re-run with the files unchanged
+
+run from the top of the repository with
+
+    python benchmarks/bench_disk_cache.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import tempfile
+import timeit
+
+from pathlib import Path
+
+from label_alignment.alignment import align_tokens_and_annotations_bilou
+from label_alignment.cache import tokenizer_fingerprint
+from label_alignment.disk_cache import DiskCache, cached_align
+from label_alignment.expat2spans import expat_parsed
+from label_alignment.simple_tokenizers import wss_tokenizer
+
+from bench_ingestion import synthetic_verne
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--copies', type=int, default=20)
+    args = parser.parse_args()
+
+    tokenizer = wss_tokenizer()
+    fingerprint = tokenizer_fingerprint(tokenizer)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            path = Path(tmp) / f'doc{i:05d}.xml'
+            # (distinct contents, so that no two files share entries)
+            path.write_text(synthetic_verne(args.copies).replace('<doc>',
+                f'<doc>\n<p>{i}</p>'), encoding='utf-8')
+            paths.append(path)
+
+        def uncached() -> None:
+            for path in paths:
+                text, spans = expat_parsed(path, table=True)
+                align_tokens_and_annotations_bilou(tokenizer.tokenize(text),
+                        spans)
+
+        def run() -> None:
+            with DiskCache(Path(tmp) / 'cache') as cache:
+                for path in paths:
+                    cached_align(path, tokenizer.tokenize, fingerprint, cache)
+
+        for name, bench in (('uncached', uncached),
+                ('first run (filling the cache)', run),
+                ('re-run (all hits)', run)):
+            best = timeit.timeit(bench, number=1)
+            print(f'{name:40s} {best * 1000:10.2f} ms')
+        size = sum(path.stat().st_size
+                for path in (Path(tmp) / 'cache').iterdir())
+        print(f'cache: {size} bytes')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -0,0 +1,78 @@
+"""
+benchmark reading annotated XML: sax2spans.span_parsed against
+expat2spans.expat_parsed and parallel_sax.parallel_span_parsed,
+on large synthetic documents made by repeating the paragraphs of
+the Verne test excerpt
+
+run from the top of the repository with
+
+    python benchmarks/bench_ingestion.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import re
+import tempfile
+import timeit
+
+from pathlib import Path
+
+from label_alignment.expat2spans import expat_parsed
+from label_alignment.parallel_sax import parallel_span_parsed
+from label_alignment.sax2spans import span_parsed
+
+VERNE = Path('tests') / 'data' / 'annotated_texts' / 'verne_20000_leagues.ch5.xml'
+
+
+def synthetic_verne(copies : int, long_runs : bool = False) -> str:
+    """
+    the Verne excerpt with its paragraphs repeated copies times
+
+    if long_runs, the paragraphs are instead merged into one
+    huge paragraph, with entities sprinkled through its text, so
+    that the parser reports it in many small pieces
+    """
+    xml_text = VERNE.read_text(encoding='utf-8')
+    paragraphs = re.findall(r'<p>.*?</p>', xml_text, flags=re.S)
+    if long_runs:
+        body = ' '.join(p[3:-4] for p in paragraphs).replace(' ', ' &amp; ')
+        inner = '\n'.join([body] * copies)
+        return f'<?xml version="1.0" encoding="utf-8"?>\n<doc>\n<p>{inner}</p>\n</doc>\n'
+    inner = '\n\n'.join(paragraphs * copies)
+    return f'<?xml version="1.0" encoding="utf-8"?>\n<doc>\n{inner}\n</doc>\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for long_runs in (False, True):
+            path = Path(tmp) / 'verne.xml'
+            path.write_text(synthetic_verne(args.copies, long_runs),
+                    encoding='utf-8')
+            kind = 'one long paragraph' if long_runs else 'many paragraphs'
+            print(f'{kind}: {path.stat().st_size} bytes')
+            assert(span_parsed(path) == expat_parsed(path))
+            for name, func in [
+                    ('span_parsed', span_parsed),
+                    ('expat_parsed', expat_parsed),
+                    ('expat_parsed(table=True)',
+                        lambda p: expat_parsed(p, table=True)),
+                    ('parallel_span_parsed(table=True)',
+                        lambda p: parallel_span_parsed(p, table=True,
+                            chunk_bytes=1 << 18)),
+                    ]:
+                best = min(timeit.repeat(lambda: func(path),
+                    number=1, repeat=args.repeat))
+                print(f'    {name:36s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -0,0 +1,78 @@
+"""
+benchmark validate.validate on a large synthetic corpus of
+tag id sequences, given as one flat array with lengths, and
+as a list of arrays, against a per-sequence Python check
+(on a sample, scaled up)
+
+run from the top of the repository with
+
+    python benchmarks/bench_validate.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from label_alignment.label_codec import LabelCodec
+from label_alignment.validate import validate
+from label_alignment.viterbi import transition_mask
+
+
+def python_check(sequences, allowed) -> int:
+    """
+    number of violations, one sequence and tag at a time
+    """
+    n_violations = 0
+    for tags in sequences:
+        prev = 0
+        for tag in tags:
+            n_violations += not allowed[prev][tag]
+            prev = tag
+        n_violations += not allowed[prev][0]
+    return n_violations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sequences', type=int, default=1000000)
+    parser.add_argument('--mean-length', type=int, default=16)
+    parser.add_argument('--sample', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    codec = LabelCodec(['PER', 'LOC', 'ORG', 'MISC'], scheme='IOB2')
+    rng = np.random.default_rng(19)
+    lengths = rng.integers(1, 2 * args.mean_length, size=args.sequences)
+    # mostly O, with occasional chunks
+    flat = np.where(rng.random(lengths.sum()) < 0.8, 0,
+            rng.integers(0, len(codec), size=lengths.sum())).astype(codec.dtype)
+    print(f'{args.sequences} sequences, {len(flat)} tags')
+
+    ends = np.cumsum(lengths)
+    sample = np.split(flat[:ends[args.sample - 1]], ends[:args.sample - 1])
+    sample_lists = [tags.tolist() for tags in sample]
+    allowed = transition_mask(codec).tolist()
+    n_violations = len(validate(flat, codec, lengths=lengths).docs)
+    print(f'{n_violations} violations')
+
+    best = min(timeit.repeat(lambda: python_check(sample_lists, allowed),
+        number=1, repeat=args.repeat))
+    scaled = best * args.sequences / args.sample
+    print(f'{"python, per sequence (scaled)":40s} {scaled * 1000:10.2f} ms')
+    best = min(timeit.repeat(lambda: validate(flat, codec, lengths=lengths),
+        number=1, repeat=args.repeat))
+    print(f'{"validate, flat with lengths":40s} {best * 1000:10.2f} ms')
+    sequences = np.split(flat, ends[:-1])
+    best = min(timeit.repeat(lambda: validate(sequences, codec),
+        number=1, repeat=args.repeat))
+    print(f'{"validate, list of arrays":40s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -0,0 +1,94 @@
+"""
+benchmark constrained Viterbi decoding: viterbi.viterbi_decode
+(NumPy, over a whole batch at once) against a straightforward
+pure Python Viterbi, one sequence at a time, on batches of
+512-token sequences
+
+run from the top of the repository with
+
+    python benchmarks/bench_viterbi.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import math
+import timeit
+
+from typing import List
+
+import numpy as np
+
+from label_alignment.label_codec import LabelCodec
+from label_alignment.viterbi import transition_mask, viterbi_decode
+
+
+def python_viterbi(log_probs : List[List[float]],
+        allowed : List[List[bool]]) -> List[int]:
+    """
+    Viterbi over one sequence, with plain lists and loops
+    (tag 0, O, standing for the start and end of the sequence)
+    """
+    n_tags = len(allowed)
+    score = [0.0 if allowed[0][tag] else -math.inf for tag in range(n_tags)]
+    score = [s + lp for s, lp in zip(score, log_probs[0])]
+    backpointers = []
+    for token_probs in log_probs[1:]:
+        new_score = []
+        pointers = []
+        for tag in range(n_tags):
+            best, best_prev = -math.inf, 0
+            for prev in range(n_tags):
+                if allowed[prev][tag] and score[prev] > best:
+                    best, best_prev = score[prev], prev
+            new_score.append(best + token_probs[tag])
+            pointers.append(best_prev)
+        score = new_score
+        backpointers.append(pointers)
+    final = [s if allowed[tag][0] else -math.inf
+            for tag, s in enumerate(score)]
+    current = max(range(n_tags), key=final.__getitem__)
+    path = [current]
+    for pointers in reversed(backpointers):
+        current = pointers[current]
+        path.append(current)
+    path.reverse()
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--seq-len', type=int, default=512)
+    parser.add_argument('--scheme', default='BILOU')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    codec = LabelCodec(['PER', 'LOC', 'ORG', 'MISC'], scheme=args.scheme)
+    rng = np.random.default_rng(16)
+    logits = rng.normal(size=(args.batch, args.seq_len, len(codec)))
+    log_probs = logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+    allowed = transition_mask(codec).tolist()
+    rows = log_probs.tolist()
+    print(f'{args.batch} x {args.seq_len} tokens, {len(codec)} tags '
+            f'({args.scheme})')
+
+    def python():
+        return [python_viterbi(row, allowed) for row in rows]
+    def numpy():
+        return viterbi_decode(log_probs, codec)
+
+    assert(numpy().tolist() == python())
+    for name, func in [
+            ('python Viterbi', python),
+            ('viterbi_decode', numpy),
+            ]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f'{name:40s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -0,0 +1,95 @@
+"""
+benchmark sliding windows over long documents: labeling the
+windows of each document and stitching per-window predictions back
+into document spans with a Python loop over windows, against
+windows.window_tag_ids and windows.windows2spans on all the
+windows at once
+
+run from the top of the repository with
+
+    python benchmarks/bench_windows.py
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import timeit
+
+from typing import List
+
+import numpy as np
+
+from label_alignment.ids2spans import ids2table
+from label_alignment.label_codec import LabelCodec
+from label_alignment.windows import (Windows, plan_windows, window_tag_ids,
+        windows2spans)
+
+from bench_decoding import synthetic_predictions
+
+
+def python_windows(tag_ids : np.ndarray, windows : Windows,
+        width : int) -> np.ndarray:
+    """
+    label windows by slicing each out of its document (without
+    fixing up chunks cut by the window edges)
+    """
+    labels = np.full((len(windows.docs), width), -100, dtype=tag_ids.dtype)
+    for row, (doc, start, end) in enumerate(zip(windows.docs.tolist(),
+            windows.starts.tolist(), windows.ends.tolist())):
+        doc_start = windows.doc_starts[doc]
+        labels[row, :end - start] = tag_ids[doc_start + start:doc_start + end]
+    return labels
+
+def python_stitch(labels : np.ndarray, windows : Windows,
+        codec : LabelCodec) -> list:
+    """
+    copy the owned part of each window into its document,
+    then decode each document
+    """
+    docs = [np.empty(n, dtype=labels.dtype) for n in windows.lengths.tolist()]
+    for row, (doc, start, own_start, own_end) in enumerate(zip(
+            windows.docs.tolist(), windows.starts.tolist(),
+            windows.own_starts.tolist(), windows.own_ends.tolist())):
+        docs[doc][own_start:own_end] = labels[row,
+                own_start - start:own_end - start]
+    return [ids2table(doc_ids, codec, lengths=np.ones(len(doc_ids)))
+            for doc_ids in docs]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--doc-len', type=int, default=5000)
+    parser.add_argument('--max-len', type=int, default=510)
+    parser.add_argument('--stride', type=int, default=384)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    codec = LabelCodec(['PER', 'LOC', 'ORG'], scheme='BILOU')
+    rng = np.random.default_rng(21)
+    lengths = rng.integers(args.doc_len // 2, args.doc_len, size=args.docs)
+    tag_ids = np.concatenate([synthetic_predictions(n, codec, seed=seed)[2]
+        for seed, n in enumerate(lengths.tolist())])
+    windows = plan_windows(lengths, args.max_len, args.stride)
+    labels = window_tag_ids(tag_ids, windows, codec)
+    print(f'{args.docs} documents, {len(tag_ids)} tokens, '
+            f'{len(windows.docs)} windows')
+
+    timings = {
+            'python, slice windows': lambda: python_windows(tag_ids, windows,
+                args.max_len),
+            'window_tag_ids': lambda: window_tag_ids(tag_ids, windows, codec),
+            'python, stitch and decode per doc': lambda: python_stitch(labels,
+                windows, codec),
+            'windows2spans': lambda: windows2spans(labels, windows, codec),
+            }
+    for name, run in timings.items():
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f'{name:40s} {best * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
@@ -7,37 +7,72 @@ with additional changes (primarily type hints and docstrings) Copyright (c)
 2024-present David C. Fox (talk2dfox@gmail.com)
 """
 
-from typing import Sequence, Mapping, Union, Optional, List
+from bisect import bisect_left, bisect_right
+from typing import (Sequence, Mapping, Union, Optional, 
+        List, Tuple, Dict, Iterator
+        )
 
-from .tokenized import Tokenized
+import numpy as np
+
+from .convert import convert
+from .label_codec import LabelCodec, SpanTagIds
+from .schemes import check_scheme
+from .span_table import SpanTable
+from .tokenized import Tokenized, TokenizedWithOffsets
 
 
 
 from .types import LabeledSpan
 
+# annotations accepted by the alignment functions
+Annotations = Union[Sequence[LabeledSpan], SpanTable]
+
 def align_tokens_and_annotations_bilou(tokenized: Tokenized, 
-        annotations : Sequence[LabeledSpan]) -> List[str]:
+        annotations : Annotations,
+        scheme : str = "BILOU") -> List[str]:
     """
     given a sequence of annotations with keys "start" and "end" mapped to
     character offsets and "label" mapped to the annotation type,
+    (or a span_table.SpanTable)
     along with a tokenization in the form of HuggingFace tokenizers.Encoding,
 
     create a list of BILOU labels representing the same annotations, but
     aligned with the tokens
+
+    With scheme, the labels are converted to another of the schemes
+    in schemes.SCHEMES (see convert.convert), treating any stray L
+    or I (from overlapping annotations) as convert.convert does with
+    repair="convert".
     """
+    scheme = check_scheme(scheme)
+    if scheme != "BILOU":
+        labels : List[str] = align_tokens_and_annotations_bilou(tokenized,
+                annotations)
+        return convert([labels], "BILOU", scheme, repair="convert")[0]
+    if isinstance(annotations, SpanTable):
+        annotations = annotations.to_labeled_spans()
     tokens = tokenized.tokens
     aligned_labels = ["O"] * len(
         tokens
     )  # Make a list to store our labels the same length as our tokens
+    # tokenizations like simple_tokenizers.TokenizedImpl can look up 
+    # all the characters of an annotation in one array operation
+    char_to_token_many = getattr(tokenized, "char_to_token_many", None)
     for anno in annotations:
-        annotation_token_ix_set = (
-            set()
-        )  # A set that stores the token indices of the annotation
-        for char_ix in range(anno["start"], anno["end"]):
-
-            token_ix = tokenized.char_to_token(char_ix)
-            if token_ix is not None:
-                annotation_token_ix_set.add(token_ix)
+        if char_to_token_many is not None:
+            token_ix_array = char_to_token_many(
+                    np.arange(anno["start"], anno["end"]))
+            annotation_token_ix_set = set(
+                    token_ix_array[token_ix_array >= 0].tolist())
+        else:
+            annotation_token_ix_set = (
+                set()
+            )  # A set that stores the token indices of the annotation
+            for char_ix in range(anno["start"], anno["end"]):
+
+                token_ix = tokenized.char_to_token(char_ix)
+                if token_ix is not None:
+                    annotation_token_ix_set.add(token_ix)
         if len(annotation_token_ix_set) == 1:
             # If there is only one token
             token_ix = annotation_token_ix_set.pop()
@@ -59,4 +94,284 @@ def align_tokens_and_annotations_bilou(tokenized: Tokenized,
                 aligned_labels[token_ix] = f"{prefix}-{anno['label']}"
     return aligned_labels
 
+
+class TokenBoundaries:
+    """
+    character offsets of the non-empty tokens of a tokenization,
+    kept in order so that the tokens overlapping a character span 
+    can be found with two binary searches
+
+    Empty tokens (e.g. special tokens like [CLS] with offsets (0, 0))
+    are skipped, since char_to_token never returns them either.
+    If the tokenization has sequence_ids (as tokenizers.Encoding
+    does), only tokens from sequence_index are kept, matching
+    the default of Encoding.char_to_token.
+    """
+    def __init__(self, offsets : Sequence[Tuple[int, int]],
+            sequence_ids : Optional[Sequence[Optional[int]]] = None,
+            sequence_index : int = 0) -> None:
+        self.indices : List[int] = [
+                tok_ix for tok_ix, (start, end) in enumerate(offsets)
+                if end > start and (
+                    sequence_ids is None 
+                    or sequence_ids[tok_ix] == sequence_index
+                    )
+                ]
+        self.starts : List[int] = [offsets[i][0] for i in self.indices]
+        self.ends : List[int] = [offsets[i][1] for i in self.indices]
+
+    @classmethod
+    def from_tokenized(cls, tokenized : TokenizedWithOffsets,
+            sequence_index : int = 0) -> "TokenBoundaries":
+        sequence_ids = getattr(tokenized, 'sequence_ids', None)
+        return cls(tokenized.offsets, sequence_ids=sequence_ids,
+                sequence_index=sequence_index)
+
+    def token_indices(self, start : int, end : int) -> List[int]:
+        """
+        indices of the tokens overlapping the characters
+        [start, end), in order (none, if the span is empty)
+        """
+        if end <= start:
+            return []
+        # first token ending after start
+        lo : int = bisect_right(self.ends, start)
+        # first token starting at or after end
+        hi : int = bisect_left(self.starts, end)
+        return self.indices[lo:hi]
+
+    def token_ranges(self, starts : np.ndarray, 
+            ends : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        vectorized equivalent of token_indices for many spans: 
+        for each span, the tokens overlapping it are 
+        self.indices[lo:hi] for the corresponding lo and hi 
+        in the returned arrays (with hi == lo for empty spans)
+        """
+        lo : np.ndarray = np.searchsorted(
+                np.asarray(self.ends, dtype=np.int64), starts, side='right')
+        hi : np.ndarray = np.searchsorted(
+                np.asarray(self.starts, dtype=np.int64), ends, side='left')
+        # a span with end <= start lies inside (or between) tokens,
+        # but overlaps none of them
+        empty : np.ndarray = np.asarray(ends) <= np.asarray(starts)
+        hi[empty] = lo[empty]
+        return (lo, hi)
+
+def _annotation_tokens(boundaries : TokenBoundaries,
+        annotations : Annotations) -> Iterator[Tuple[str, List[int]]]:
+    """
+    for each annotation overlapping at least one token,
+    yield its label and the indices of the tokens it overlaps
+    (so annotations with end <= start are skipped)
+
+    For a SpanTable, the token ranges of all spans are looked up 
+    in a single pair of array operations.
+    """
+    if isinstance(annotations, SpanTable):
+        if not len(annotations):
+            return
+        los, his = boundaries.token_ranges(annotations.starts, 
+                annotations.ends)
+        labels = annotations.labels
+        indices = boundaries.indices
+        for lo, hi, label_id in zip(los.tolist(), his.tolist(),
+                annotations.label_ids.tolist()):
+            if lo < hi:
+                yield (labels[label_id], indices[lo:hi])
+        return
+    token_indices = boundaries.token_indices
+    for anno in annotations:
+        if anno["end"] <= anno["start"]:
+            continue
+        token_ixs : List[int] = token_indices(anno["start"], anno["end"])
+        if token_ixs:
+            yield (anno["label"], token_ixs)
+
+
+BilouTags = Tuple[str, str, str, str]
+
+def bilou_tags(label : str) -> BilouTags:
+    """
+    the B, I, L and U labels for a given annotation label
+    """
+    return (f"B-{label}", f"I-{label}", f"L-{label}", f"U-{label}")
+
+def _align_ranges(boundaries : TokenBoundaries,
+        n_tokens : int,
+        annotations : Annotations,
+        tags : Dict[str, BilouTags]) -> List[str]:
+    """
+    shared loop of align_ranges_bilou and align_batch
+
+    tags caches the BILOU label strings for each annotation label,
+    so that they are built once, rather than once per labeled
+    token, and shared between all the sequences using them
+    """
+    aligned_labels : List[str] = ["O"] * n_tokens
+    for label, token_ixs in _annotation_tokens(boundaries, annotations):
+        label_tags = tags.get(label)
+        if label_tags is None:
+            label_tags = tags[label] = bilou_tags(label)
+        b_tag, i_tag, l_tag, u_tag = label_tags
+        if len(token_ixs) == 1:
+            aligned_labels[token_ixs[0]] = u_tag
+            continue
+        for token_ix in token_ixs[1:-1]:
+            aligned_labels[token_ix] = i_tag
+        aligned_labels[token_ixs[0]] = b_tag
+        aligned_labels[token_ixs[-1]] = l_tag
+    return aligned_labels
+
+def align_ranges_bilou(tokenized: TokenizedWithOffsets, 
+        annotations : Annotations) -> List[str]:
+    """
+    same as align_tokens_and_annotations_bilou, but resolves each
+    annotation to the range of tokens it overlaps with two
+    lookups on the token offsets, instead of calling 
+    char_to_token for every character in the annotation.
+
+    The cost therefore depends on the number of annotations
+    (and of labeled tokens), not on the number of annotated characters.
+
+    annotations can also be a span_table.SpanTable, in which case
+    the token ranges of all its spans are found at once.
+
+    Note: where a tokenizer produces several tokens with overlapping
+    offsets (e.g. byte-level BPE splitting a single multi-byte
+    character), all of them are labeled, whereas char_to_token
+    would only report one of them.
+    """
+    boundaries = TokenBoundaries.from_tokenized(tokenized)
+    return _align_ranges(boundaries, len(tokenized.tokens), 
+            annotations, {})
+
+def align_batch(tokenized_batch : Sequence[TokenizedWithOffsets],
+        annotations_batch : Sequence[Annotations],
+        ) -> List[List[str]]:
+    """
+    align a batch of documents in one call, returning one list of 
+    BILOU labels per document (as align_ranges_bilou would).
+
+    tokenized_batch can be, for example, the list of 
+    tokenizers.Encoding returned by Tokenizer.encode_batch, and
+    annotations_batch holds the annotations for each of them,
+    in the same order.
+
+    The BILOU label strings are built once for the whole batch
+    (and shared between documents), and documents without 
+    annotations skip the offset lookups altogether.
+    """
+    if len(tokenized_batch) != len(annotations_batch):
+        msg = (f"got {len(tokenized_batch)} tokenized documents but "
+                f"{len(annotations_batch)} lists of annotations")
+        raise ValueError(msg)
+    tags : Dict[str, BilouTags] = {}
+    from_tokenized = TokenBoundaries.from_tokenized
+    batch_labels : List[List[str]] = []
+    for tokenized, annotations in zip(tokenized_batch, annotations_batch):
+        n_tokens : int = len(tokenized.tokens)
+        if not annotations:
+            batch_labels.append(["O"] * n_tokens)
+            continue
+        batch_labels.append(_align_ranges(from_tokenized(tokenized),
+            n_tokens, annotations, tags))
+    return batch_labels
+
+
+def _align_ranges_ids(out : np.ndarray,
+        boundaries : TokenBoundaries,
+        annotations : Annotations,
+        codec : LabelCodec,
+        tag_ids : Dict[str, SpanTagIds]) -> None:
+    """
+    id equivalent of _align_ranges, writing into out (which
+    must already be filled with "O", i.e. 0)
+
+    tag_ids caches codec.span_tag_ids for each annotation label
+    """
+    for label, token_ixs in _annotation_tokens(boundaries, annotations):
+        label_ids = tag_ids.get(label)
+        if label_ids is None:
+            label_ids = tag_ids[label] = codec.span_tag_ids(label)
+        b_id, i_id, l_id, u_id = label_ids
+        first : int = token_ixs[0]
+        last : int = token_ixs[-1]
+        if first == last:
+            out[first] = u_id
+            continue
+        if last - first == len(token_ixs) - 1:
+            # contiguous, so no need to list the indices
+            out[first + 1:last] = i_id
+        else:
+            out[token_ixs[1:-1]] = i_id
+        out[first] = b_id
+        out[last] = l_id
+
+def align_ranges_ids(tokenized: TokenizedWithOffsets,
+        annotations : Annotations,
+        codec : LabelCodec,
+        out : Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    same as align_ranges_bilou, but returns tag ids from codec
+    (in codec.scheme, which must be one of those in 
+    schemes.SPAN_ROLES) in a NumPy array, instead of a list of strings
+
+    If out is given, the ids are written into its first
+    len(tokenized.tokens) elements (and out is returned), so
+    that callers can fill rows of a preallocated array.
+    Otherwise, a new array of type codec.dtype is returned.
+    """
+    n_tokens : int = len(tokenized.tokens)
+    if out is None:
+        out = np.zeros(n_tokens, dtype=codec.dtype)
+    else:
+        if len(out) < n_tokens:
+            msg = f"out has room for {len(out)} ids, but need {n_tokens}"
+            raise ValueError(msg)
+        out[:n_tokens] = 0
+    _align_ranges_ids(out, TokenBoundaries.from_tokenized(tokenized),
+            annotations, codec, {})
+    return out
+
+def align_batch_ids(tokenized_batch : Sequence[TokenizedWithOffsets],
+        annotations_batch : Sequence[Annotations],
+        codec : LabelCodec,
+        out : Optional[np.ndarray] = None,
+        pad_id : int = -100) -> np.ndarray:
+    """
+    id equivalent of align_batch, returning a 2-D array of
+    shape (len(tokenized_batch), longest tokenization), with
+    positions past the end of each document set to pad_id
+
+    (-100 is the index ignored by the usual cross-entropy losses)
+
+    If out is given, it is filled instead of a new array, 
+    and must have at least that many rows and columns.
+    """
+    if len(tokenized_batch) != len(annotations_batch):
+        msg = (f"got {len(tokenized_batch)} tokenized documents but "
+                f"{len(annotations_batch)} lists of annotations")
+        raise ValueError(msg)
+    lengths : List[int] = [len(tokenized.tokens) 
+            for tokenized in tokenized_batch]
+    n_rows : int = len(lengths)
+    n_cols : int = max(lengths, default=0)
+    if out is None:
+        out = np.empty((n_rows, n_cols), dtype=codec.dtype)
+    elif out.ndim != 2 or out.shape[0] < n_rows or out.shape[1] < n_cols:
+        msg = f"out has shape {out.shape}, but need at least {(n_rows, n_cols)}"
+        raise ValueError(msg)
+    out[:n_rows] = pad_id
+    tag_ids : Dict[str, SpanTagIds] = {}
+    from_tokenized = TokenBoundaries.from_tokenized
+    for row, (tokenized, annotations, n_tokens) in enumerate(
+            zip(tokenized_batch, annotations_batch, lengths)):
+        row_ids : np.ndarray = out[row]
+        row_ids[:n_tokens] = 0
+        if annotations:
+            _align_ranges_ids(row_ids, from_tokenized(tokenized),
+                    annotations, codec, tag_ids)
+    return out
+
 # vim: et ai si sts=4
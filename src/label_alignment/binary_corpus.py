@@ -0,0 +1,288 @@
+"""
+compact binary file format for aligned corpora (token offsets and
+label ids of many documents), which a reader memory-maps so that
+any document is available as NumPy views into the file, without
+parsing anything (unlike JSON lists of label strings)
+
+The file is laid out as
+
+    preamble: magic, number of documents, number of tokens,
+        and the byte positions of the sections below
+    offsets: (start, end) character offsets of every token, in
+        each document, as an (n_tokens, 2) int32 array
+    label_ids: label id of every token
+    doc_starts: index of the first token of each document (plus
+        the total number of tokens), as int64
+    header: JSON with the label vocabulary (and the LabelCodec it
+        came from, if any) and the dtypes of the arrays
+
+with each array aligned to 8 bytes.  The header comes last so that
+the writer can stream documents to the file (spooling the label ids
+to a temporary file) without knowing in advance how many there are.
+
+    with CorpusWriter(path, codec) as writer:
+        for tokenized, labels in aligned:
+            writer.add(tokenized.offsets, labels)
+
+    corpus = CorpusReader(path)
+    offsets, label_ids = corpus[i]
+
+A CorpusReader can be pickled (e.g. to send it to the worker
+processes of a data loader), which just reopens the file.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+from array import array
+from pathlib import Path
+from typing import (
+        Sequence, Iterable, Iterator,
+        Union, Optional, Any,
+        List, Dict, Tuple, NamedTuple,
+        )
+
+import numpy as np
+
+from .label_codec import LabelCodec
+
+_MAGIC = b'LACORP01'
+# magic, n_docs, n_tokens, and the positions of offsets, label_ids,
+# doc_starts and header
+_PREAMBLE = struct.Struct('<8s6Q')
+_ALIGN = 8
+OFFSET_DTYPE = np.int32
+
+
+class CorpusDoc(NamedTuple):
+    offsets : np.ndarray
+    label_ids : np.ndarray
+
+
+def _pad(f, position : int) -> int:
+    """
+    pad the file f, now at position, to a multiple of _ALIGN
+    """
+    padding : int = -position % _ALIGN
+    f.write(b'\0' * padding)
+    return position + padding
+
+
+class CorpusWriter:
+    """
+    write documents, each the token offsets and labels from an
+    alignment, to a binary corpus file at path
+
+    The labels are encoded with codec, if given (and label ids from
+    it can be added directly), otherwise the vocabulary is made of
+    the label strings in order of first appearance.
+
+    The file is written under a temporary name, and renamed to path
+    by close (or at the end of a with block, unless it raises).
+    """
+    def __init__(self, path : Union[Path, str],
+            codec : Optional[LabelCodec] = None) -> None:
+        self.path : Path = Path(path)
+        self.codec : Optional[LabelCodec] = codec
+        self._vocab : Dict[str, int] = (dict(codec.label_index)
+                if codec is not None else {})
+        self.label_dtype : np.dtype = np.dtype(codec.dtype
+                if codec is not None else np.int32)
+        self._partial : Path = self.path.with_name(self.path.name + '.partial')
+        self._out = open(self._partial, 'wb')
+        self._out.write(b'\0' * _PREAMBLE.size)
+        self._position : int = _pad(self._out, _PREAMBLE.size)
+        self._offsets_pos : int = self._position
+        self._labels = tempfile.TemporaryFile(dir=self.path.parent)
+        self._lengths : array = array('q')
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def _encode(self, labels : Union[Sequence[str], np.ndarray]) -> np.ndarray:
+        if isinstance(labels, np.ndarray) and labels.dtype.kind in 'iu':
+            if self.codec is None:
+                msg = "adding label ids needs the LabelCodec which encoded them"
+                raise ValueError(msg)
+            return labels.astype(self.label_dtype, copy=False)
+        if self.codec is not None:
+            return self.codec.encode_many(labels)
+        vocab : Dict[str, int] = self._vocab
+        return np.fromiter((vocab.setdefault(label, len(vocab))
+            for label in labels), dtype=self.label_dtype, count=len(labels))
+
+    def add(self, offsets : Union[Sequence[Tuple[int, int]], np.ndarray],
+            labels : Union[Sequence[str], np.ndarray]) -> None:
+        """
+        add a document, with the (start, end) offsets of its tokens
+        (e.g. tokenized.offsets) and their labels (strings, or ids
+        from the writer's codec)
+        """
+        offset_array : np.ndarray = np.asarray(offsets,
+                dtype=np.int64).reshape(-1, 2)
+        label_ids : np.ndarray = self._encode(labels)
+        if len(offset_array) != len(label_ids):
+            msg = (f"{len(offset_array)} token offsets, but "
+                    f"{len(label_ids)} labels")
+            raise ValueError(msg)
+        if len(offset_array) and (offset_array.max()
+                > np.iinfo(OFFSET_DTYPE).max):
+            msg = f"offset {offset_array.max()} is too large for {OFFSET_DTYPE}"
+            raise ValueError(msg)
+        encoded : bytes = offset_array.astype(OFFSET_DTYPE).tobytes()
+        self._out.write(encoded)
+        self._position += len(encoded)
+        self._labels.write(label_ids.tobytes())
+        self._lengths.append(len(label_ids))
+
+    def close(self) -> None:
+        """
+        write the remaining sections and the header, and rename
+        the finished file to path
+        """
+        if self._out.closed:
+            return
+        out = self._out
+        n_tokens : int = sum(self._lengths)
+        labels_pos : int = _pad(out, self._position)
+        self._labels.seek(0)
+        shutil.copyfileobj(self._labels, out)
+        self._labels.close()
+        doc_starts_pos : int = _pad(out,
+                labels_pos + n_tokens * self.label_dtype.itemsize)
+        doc_starts : np.ndarray = np.zeros(len(self._lengths) + 1,
+                dtype=np.int64)
+        np.cumsum(np.frombuffer(self._lengths, dtype=np.int64),
+                out=doc_starts[1:])
+        out.write(doc_starts.tobytes())
+        header_pos : int = doc_starts_pos + doc_starts.nbytes
+        header : Dict[str, Any] = {
+                'labels': list(self._vocab),
+                'label_dtype': self.label_dtype.name,
+                'offset_dtype': np.dtype(OFFSET_DTYPE).name,
+                }
+        if self.codec is not None:
+            header['codec'] = {'classes': list(self.codec.classes),
+                    'scheme': self.codec.scheme,
+                    'default_class': self.codec.default_class}
+        out.write(json.dumps(header, ensure_ascii=False).encode('utf-8'))
+        out.seek(0)
+        out.write(_PREAMBLE.pack(_MAGIC, len(self._lengths), n_tokens,
+            self._offsets_pos, labels_pos, doc_starts_pos, header_pos))
+        out.close()
+        os.replace(self._partial, self.path)
+
+    def discard(self) -> None:
+        """
+        stop writing, and remove the unfinished file
+        """
+        if not self._out.closed:
+            self._out.close()
+            self._labels.close()
+            self._partial.unlink()
+
+
+def write_corpus(path : Union[Path, str],
+        documents : Iterable[Tuple[Union[Sequence[Tuple[int, int]], np.ndarray],
+            Union[Sequence[str], np.ndarray]]],
+        codec : Optional[LabelCodec] = None) -> int:
+    """
+    write (offsets, labels) for each of documents to a binary corpus
+    file at path, as for CorpusWriter, returning the number written
+    """
+    with CorpusWriter(path, codec) as writer:
+        for offsets, labels in documents:
+            writer.add(offsets, labels)
+    return len(writer)
+
+
+class CorpusReader:
+    """
+    documents from a binary corpus file written by CorpusWriter
+
+    Indexing gives a CorpusDoc of read-only views into the
+    memory-mapped file (so they share its pages with any other
+    process reading it), offsets as an (n, 2) array and label_ids.
+    The whole corpus is also available as flat arrays offsets,
+    label_ids and doc_starts (as for TokenizedBatch).
+    """
+    def __init__(self, path : Union[Path, str]) -> None:
+        self.path : Path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._map : mmap.mmap = mmap.mmap(f.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        if len(self._map) < _PREAMBLE.size:
+            msg = f"{self.path} is too short to be a binary corpus file"
+            raise ValueError(msg)
+        (magic, n_docs, n_tokens, offsets_pos, labels_pos, doc_starts_pos,
+                header_pos) = _PREAMBLE.unpack_from(self._map)
+        if magic != _MAGIC:
+            msg = f"{self.path} is not a binary corpus file"
+            raise ValueError(msg)
+        header : Dict[str, Any] = json.loads(
+                self._map[header_pos:].decode('utf-8'))
+        self.labels : Tuple[str, ...] = tuple(header['labels'])
+        self.codec : Optional[LabelCodec] = None
+        if 'codec' in header:
+            self.codec = LabelCodec(**header['codec'])
+        self.offsets : np.ndarray = np.frombuffer(self._map,
+                dtype=header['offset_dtype'], count=2 * n_tokens,
+                offset=offsets_pos).reshape(-1, 2)
+        self.label_ids : np.ndarray = np.frombuffer(self._map,
+                dtype=header['label_dtype'], count=n_tokens, offset=labels_pos)
+        self.doc_starts : np.ndarray = np.frombuffer(self._map,
+                dtype=np.int64, count=n_docs + 1, offset=doc_starts_pos)
+
+    def __reduce__(self) -> Tuple[Any, Tuple[str]]:
+        return (type(self), (str(self.path),))
+
+    def __len__(self) -> int:
+        return len(self.doc_starts) - 1
+
+    def __getitem__(self, doc_ix : int) -> CorpusDoc:
+        if doc_ix < 0:
+            doc_ix += len(self)
+        if not 0 <= doc_ix < len(self):
+            raise IndexError(doc_ix)
+        first : int = int(self.doc_starts[doc_ix])
+        last : int = int(self.doc_starts[doc_ix + 1])
+        return CorpusDoc(self.offsets[first:last], self.label_ids[first:last])
+
+    def __iter__(self) -> Iterator[CorpusDoc]:
+        for doc_ix in range(len(self)):
+            yield self[doc_ix]
+
+    @property
+    def n_tokens(self) -> int:
+        return int(self.doc_starts[-1])
+
+    def lengths(self) -> np.ndarray:
+        """
+        number of tokens in each document
+        """
+        return np.diff(self.doc_starts)
+
+    def decode(self, doc_ix : int) -> List[str]:
+        """
+        label strings of a document
+        """
+        labels : Tuple[str, ...] = self.labels
+        return [labels[label_id] for label_id in self[doc_ix].label_ids.tolist()]
+
+
+# vim: et ai si sts=4
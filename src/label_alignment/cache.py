@@ -0,0 +1,259 @@
+"""
+opt-in in-memory cache of tokenizations and aligned labels, for
+when the same texts are aligned over and over (every epoch, or for
+every variant of the annotations)
+
+Entries are keyed by a fingerprint of the tokenizer and a hash of
+the text (and, for aligned labels, a hash of the annotations and
+the scheme), and kept in a single least-recently-used cache
+bounded by the (approximate) number of bytes they hold, which
+counts hits, misses and evictions.
+
+    cache = AlignmentCache(wss_tokenizer(), max_bytes=1 << 28)
+    labels = cache.align(text, annotations)
+    ...
+    print(cache.stats())
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import hashlib
+import sys
+import threading
+
+from collections import OrderedDict
+from typing import (
+        Sequence, Mapping, Hashable,
+        Union, Optional, Callable, Any,
+        List, Dict, Tuple, NamedTuple,
+        )
+
+import numpy as np
+import tokenizers.pre_tokenizers as pre_tokenizers
+
+from .alignment import Annotations, align_tokens_and_annotations_bilou
+from .schemes import check_scheme
+from .span_table import SpanTable
+from .tokenized import Tokenized
+
+# default size of the cache (in bytes)
+DEFAULT_CACHE_BYTES : int = 1 << 28
+
+# rough number of bytes per token of a tokenizers.Encoding, not
+# counting the token strings (ids, type ids, offsets, masks, ...)
+_ENCODING_BYTES_PER_TOKEN : int = 64
+
+
+class CacheStats(NamedTuple):
+    hits : int
+    misses : int
+    evictions : int
+    entries : int
+    nbytes : int
+
+
+class LRUCache:
+    """
+    mapping from keys to values, holding at most max_bytes bytes
+    of values (as reported by the caller when the value is put),
+    evicting the least recently used values to make room
+
+    get and put are thread-safe.
+    """
+    def __init__(self, max_bytes : int = DEFAULT_CACHE_BYTES) -> None:
+        if max_bytes < 0:
+            msg = f"max_bytes must not be negative, got {max_bytes}"
+            raise ValueError(msg)
+        self.max_bytes : int = max_bytes
+        self.nbytes : int = 0
+        self.hits : int = 0
+        self.misses : int = 0
+        self.evictions : int = 0
+        self._entries : OrderedDict = OrderedDict()
+        self._lock : threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key : Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key : Hashable, default : Any = None) -> Any:
+        """
+        value for key (making it the most recently used),
+        or default if it isn't cached
+        """
+        with self._lock:
+            entry : Optional[Tuple[Any, int]] = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key : Hashable, value : Any, nbytes : int) -> None:
+        """
+        cache value, which holds nbytes bytes, under key, unless
+        it is bigger than the whole cache
+        """
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous : Optional[Tuple[Any, int]] = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            while self.nbytes + nbytes > self.max_bytes:
+                evicted_key, (evicted, evicted_bytes) = self._entries.popitem(
+                        last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+
+    def clear(self) -> None:
+        """
+        drop all entries (but keep the counts)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions,
+                len(self._entries), self.nbytes)
+
+
+def tokenizer_fingerprint(tokenizer : Any) -> str:
+    """
+    hash of the configuration of a tokenizers.Tokenizer, or of
+    the pre-tokenizer of a simple_tokenizers.PretokenizerWrapper,
+    which changes whenever the tokenizer would tokenize differently
+
+    raises ValueError for other tokenizers, which need an explicit
+    fingerprint
+    """
+    config : bytes
+    pretok : Any = getattr(tokenizer, 'pretok', None)
+    if hasattr(tokenizer, 'to_str'):
+        config = tokenizer.to_str().encode('utf-8')
+    elif isinstance(pretok, pre_tokenizers.PreTokenizer):
+        # (pickled as its JSON configuration)
+        config = pretok.__getstate__()
+    else:
+        msg = (f"can't fingerprint {type(tokenizer).__name__}, "
+                "pass a fingerprint explicitly")
+        raise ValueError(msg)
+    return hashlib.sha256(config).hexdigest()
+
+def text_hash(text : str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+def _update_field(digest : Any, field : bytes) -> None:
+    """
+    add field to digest, prefixed with its length, so that the
+    boundaries between fields can't be shifted by their contents
+    """
+    digest.update(len(field).to_bytes(8, 'little'))
+    digest.update(field)
+
+def annotations_hash(annotations : Annotations) -> bytes:
+    """
+    hash of the start, end and label of each annotation, in order
+    (each field length-prefixed, so labels containing any characters
+    can't collide)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(annotations, SpanTable):
+        digest.update(b'table')
+        for column in (annotations.starts, annotations.ends,
+                annotations.label_ids):
+            _update_field(digest, np.ascontiguousarray(column,
+                dtype=np.int64).tobytes())
+        for label in annotations.labels:
+            _update_field(digest, label.encode('utf-8'))
+        return digest.digest()
+    digest.update(b'spans')
+    for anno in annotations:
+        _update_field(digest, str(anno['start']).encode('ascii'))
+        _update_field(digest, str(anno['end']).encode('ascii'))
+        _update_field(digest, anno['label'].encode('utf-8'))
+    return digest.digest()
+
+def tokenized_nbytes(tokenized : Tokenized) -> int:
+    """
+    approximate number of bytes held by a tokenization
+    """
+    tokens : Sequence[str] = tokenized.tokens
+    nbytes : int = sys.getsizeof(tokens) + sum(map(sys.getsizeof, tokens))
+    bounds : Optional[np.ndarray] = getattr(tokenized, 'bounds', None)
+    if bounds is not None:
+        return nbytes + bounds.nbytes
+    return nbytes + _ENCODING_BYTES_PER_TOKEN * len(tokens)
+
+
+class AlignmentCache:
+    """
+    tokenize and align texts with tokenizer, a
+    simple_tokenizers.PretokenizerWrapper or tokenizers.Tokenizer
+    (or, with an explicit fingerprint, any function from text to a
+    tokenization), caching the results in an LRUCache of max_bytes
+
+    The cached tokenizations and labels are shared between callers,
+    so they must not be modified (align returns a new list each time).
+    """
+    def __init__(self, tokenizer : Any,
+            max_bytes : int = DEFAULT_CACHE_BYTES,
+            fingerprint : Optional[str] = None) -> None:
+        self.fingerprint : str = (tokenizer_fingerprint(tokenizer)
+                if fingerprint is None else fingerprint)
+        self._tokenize : Callable[[str], Tokenized]
+        if hasattr(tokenizer, 'tokenize'):
+            self._tokenize = tokenizer.tokenize
+        elif hasattr(tokenizer, 'encode'):
+            self._tokenize = tokenizer.encode
+        else:
+            self._tokenize = tokenizer
+        self.cache : LRUCache = LRUCache(max_bytes)
+        # label strings shared by all cached alignments
+        self._labels : Dict[str, str] = {}
+
+    def tokenize(self, text : str, key : Optional[bytes] = None) -> Tokenized:
+        """
+        tokenization of text (key, if given, is its text_hash)
+        """
+        cache_key : Tuple[str, str, bytes] = ('tokens', self.fingerprint,
+                text_hash(text) if key is None else key)
+        tokenized : Optional[Tokenized] = self.cache.get(cache_key)
+        if tokenized is None:
+            tokenized = self._tokenize(text)
+            self.cache.put(cache_key, tokenized, tokenized_nbytes(tokenized))
+        return tokenized
+
+    def align(self, text : str, annotations : Annotations,
+            scheme : str = "BILOU") -> List[str]:
+        """
+        labels from alignment.align_tokens_and_annotations_bilou
+        for the tokenization of text and annotations
+        """
+        scheme = check_scheme(scheme)
+        key : bytes = text_hash(text)
+        cache_key : Tuple[str, str, bytes, bytes, str] = ('labels',
+                self.fingerprint, key, annotations_hash(annotations), scheme)
+        labels : Optional[Tuple[str, ...]] = self.cache.get(cache_key)
+        if labels is None:
+            aligned : List[str] = align_tokens_and_annotations_bilou(
+                    self.tokenize(text, key=key), annotations, scheme=scheme)
+            shared = self._labels.setdefault
+            labels = tuple(shared(label, label) for label in aligned)
+            self.cache.put(cache_key, labels, sys.getsizeof(labels))
+        return list(labels)
+
+    def stats(self) -> CacheStats:
+        return self.cache.stats()
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,260 @@
+"""
+read and write labeled tokens in CoNLL column format (one token per
+line, with its label in one of the columns, and a blank line after
+each sentence), one sentence at a time, so that files of any size
+(optionally gzip-compressed) are processed in constant memory
+
+read_conll yields the (tokens, labels) of each sentence, and
+conll_spans feeds them to tok2spans.iob2spans, giving the same
+(text, spans) for each sentence as sax2spans.span_parsed gives for
+an XML document.  align_conll_files re-tokenizes CoNLL files with
+another tokenizer (see pipeline.load_tokenizer), aligning their
+labels with the new tokens and writing them back out as CoNLL, one
+file per worker process.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import gzip
+import io
+import os
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+        Sequence, Iterable, Iterator, TextIO,
+        Union, Optional, Literal,
+        List, Dict, Tuple, NamedTuple, overload,
+        )
+
+from .alignment import align_tokens_and_annotations_bilou
+from .pipeline import cached_tokenizer
+from .schemes import check_scheme
+from .span_annotation import SpanAnnotation
+from .span_table import SpanTable
+from .tok2spans import iob2spans, iob2table
+
+# CoNLL-2003 marks the start of each document with this token
+DOCSTART = '-DOCSTART-'
+
+Sentence = Tuple[List[str], List[str]]
+# text modes which open_conll accepts
+ConllMode = Literal['r', 'w', 'a', 'x']
+
+
+def open_conll(path : Union[Path, str], mode : ConllMode = 'r',
+        compress : Optional[bool] = None) -> TextIO:
+    """
+    open a CoNLL file as text, reading it through gzip if it starts
+    with the gzip magic number, and writing it through gzip if
+    compress (by default, if its name ends with .gz)
+    """
+    gzipped : bool
+    if 'r' in mode:
+        with open(path, 'rb') as f:
+            gzipped = f.read(2) == b'\x1f\x8b'
+    else:
+        gzipped = (str(path).endswith('.gz') if compress is None
+                else compress)
+    if gzipped:
+        return io.TextIOWrapper(gzip.GzipFile(path, mode + 'b'),
+                encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+def read_conll(path : Union[Path, str],
+        token_column : int = 0,
+        label_column : int = -1,
+        delimiter : Optional[str] = None,
+        ) -> Iterator[Sentence]:
+    """
+    yield (tokens, labels) for each sentence in the CoNLL file at
+    path, with the tokens and labels taken from the given columns
+    of each line, split on delimiter (by default, any whitespace)
+
+    Blank lines end sentences, and -DOCSTART- lines are skipped.
+    """
+    tokens : List[str] = []
+    labels : List[str] = []
+    with open_conll(path) as f:
+        for line_no, line in enumerate(f, 1):
+            fields : List[str] = line.rstrip('\r\n').split(delimiter)
+            if not fields or not fields[0] or fields[0] == DOCSTART:
+                if tokens:
+                    yield (tokens, labels)
+                    tokens, labels = [], []
+                continue
+            try:
+                token, label = fields[token_column], fields[label_column]
+            except IndexError:
+                msg = (f"{path}, line {line_no}: expected columns "
+                        f"{token_column} and {label_column}, got "
+                        f"{len(fields)} columns")
+                raise ValueError(msg) from None
+            tokens.append(token)
+            labels.append(label)
+    if tokens:
+        yield (tokens, labels)
+
+@overload
+def conll_spans(path : Union[Path, str],
+        table : Literal[False] = False,
+        default_class : str = "CHUNK",
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        **columns,
+        ) -> Iterator[Tuple[str, List[SpanAnnotation]]]: ...
+@overload
+def conll_spans(path : Union[Path, str],
+        table : Literal[True],
+        default_class : str = "CHUNK",
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        **columns,
+        ) -> Iterator[Tuple[str, SpanTable]]: ...
+@overload
+def conll_spans(path : Union[Path, str],
+        table : bool = False,
+        default_class : str = "CHUNK",
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        **columns,
+        ) -> Iterator[Tuple[str, Union[List[SpanAnnotation], SpanTable]]]: ...
+def conll_spans(path : Union[Path, str],
+        table : bool = False,
+        default_class : str = "CHUNK",
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        **columns,
+        ) -> Iterator[Tuple[str, Union[List[SpanAnnotation], SpanTable]]]:
+    """
+    yield (text, spans) for each sentence in the CoNLL file at path,
+    where text is its tokens joined with single spaces, and spans
+    the annotations from tok2spans.iob2spans of its labels (or, if
+    table, the SpanTable from tok2spans.iob2table)
+
+    default_class, repair and repairs are as for iob2spans, and
+    any other keyword arguments as for read_conll.
+    """
+    for tokens, labels in read_conll(path, **columns):
+        text : str = ' '.join(tokens)
+        if table:
+            yield (text, iob2table(tokens, labels,
+                default_class=default_class, repair=repair, repairs=repairs))
+            continue
+        yield (text, list(iob2spans(tokens, labels,
+            default_class=default_class, repair=repair, repairs=repairs)))
+
+def write_conll(path : Union[Path, str],
+        sentences : Iterable[Tuple[Sequence[str], Sequence[str]]],
+        delimiter : str = ' ') -> int:
+    """
+    write (tokens, labels) for each of sentences to a CoNLL file at
+    path (gzip-compressed, if its name ends with .gz), one token and
+    its label per line, returning the number of sentences written
+
+    Empty sentences are skipped (read_conll could not tell them
+    apart from the blank lines between sentences).  The file is
+    written under a temporary name, and renamed to path at the end.
+    """
+    partial : str = str(path) + '.partial'
+    n_sentences : int = 0
+    try:
+        with open_conll(partial, 'w',
+                compress=str(path).endswith('.gz')) as out:
+            for tokens, labels in sentences:
+                if len(tokens) != len(labels):
+                    msg = (f"sentence {n_sentences} has {len(tokens)} "
+                            f"tokens but {len(labels)} labels")
+                    raise ValueError(msg)
+                if not tokens:
+                    continue
+                out.write(''.join(f'{token}{delimiter}{label}\n'
+                    for token, label in zip(tokens, labels)))
+                out.write('\n')
+                n_sentences += 1
+    except BaseException:
+        # (open_conll may have failed before creating it)
+        Path(partial).unlink(missing_ok=True)
+        raise
+    os.replace(partial, path)
+    return n_sentences
+
+
+class ConllResult(NamedTuple):
+    input_path : str
+    output_path : str
+    sentences : int
+    tokens : int
+    repairs : Dict[str, int]
+
+class ConllTask(NamedTuple):
+    input_path : str
+    output_path : str
+    tokenizer : str
+    scheme : str
+    default_class : str
+    repair : Optional[str]
+
+def align_conll_file(task : ConllTask) -> ConllResult:
+    """
+    re-tokenize the sentences of one CoNLL file with a tokenizer
+    spec, writing the new tokens and their aligned labels to another
+    (runs in the worker processes)
+    """
+    tokenize = cached_tokenizer(task.tokenizer)
+    repairs : Counter = Counter()
+    n_tokens : int = 0
+
+    def aligned() -> Iterator[Tuple[Sequence[str], List[str]]]:
+        nonlocal n_tokens
+        for text, spans in conll_spans(task.input_path, table=True,
+                default_class=task.default_class, repair=task.repair,
+                repairs=repairs):
+            tokenized = tokenize(text)
+            labels : List[str] = align_tokens_and_annotations_bilou(tokenized,
+                    spans, scheme=task.scheme)
+            n_tokens += len(labels)
+            yield (tokenized.tokens, labels)
+
+    n_sentences : int = write_conll(task.output_path, aligned())
+    return ConllResult(task.input_path, task.output_path, n_sentences,
+            n_tokens, dict(repairs))
+
+def align_conll_files(paths : Sequence[Union[Path, str]],
+        output_dir : Union[Path, str],
+        tokenizer : str = 'whitespace_split',
+        scheme : str = "BILOU",
+        default_class : str = "CHUNK",
+        repair : Optional[str] = None,
+        max_workers : Optional[int] = None,
+        ) -> List[ConllResult]:
+    """
+    re-tokenize each CoNLL file in paths with the tokenizer given by
+    the spec (see pipeline.load_tokenizer), writing the new tokens
+    with their labels aligned in scheme to a file of the same name in
+    output_dir, with the files handed out to a ProcessPoolExecutor
+    with max_workers processes (or done in this process, if there
+    is only one file)
+
+    default_class and repair are as for conll_spans.
+
+    returns a result per file, in the order of paths
+    """
+    scheme = check_scheme(scheme)
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    names : List[str] = [Path(path).name for path in paths]
+    if len(set(names)) != len(names):
+        msg = f"input files would overwrite each other in {out}"
+        raise ValueError(msg)
+    tasks : List[ConllTask] = [ConllTask(str(path), str(out / name),
+        tokenizer, scheme, default_class, repair)
+        for path, name in zip(paths, names)]
+    if len(tasks) <= 1:
+        return [align_conll_file(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(align_conll_file, tasks))
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,240 @@
+"""
+convert whole label sequences from one tagging scheme to another
+(e.g. the BILOU labels from alignment to IOB2 for a model trained
+on IOB2), without decoding them to spans and aligning again
+
+The chunks are found with ids2spans.chunk_token_bounds, for all
+the sequences at once, and the tags of the target scheme are then
+written for all chunks at once with NumPy array operations.
+
+Note: IO can't tell where one chunk ends and an adjacent chunk of
+the same class begins, so converting to IO and back merges them.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from collections import Counter
+from itertools import chain
+from typing import (
+        Sequence, Mapping, Iterable,
+        Union, Optional,
+        List, Dict, Tuple, overload,
+        )
+
+import numpy as np
+
+from .ids2spans import chunk_token_bounds
+from .label_codec import LabelCodec
+from .schemes import SCHEMES, SPAN_ROLES, ENDING_SCHEMES
+
+
+def target_codec(source : LabelCodec,
+        target : Union[str, LabelCodec]) -> LabelCodec:
+    """
+    codec for the target scheme (or target itself, if it is
+    already a codec) with the same classes as source
+    """
+    if isinstance(target, LabelCodec):
+        return target
+    return LabelCodec(source.classes, scheme=target,
+            default_class=source.default_class)
+
+def _class_map(source : LabelCodec, target : LabelCodec) -> np.ndarray:
+    """
+    index in target.classes of each of source.classes
+    """
+    missing : List[str] = [label_class for label_class in source.classes
+            if label_class not in target.class_index]
+    if missing:
+        msg = f"classes {missing} are not in {target!r}"
+        raise ValueError(msg)
+    return np.array([target.class_index[label_class]
+        for label_class in source.classes], dtype=np.int64)
+
+def encode_chunks(first_tokens : np.ndarray,
+        last_tokens : np.ndarray,
+        classes : np.ndarray,
+        n_tokens : int,
+        codec : LabelCodec,
+        breaks : Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    array of n_tokens tag ids from codec for the given chunks
+    (as returned by ids2spans.chunk_token_bounds, with classes
+    indexing codec.classes), and O elsewhere
+
+    breaks, if given, marks the first token of each sequence, as
+    for chunk_token_bounds, so that chunks in different sequences
+    are never treated as adjacent (which matters for IOB1 and IOE1).
+    """
+    n_prefixes : int = len(codec.prefixes)
+    bases : np.ndarray = 1 + np.asarray(classes, dtype=np.int64) * n_prefixes
+    lengths : np.ndarray = last_tokens - first_tokens + 1
+    # positions of all the tokens in chunks, with the chunk of each
+    chunk_ixs : np.ndarray = np.repeat(np.arange(len(lengths)), lengths)
+    chunk_starts : np.ndarray = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=chunk_starts[1:])
+    positions : np.ndarray = (np.arange(len(chunk_ixs)) - chunk_starts[chunk_ixs]
+            + first_tokens[chunk_ixs])
+
+    def prefix_ix(prefix : str) -> int:
+        return codec.prefixes.index(prefix)
+
+    out : np.ndarray = np.zeros(n_tokens, dtype=codec.dtype)
+    roles : Optional[str] = SPAN_ROLES.get(codec.scheme)
+    if roles is not None:
+        first, inside, last, single = (prefix_ix(prefix) for prefix in roles)
+        out[positions] = bases[chunk_ixs] + inside
+        out[first_tokens] = bases + first
+        out[last_tokens] = bases + last
+        singles : np.ndarray = lengths == 1
+        out[first_tokens[singles]] = bases[singles] + single
+        return out
+
+    # IOB1 and IOE1: all I, except B at the start (E at the end) of
+    # a chunk which directly follows (precedes) one of the same class
+    out[positions] = bases[chunk_ixs] + prefix_ix("I")
+    adjacent : np.ndarray = ((first_tokens[1:] == last_tokens[:-1] + 1)
+            & (classes[1:] == classes[:-1]))
+    if breaks is not None:
+        adjacent &= ~breaks[first_tokens[1:]]
+    if codec.scheme == "IOB1":
+        out[first_tokens[1:][adjacent]] = bases[1:][adjacent] + prefix_ix("B")
+    else:
+        out[last_tokens[:-1][adjacent]] = bases[:-1][adjacent] + prefix_ix("E")
+    return out
+
+def convert_ids(tag_ids : np.ndarray,
+        source : LabelCodec,
+        target : Union[str, LabelCodec],
+        lengths : Optional[Union[Sequence[int], np.ndarray]] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None) -> np.ndarray:
+    """
+    tag ids from source converted to the equivalent tag ids from
+    target (a scheme name, for a codec with the same classes, or a
+    codec with at least the classes of source)
+
+    tag_ids is one sequence, or, with lengths, several sequences
+    one after another (which are converted in one pass, without
+    chunks continuing from one to the next)
+
+    repair and repairs are as for ids2spans.chunk_token_bounds.
+    For IOE1 and IOE2, an E which doesn't end a longer chunk and
+    an I after O are both normal, so there is nothing to repair,
+    and passing a repair policy raises ValueError.
+    """
+    if repair is not None and source.scheme in ENDING_SCHEMES:
+        msg = (f"{source.scheme} has no stray or orphan tags, so "
+                f"repair policy {repair!r} does not apply")
+        raise ValueError(msg)
+    target = target_codec(source, target)
+    tag_ids = np.asarray(tag_ids)
+    n_tokens : int = len(tag_ids)
+    breaks : Optional[np.ndarray] = None
+    if lengths is not None:
+        seq_lengths : np.ndarray = np.asarray(lengths, dtype=np.int64)
+        if seq_lengths.sum() != n_tokens:
+            msg = (f"lengths add up to {seq_lengths.sum()}, but there are "
+                    f"{n_tokens} tag ids")
+            raise ValueError(msg)
+        breaks = np.zeros(n_tokens + 1, dtype=bool)
+        breaks[np.cumsum(seq_lengths) - seq_lengths] = True
+        breaks = breaks[:n_tokens]
+    first_tokens, last_tokens, classes = chunk_token_bounds(tag_ids, source,
+            breaks=breaks, repair=repair, repairs=repairs)
+    if target.classes != source.classes:
+        classes = _class_map(source, target)[classes]
+    return encode_chunks(first_tokens, last_tokens, classes, n_tokens,
+            target, breaks=breaks)
+
+@overload
+def convert(labels : np.ndarray,
+        source : Union[str, LabelCodec],
+        target : Union[str, LabelCodec],
+        lengths : Optional[Union[Sequence[int], np.ndarray]] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> np.ndarray: ...
+@overload
+def convert(labels : Sequence[np.ndarray],
+        source : Union[str, LabelCodec],
+        target : Union[str, LabelCodec],
+        lengths : None = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> List[np.ndarray]: ...
+@overload
+def convert(labels : Sequence[Sequence[Optional[str]]],
+        source : Union[str, LabelCodec],
+        target : Union[str, LabelCodec],
+        lengths : None = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> List[List[str]]: ...
+def convert(labels : Union[np.ndarray, Sequence[Sequence[Optional[str]]],
+            Sequence[np.ndarray]],
+        source : Union[str, LabelCodec],
+        target : Union[str, LabelCodec],
+        lengths : Optional[Union[Sequence[int], np.ndarray]] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> Union[np.ndarray, List[List[str]], List[np.ndarray]]:
+    """
+    convert a corpus of label sequences from the source scheme
+    to the target scheme, where labels can be
+
+    - a list of sequences of label strings, with source and target
+      either scheme names or codecs, giving a list of lists of strings
+    - a list of arrays of tag ids from source (a LabelCodec), giving
+      a list of arrays of tag ids from target
+    - one flat array of tag ids from source, for all sequences one
+      after another, with lengths giving the length of each,
+      giving a flat array of tag ids from target
+
+    repair and repairs are as for convert_ids.
+    """
+    if lengths is not None or isinstance(labels, np.ndarray):
+        if not isinstance(source, LabelCodec):
+            msg = "converting tag ids needs the LabelCodec which encoded them"
+            raise ValueError(msg)
+        return convert_ids(np.asarray(labels), source, target,
+                lengths=lengths, repair=repair, repairs=repairs)
+    seq_lengths : np.ndarray = np.fromiter(map(len, labels), dtype=np.int64,
+            count=len(labels))
+    bounds : List[int] = np.cumsum(seq_lengths).tolist()
+    is_ids : bool = any(isinstance(seq, np.ndarray) and seq.dtype.kind in 'iu'
+            for seq in labels)
+    if is_ids:
+        if not isinstance(source, LabelCodec):
+            msg = "converting tag ids needs the LabelCodec which encoded them"
+            raise ValueError(msg)
+        flat : np.ndarray = (np.concatenate([np.asarray(seq) for seq in labels])
+                if len(labels) else np.zeros(0, dtype=source.dtype))
+        converted : np.ndarray = convert_ids(flat, source, target,
+                lengths=seq_lengths, repair=repair, repairs=repairs)
+        return np.split(converted, bounds[:-1]) if len(labels) else []
+
+    # distinct labels, in order of first appearance
+    distinct : Dict[Optional[str], None] = dict.fromkeys(
+            chain.from_iterable(labels))
+    codec : LabelCodec = (source if isinstance(source, LabelCodec) else
+            LabelCodec.from_labels(distinct, scheme=source))
+    label_index : Dict[Optional[str], int] = {label: tag_id
+            for label, tag_id in codec.label_index.items()}
+    for label in distinct:
+        if label not in label_index:
+            # e.g. None, or S-PER in BILOU
+            label_index[label] = codec.encode(label)
+    flat = np.fromiter(map(label_index.__getitem__,
+        chain.from_iterable(labels)), dtype=codec.dtype,
+        count=int(seq_lengths.sum()))
+    target = target_codec(codec, target)
+    converted = convert_ids(flat, codec, target, lengths=seq_lengths,
+            repair=repair, repairs=repairs)
+    strings : List[str] = np.array(target.labels,
+            dtype=object)[converted].tolist()
+    return [strings[stop - n:stop]
+            for stop, n in zip(bounds, seq_lengths.tolist())]
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,399 @@
+"""
+persistent on-disk cache of parsed and aligned documents, shared
+by re-runs and by many worker processes, so that unchanged
+documents skip parsing and alignment altogether
+
+The cache is a directory of append-only segment files.  Each
+DiskCache appends to a segment of its own (so writers never share
+a file), one record at a time, each record being
+
+    magic, key length, value length, CRC-32 of key and value
+    key
+    value
+
+Readers memory-map all the segments and index the complete records
+by their headers and keys (a record still being written fails its
+length check, and is picked up by a later refresh, and a corrupt
+one fails its CRC check when read), so any number of processes can
+read and write the same directory without file locks.  Since each
+run adds segments, DiskCache.compact merges them into one.  Entries are never
+updated in place: a key always maps to the same value, since it
+hashes everything the value depends on (the content of the file,
+the tokenizer fingerprint and the library version).
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+
+from io import BytesIO
+from pathlib import Path
+from typing import (
+        Sequence, Union, Optional, Callable, Any,
+        List, Dict, Tuple, Literal, overload,
+        )
+
+import numpy as np
+
+from .__about__ import __version__
+from .alignment import align_tokens_and_annotations_bilou
+from .expat2spans import expat_parsed
+from .schemes import check_scheme
+from .span_annotation import SpanAnnotation
+from .span_table import SpanTable
+from .tokenized import Tokenized
+
+_MAGIC = b'LAC1'
+_HEADER = struct.Struct('<4sIII')
+SEGMENT_SUFFIX = '.seg'
+
+
+class _Segment:
+    """
+    a memory-mapped segment file, indexed up to offset
+    """
+    def __init__(self, path : Path) -> None:
+        self.path : Path = path
+        self.offset : int = 0
+        self.map : Optional[mmap.mmap] = None
+
+    def remap(self) -> Optional[mmap.mmap]:
+        """
+        map the whole file as it is now (if it has grown, and
+        still exists)
+        """
+        try:
+            size : int = self.path.stat().st_size
+        except FileNotFoundError:
+            # removed by compact, in another process
+            return self.map
+        if self.map is not None and len(self.map) >= size:
+            return self.map
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if size:
+            with open(self.path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class DiskCache:
+    """
+    mapping from (hashed) keys to bytes, stored in directory
+
+    get only sees records which were complete when the directory
+    was last scanned (on opening, and by refresh), plus those put
+    through this DiskCache.  Scanning reads just the header and key
+    of each record, and get checks the CRC of the records it reads
+    (a record which fails is a miss).
+
+    get, put and refresh are thread-safe.
+    """
+    def __init__(self, directory : Union[Path, str]) -> None:
+        self.directory : Path = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits : int = 0
+        self.misses : int = 0
+        self._segments : Dict[str, _Segment] = {}
+        # key -> (segment name, offset of record)
+        self._index : Dict[bytes, Tuple[str, int]] = {}
+        self._own : Optional[str] = None
+        self._fd : Optional[int] = None
+        self._lock : threading.Lock = threading.Lock()
+        self.refresh()
+
+    def __enter__(self) -> "DiskCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key : bytes) -> bool:
+        return key in self._index
+
+    def segments(self) -> List[Path]:
+        """
+        segment files in the directory
+        """
+        return sorted(self.directory.glob('*' + SEGMENT_SUFFIX))
+
+    def refresh(self) -> None:
+        """
+        index any segments, or records, added since the last scan
+        """
+        with self._lock:
+            for path in self.segments():
+                segment : Optional[_Segment] = self._segments.get(path.name)
+                if segment is None:
+                    segment = self._segments[path.name] = _Segment(path)
+                self._scan(segment)
+
+    def _scan(self, segment : _Segment) -> None:
+        data : Optional[mmap.mmap] = segment.remap()
+        if data is None:
+            return
+        name : str = segment.path.name
+        index : Dict[bytes, Tuple[str, int]] = self._index
+        offset : int = segment.offset
+        size : int = len(data)
+        while offset + _HEADER.size <= size:
+            magic, key_len, value_len, crc = _HEADER.unpack_from(data, offset)
+            start : int = offset + _HEADER.size
+            end : int = start + key_len + value_len
+            if magic != _MAGIC or end > size:
+                # (the rest is still being written)
+                break
+            index.setdefault(data[start:start + key_len], (name, offset))
+            offset = end
+        segment.offset = offset
+
+    def _read(self, name : str, offset : int) -> Optional[bytes]:
+        """
+        value of the record at offset in segment name, if it is intact
+        """
+        segment : _Segment = self._segments[name]
+        data : Optional[mmap.mmap] = segment.map
+        if data is None or len(data) < offset + _HEADER.size:
+            # put by this DiskCache since the segment was mapped
+            data = segment.remap()
+        if data is None:
+            return None
+        magic, key_len, value_len, crc = _HEADER.unpack_from(data, offset)
+        start : int = offset + _HEADER.size
+        end : int = start + key_len + value_len
+        if magic != _MAGIC or end > len(data):
+            return None
+        record : bytes = data[start:end]
+        if zlib.crc32(record) != crc:
+            return None
+        return record[key_len:]
+
+    def get(self, key : bytes) -> Optional[bytes]:
+        """
+        value cached for key, or None
+        """
+        with self._lock:
+            entry : Optional[Tuple[str, int]] = self._index.get(key)
+            value : Optional[bytes] = None
+            if entry is not None:
+                value = self._read(*entry)
+                if value is None:
+                    # torn or corrupt, so forget it (put can replace it)
+                    del self._index[key]
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key : bytes, value : bytes) -> None:
+        """
+        append a record for key to this DiskCache's own segment
+        """
+        if key in self._index:
+            return
+        record : bytes = (_HEADER.pack(_MAGIC, len(key), len(value),
+            zlib.crc32(key + value)) + key + value)
+        with self._lock:
+            own : Optional[str] = self._own
+            if self._fd is None or own is None:
+                own = (f'segment-{os.getpid()}-{uuid.uuid4().hex[:12]}'
+                        + SEGMENT_SUFFIX)
+                path : Path = self.directory / own
+                self._fd = os.open(path,
+                        os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                self._segments[own] = _Segment(path)
+                self._own = own
+            segment : _Segment = self._segments[own]
+            offset : int = segment.offset
+            os.write(self._fd, record)
+            segment.offset = offset + len(record)
+            self._index[key] = (own, offset)
+
+    def compact(self) -> None:
+        """
+        rewrite all the intact records in the directory into a
+        single new segment, and remove all the other segments
+
+        Each run (and each worker process) adds a segment, so compact
+        now and then, but only while no other process is using the
+        cache (their records would be lost, though not corrupted).
+        """
+        self.refresh()
+        with self._lock:
+            name : str = (f'segment-{os.getpid()}-{uuid.uuid4().hex[:12]}'
+                    + SEGMENT_SUFFIX)
+            partial : Path = self.directory / (name + '.partial')
+            index : Dict[bytes, Tuple[str, int]] = {}
+            offset : int = 0
+            with open(partial, 'wb') as out:
+                for key, entry in self._index.items():
+                    value : Optional[bytes] = self._read(*entry)
+                    if value is None:
+                        continue
+                    record : bytes = (_HEADER.pack(_MAGIC, len(key),
+                        len(value), zlib.crc32(key + value)) + key + value)
+                    out.write(record)
+                    index[key] = (name, offset)
+                    offset += len(record)
+            os.replace(partial, self.directory / name)
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                self._own = None
+            for segment in self._segments.values():
+                segment.close()
+                segment.path.unlink(missing_ok=True)
+            segment = _Segment(self.directory / name)
+            segment.offset = offset
+            self._segments = {name: segment}
+            self._index = index
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            for segment in self._segments.values():
+                segment.close()
+
+
+def cache_key(*parts : Union[str, bytes]) -> bytes:
+    """
+    key for a cache entry depending on parts (and the library version)
+    """
+    digest = hashlib.sha256(__version__.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.digest()
+
+def _pack(header : Dict[str, Any], *arrays : np.ndarray) -> bytes:
+    """
+    a JSON header, followed by the contents of arrays
+    """
+    encoded : bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    return b''.join([len(encoded).to_bytes(4, 'little'), encoded]
+            + [np.ascontiguousarray(array).tobytes() for array in arrays])
+
+def _unpack(value : bytes) -> Tuple[Dict[str, Any], memoryview]:
+    """
+    header and the bytes of the arrays which follow it
+    """
+    n : int = int.from_bytes(value[:4], 'little')
+    return (json.loads(value[4:4 + n].decode('utf-8')),
+            memoryview(value)[4 + n:])
+
+def pack_parsed(text : str, spans : SpanTable) -> bytes:
+    return _pack({'text': text, 'labels': list(spans.labels)},
+            spans.starts, spans.ends, spans.label_ids.astype(np.int64))
+
+def unpack_parsed(value : bytes) -> Tuple[str, SpanTable]:
+    header, rest = _unpack(value)
+    columns : np.ndarray = np.frombuffer(rest, dtype=np.int64).reshape(3, -1)
+    return (header['text'], SpanTable(columns[0].copy(), columns[1].copy(),
+        columns[2].copy(), header['labels']))
+
+def pack_labels(labels : Sequence[str]) -> bytes:
+    vocab : Dict[str, int] = {}
+    ids : np.ndarray = np.fromiter((vocab.setdefault(label, len(vocab))
+        for label in labels), dtype=np.int32, count=len(labels))
+    return _pack({'vocab': list(vocab)}, ids)
+
+def unpack_labels(value : bytes) -> List[str]:
+    header, rest = _unpack(value)
+    vocab : List[str] = header['vocab']
+    return [vocab[i] for i in np.frombuffer(rest, dtype=np.int32).tolist()]
+
+
+def file_hash(path : Union[Path, str]) -> Tuple[bytes, bytes]:
+    """
+    contents of the file at path, and their SHA-256 digest
+    """
+    content : bytes = Path(path).read_bytes()
+    return (content, hashlib.sha256(content).digest())
+
+@overload
+def cached_span_parsed(path : Union[Path, str],
+        cache : DiskCache,
+        table : Literal[False] = False,
+        ) -> Tuple[str, List[SpanAnnotation]]: ...
+@overload
+def cached_span_parsed(path : Union[Path, str],
+        cache : DiskCache,
+        table : Literal[True],
+        ) -> Tuple[str, SpanTable]: ...
+@overload
+def cached_span_parsed(path : Union[Path, str],
+        cache : DiskCache,
+        table : bool = False,
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]: ...
+def cached_span_parsed(path : Union[Path, str],
+        cache : DiskCache,
+        table : bool = False,
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]:
+    """
+    same (text, spans) as sax2spans.span_parsed(path, table=table),
+    from cache if the file has been parsed before (by the same
+    version of the library), otherwise parsed with
+    expat2spans.expat_parsed and added to cache
+    """
+    content, digest = file_hash(path)
+    text, spans = _parsed(content, digest, cache)
+    return (text, spans if table else spans.to_annotations())
+
+def _parsed(content : bytes, digest : bytes,
+        cache : DiskCache) -> Tuple[str, SpanTable]:
+    key : bytes = cache_key('parsed', digest)
+    value : Optional[bytes] = cache.get(key)
+    if value is not None:
+        return unpack_parsed(value)
+    text, spans = expat_parsed(BytesIO(content), table=True)
+    cache.put(key, pack_parsed(text, spans))
+    return (text, spans)
+
+def cached_align(path : Union[Path, str],
+        tokenize : Callable[[str], Tokenized],
+        fingerprint : str,
+        cache : DiskCache,
+        scheme : str = "BILOU") -> List[str]:
+    """
+    labels from alignment.align_tokens_and_annotations_bilou
+    for the annotated XML file at path, tokenized with tokenize
+    (whose configuration fingerprint identifies, e.g. from
+    cache.tokenizer_fingerprint), from cache if the file has been
+    aligned before with the same tokenizer (and version of the
+    library), without parsing or tokenizing it
+    """
+    scheme = check_scheme(scheme)
+    content, digest = file_hash(path)
+    key : bytes = cache_key('labels', digest, fingerprint, scheme)
+    value : Optional[bytes] = cache.get(key)
+    if value is not None:
+        return unpack_labels(value)
+    text, spans = _parsed(content, digest, cache)
+    labels : List[str] = align_tokens_and_annotations_bilou(tokenize(text),
+            spans, scheme=scheme)
+    cache.put(key, pack_labels(labels))
+    return labels
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,138 @@
+"""
+faster alternative to sax2spans.span_parsed, built directly on
+xml.parsers.expat (with buffer_text enabled) rather than on
+the xml.sax layer, and accumulating text in lists rather than
+by repeated string concatenation
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from pathlib import Path
+from typing import (Sequence, Mapping, Union, Optional,
+        Tuple, List, Dict, BinaryIO,
+        Literal, overload,
+        )
+
+from xml.parsers import expat
+
+from .span_annotation import SpanAnnotation
+from .span_table import SpanTable, SpanTableBuilder
+
+
+class ExpatSpanReader:
+    """
+    collects the same text and spans as sax2spans.SpanAndText
+    followed by sax2spans.text_and_spans:
+
+    - text is only kept inside <p> elements, and each paragraph
+      is followed by a newline
+    - text directly inside any other element is labeled with
+      the name of that element
+    """
+    def __init__(self, buffer_size : int = 1 << 16) -> None:
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.buffer_size = buffer_size
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.parser.CharacterDataHandler = self.characters
+
+        # completed paragraphs
+        self.chunks : List[str] = []
+        self.spans : SpanTableBuilder = SpanTableBuilder()
+        self.offset : int = 0
+
+        # current paragraph (None when outside any paragraph)
+        self.paragraph_chunks : Optional[List[str]] = []
+        self.paragraph_spans : List[Tuple[int, int, str]] = []
+        self.paragraph_length : int = 0
+        self.current_tag : Optional[str] = None
+        self.current_text : Optional[List[str]] = None
+
+    def maybe_append_current(self) -> None:
+        if self.current_text is not None and self.paragraph_chunks is not None:
+            chunk_text : str = ''.join(self.current_text)
+            self.paragraph_chunks.append(chunk_text)
+            end : int = self.paragraph_length + len(chunk_text)
+            if self.current_tag:
+                self.paragraph_spans.append((self.paragraph_length, end,
+                    self.current_tag))
+            self.paragraph_length = end
+        self.current_text = None
+
+    def start_element(self, name : str, attrs : Dict[str, str]) -> None:
+        if name == 'doc':
+            return
+        if name == 'p':
+            self.paragraph_chunks = []
+            self.paragraph_spans = []
+            self.paragraph_length = 0
+            self.current_text = None
+            return
+        self.maybe_append_current()
+        self.current_tag = name
+
+    def end_element(self, name : str) -> None:
+        if name == 'doc':
+            return
+        self.maybe_append_current()
+        if name == 'p':
+            if self.paragraph_chunks is not None:
+                self.end_paragraph(self.paragraph_chunks)
+            self.paragraph_chunks = None
+        else:
+            self.current_tag = None
+
+    def end_paragraph(self, paragraph_chunks : List[str]) -> None:
+        offset : int = self.offset
+        add = self.spans.add
+        for start, end, label in self.paragraph_spans:
+            add(offset + start, offset + end, label)
+        self.chunks.extend(paragraph_chunks)
+        self.chunks.append('\n')
+        self.offset = offset + self.paragraph_length + 1
+
+    def characters(self, ch : str) -> None:
+        if self.paragraph_chunks is None:
+            return
+        if self.current_text is None:
+            self.current_text = [ch]
+        else:
+            self.current_text.append(ch)
+
+    def parse(self, source : Union[Path, str, BinaryIO]) -> None:
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as f:
+                self.parser.ParseFile(f)
+        else:
+            self.parser.ParseFile(source)
+
+    def text(self) -> str:
+        return ''.join(self.chunks)
+
+
+@overload
+def expat_parsed(p : Union[Path, str, BinaryIO],
+        table : Literal[False] = False) -> Tuple[str, List[SpanAnnotation]]: ...
+@overload
+def expat_parsed(p : Union[Path, str, BinaryIO],
+        table : Literal[True]) -> Tuple[str, SpanTable]: ...
+@overload
+def expat_parsed(p : Union[Path, str, BinaryIO],
+        table : bool = False
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]: ...
+def expat_parsed(p : Union[Path, str, BinaryIO],
+        table : bool = False
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]:
+    """
+    same (text, spans) as sax2spans.span_parsed(p, table=table)
+    """
+    reader : ExpatSpanReader = ExpatSpanReader()
+    reader.parse(p)
+    spans : SpanTable = reader.spans.build()
+    if table:
+        return (reader.text(), spans)
+    return (reader.text(), spans.to_annotations())
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,390 @@
+"""
+transform arrays of tag ids (see label_codec.LabelCodec) into
+character-offset spans, using NumPy array operations instead of
+stepping through the iob_state state machine one token at a time
+
+Produces the same spans as tok2spans.iob2spans, except that
+
+- tag ids always carry a class, so a bare "I" (which iob2spans
+  treats as continuing any chunk) has to be encoded with the
+  codec's default class, and
+- for IOE1 and IOE2 codecs, a lone E is a single-token chunk
+  (which iob2spans rejects as having no chunk to end), and an
+  I or E never continues a chunk of another class.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from collections import Counter
+from typing import (
+        Sequence, Mapping,
+        Union, Optional,
+        List, Tuple,
+        )
+
+import numpy as np
+
+from .iob_state import UnexpectedLabel
+from .label_codec import LabelCodec
+from .repair import check_repair, count_repairs
+from .schemes import ENDING_SCHEMES
+from .span_table import SpanTable, BatchSpanTable, ScoreColumns
+
+_B, _I, _O, _E, _L, _U, _S = (ord(prefix) for prefix in "BIOELUS")
+
+# arrays of token indices of the first and last tokens of each
+# chunk, and the index (into codec.classes) of its class
+ChunkBounds = Tuple[np.ndarray, np.ndarray, np.ndarray]
+# arrays of start and end character offsets of each chunk, and
+# the index (into codec.classes) of its class
+DecodedSpans = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def chunk_token_bounds(tag_ids : np.ndarray,
+        codec : LabelCodec,
+        breaks : Optional[np.ndarray] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None) -> ChunkBounds:
+    """
+    find the chunks in a sequence of tag ids, following the
+    same (permissive) rules as iob_state:
+
+    - B, U and S always start a new chunk
+    - I starts a new chunk unless the previous token was
+      B or I of the same class
+    - E and L extend the current chunk (whatever its class)
+      and raise UnexpectedLabel if there is none
+    - U, S, E and L end the chunk at the current token,
+      and O or a new chunk ends it at the previous token
+
+    except that for codecs of the IOE1 and IOE2 schemes, where a
+    lone E is a single-token chunk, E starts a new chunk unless the
+    previous token is an I of the same class (so it never raises).
+
+    breaks, if given, is a boolean array marking tokens which
+    start a new sequence (e.g. the first token of each document
+    in several concatenated documents), so that no chunk 
+    continues across them.
+
+    repair, if given, is a policy from repair.REPAIR_POLICIES for
+    stray E/L and orphan I tags, which are then repaired rather
+    than raising UnexpectedLabel, and counted in repairs (if given)
+    as by repair.repair_labels.  IOE1 and IOE2 have nothing to
+    repair, so a repair policy for their codecs raises ValueError.
+
+    Raises ValueError for ids which are not tags of codec.
+    """
+    tag_ids = np.asarray(tag_ids)
+    codec.check_ids(tag_ids)
+    prefixes : np.ndarray = codec.tag_prefixes[tag_ids]
+    classes : np.ndarray = codec.tag_classes[tag_ids]
+    n_tokens : int = len(tag_ids)
+    if repair is not None:
+        check_repair(repair)
+    if codec.scheme in ENDING_SCHEMES:
+        if repair is not None:
+            msg = (f"{codec.scheme} has no stray or orphan tags, so "
+                    f"repair policy {repair!r} does not apply")
+            raise ValueError(msg)
+        return _ending_chunk_bounds(prefixes, classes, breaks)
+    if repair == "drop":
+        prefixes, classes = _drop_unattached(prefixes, classes, breaks,
+                repairs)
+
+    in_chunk : np.ndarray = prefixes != _O
+    is_inside : np.ndarray = prefixes == _I
+    # is the previous token in a chunk which is still open?
+    open_before : np.ndarray = np.zeros(n_tokens, dtype=bool)
+    open_before[1:] = (prefixes[:-1] == _B) | is_inside[:-1]
+    if breaks is not None:
+        open_before &= ~breaks
+    same_before : np.ndarray = np.zeros(n_tokens, dtype=bool)
+    same_before[1:] = classes[1:] == classes[:-1]
+
+    ending : np.ndarray = (prefixes == _E) | (prefixes == _L)
+    stray : np.ndarray = ending & ~open_before
+    if repair is None and stray.any():
+        token_ix = int(np.argmax(stray))
+        which = chr(prefixes[token_ix])
+        msg = (f"not expecting {which} (end of anno) when Outside any "
+                f"current SpanAnnotation (token {token_ix})")
+        raise UnexpectedLabel(msg)
+
+    orphans : np.ndarray = is_inside & ~(open_before & same_before)
+    starts : np.ndarray = (
+            (prefixes == _B) | (prefixes == _U) | (prefixes == _S)
+            | orphans
+            )
+    if repair == "convert":
+        # stray E and L become single-token chunks
+        starts |= stray
+        if repairs is not None:
+            count_repairs(repairs, n_stray=int(stray.sum()),
+                    n_orphan=int(orphans.sum()))
+    continues : np.ndarray = in_chunk & ~starts
+    lasts : np.ndarray = in_chunk.copy()
+    lasts[:-1] &= ~continues[1:]
+
+    first_tokens : np.ndarray = np.flatnonzero(starts)
+    last_tokens : np.ndarray = np.flatnonzero(lasts)
+    return (first_tokens, last_tokens, classes[first_tokens])
+
+def _ending_chunk_bounds(prefixes : np.ndarray, classes : np.ndarray,
+        breaks : Optional[np.ndarray] = None) -> ChunkBounds:
+    """
+    chunk_token_bounds for IOE1 and IOE2, where I continues an
+    open chunk (an I of the same class) or starts one, and E does
+    the same but also closes it
+    """
+    n_tokens : int = len(prefixes)
+    in_chunk : np.ndarray = prefixes != _O
+    continues : np.ndarray = np.zeros(n_tokens, dtype=bool)
+    continues[1:] = (in_chunk[1:] & (prefixes[:-1] == _I)
+            & (classes[1:] == classes[:-1]))
+    if breaks is not None:
+        continues &= ~breaks
+    starts : np.ndarray = in_chunk & ~continues
+    lasts : np.ndarray = in_chunk.copy()
+    lasts[:-1] &= ~continues[1:]
+    first_tokens : np.ndarray = np.flatnonzero(starts)
+    return (first_tokens, np.flatnonzero(lasts), classes[first_tokens])
+
+def _drop_unattached(prefixes : np.ndarray, classes : np.ndarray,
+        breaks : Optional[np.ndarray] = None,
+        repairs : Optional[Counter] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    prefixes and classes with stray E/L and orphan I tags replaced
+    by O, as the "drop" repair policy does one token at a time
+
+    Once a token is dropped, everything up to the next B, U, S
+    or O is stray or orphaned too, so an I, E or L is kept only if
+    the latest B, U, S or O before it (its anchor) is a B in the
+    same sequence, and all tokens between them are I of the class
+    of that B (and the token itself is such an I, or an E or L).
+    """
+    n_tokens : int = len(prefixes)
+    positions : np.ndarray = np.arange(n_tokens)
+    anchors : np.ndarray = ((prefixes == _B) | (prefixes == _U)
+            | (prefixes == _S) | (prefixes == _O))
+    anchor_ixs : np.ndarray = np.maximum.accumulate(
+            np.where(anchors, positions, -1)) if n_tokens else positions
+    has_anchor : np.ndarray = anchor_ixs >= 0
+    anchor_ixs = np.maximum(anchor_ixs, 0)
+    attached : np.ndarray = has_anchor & (prefixes[anchor_ixs] == _B)
+    if breaks is not None:
+        n_breaks : np.ndarray = np.cumsum(breaks)
+        attached &= n_breaks == n_breaks[anchor_ixs]
+    ending : np.ndarray = (prefixes == _E) | (prefixes == _L)
+    clean : np.ndarray = (prefixes == _I) & (classes == classes[anchor_ixs])
+    # number of continuation tokens up to each position which
+    # are not clean
+    n_unclean : np.ndarray = np.cumsum(~anchors & ~clean)
+    unclean_before : np.ndarray = np.zeros(n_tokens, dtype=np.int64)
+    unclean_before[1:] = n_unclean[:-1]
+    attached &= unclean_before == n_unclean[anchor_ixs]
+    dropped : np.ndarray = ~anchors & ~(attached & (clean | ending))
+    if repairs is not None:
+        count_repairs(repairs, n_stray=int((dropped & ending).sum()),
+                n_orphan=int((dropped & ~ending).sum()))
+    return (np.where(dropped, _O, prefixes).astype(prefixes.dtype),
+            np.where(dropped, -1, classes).astype(classes.dtype))
+
+def token_starts(lengths : np.ndarray,
+        widths : Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    character offset of the start of each token, in the string
+    which would result from concatenating tokens of the given lengths
+    with a single space as delimiter (as assumed by iob2spans),
+    or, if given, with widths[i] characters of delimiter before 
+    token i (see subwords.SubwordRule)
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts : np.ndarray = np.zeros(len(lengths), dtype=np.int64)
+    if widths is None:
+        np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    else:
+        widths = np.asarray(widths, dtype=np.int64)
+        np.cumsum(lengths[:-1] + widths[1:], out=starts[1:])
+    return starts
+
+def ids2spans(tag_ids : np.ndarray,
+        codec : LabelCodec,
+        lengths : Optional[np.ndarray] = None,
+        offsets : Optional[np.ndarray] = None,
+        ) -> DecodedSpans:
+    """
+    array equivalent of tok2spans.iob2spans
+
+    given an array of tag ids from codec, and either
+
+    - the lengths of the corresponding tokens, in which case the
+      offsets are into the string which would result from
+      concatenating tokens with a single space as delimiter,
+      as for iob2spans, or
+    - the (start, end) character offsets of each token, as
+      an array of shape (n_tokens, 2)
+
+    return arrays of the start and end offsets of each span,
+    and of the index of its class in codec.classes.
+    """
+    if (lengths is None) == (offsets is None):
+        msg = "ids2spans needs exactly one of lengths or offsets"
+        raise ValueError(msg)
+    first_tokens, last_tokens, classes = chunk_token_bounds(tag_ids, codec)
+    starts, ends = chunk_offsets(first_tokens, last_tokens,
+            lengths=lengths, offsets=offsets)
+    return (starts, ends, classes)
+
+def chunk_offsets(first_tokens : np.ndarray,
+        last_tokens : np.ndarray,
+        lengths : Optional[np.ndarray] = None,
+        offsets : Optional[np.ndarray] = None,
+        ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    start and end character offsets of chunks from their first
+    and last token indices, given either token lengths or 
+    offsets (as for ids2spans)
+    """
+    if offsets is not None:
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        return (offsets[first_tokens, 0], offsets[last_tokens, 1])
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts : np.ndarray = token_starts(lengths)
+    return (starts[first_tokens], starts[last_tokens] + lengths[last_tokens])
+
+def span_scores(token_scores : np.ndarray,
+        first_tokens : np.ndarray,
+        last_tokens : np.ndarray) -> ScoreColumns:
+    """
+    mean, min and product of token_scores over the tokens from
+    first_tokens[i] to last_tokens[i] (inclusive) of each span,
+    each reduced over all spans at once with ufunc.reduceat
+
+    token_scores would typically be the probability of each 
+    token's predicted tag (with log-probabilities, the mean and
+    min still make sense, but the product doesn't).
+    """
+    token_scores = np.asarray(token_scores, dtype=np.float64)
+    first_tokens = np.asarray(first_tokens, dtype=np.intp)
+    last_tokens = np.asarray(last_tokens, dtype=np.intp)
+    if not len(first_tokens):
+        empty = np.zeros(0, dtype=np.float64)
+        return ScoreColumns(empty, empty, empty)
+    # reduceat reduces between consecutive indices, so interleave
+    # the starts and (exclusive) ends of the spans and keep every 
+    # other result, with a dummy score for spans ending at the end
+    padded : np.ndarray = np.append(token_scores, 0.0)
+    bounds : np.ndarray = np.empty(2 * len(first_tokens), dtype=np.intp)
+    bounds[0::2] = first_tokens
+    bounds[1::2] = last_tokens + 1
+    counts : np.ndarray = last_tokens - first_tokens + 1
+    return ScoreColumns(
+            np.add.reduceat(padded, bounds)[0::2] / counts,
+            np.minimum.reduceat(padded, bounds)[0::2],
+            np.multiply.reduceat(padded, bounds)[0::2],
+            )
+
+def ids2table(tag_ids : np.ndarray,
+        codec : LabelCodec,
+        lengths : Optional[np.ndarray] = None,
+        offsets : Optional[np.ndarray] = None,
+        token_scores : Optional[np.ndarray] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> SpanTable:
+    """
+    same as ids2spans, but returning a span_table.SpanTable
+    whose labels are codec.classes
+
+    If token_scores (one per token, e.g. the probability of its
+    tag) are given, the table also has their mean, min and
+    product over each span as its scores (see span_scores).
+
+    repair and repairs are as for chunk_token_bounds.
+    """
+    if (lengths is None) == (offsets is None):
+        msg = "ids2table needs exactly one of lengths or offsets"
+        raise ValueError(msg)
+    first_tokens, last_tokens, classes = chunk_token_bounds(tag_ids, codec,
+            repair=repair, repairs=repairs)
+    starts, ends = chunk_offsets(first_tokens, last_tokens,
+            lengths=lengths, offsets=offsets)
+    scores : Optional[ScoreColumns] = None
+    if token_scores is not None:
+        scores = span_scores(token_scores, first_tokens, last_tokens)
+    return SpanTable(starts, ends, classes, codec.classes, scores=scores)
+
+def iob2spans_batch(tag_ids : np.ndarray,
+        codec : LabelCodec,
+        attention_mask : Optional[np.ndarray] = None,
+        special_tokens_mask : Optional[np.ndarray] = None,
+        offsets : Optional[np.ndarray] = None,
+        token_scores : Optional[np.ndarray] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> BatchSpanTable:
+    """
+    decode a padded batch of tag ids, of shape (batch, seq_len),
+    as model outputs usually come, in one pass over the whole batch
+
+    Positions where attention_mask is 0 (padding) or 
+    special_tokens_mask is 1 (e.g. [CLS] and [SEP]) are skipped, 
+    and their tag ids (which may be anything, e.g. -100) ignored. 
+
+    If offsets, the (start, end) character offsets of each token,
+    of shape (batch, seq_len, 2), are given, the spans are in
+    character offsets into each document.  Otherwise, they are
+    in token positions, from the first token of the span to one
+    past the last (as is usual for evaluating sequence labeling).
+
+    returns a span_table.BatchSpanTable, whose docs column holds
+    the row of each span, and whose labels are codec.classes
+    (and, if token_scores of shape (batch, seq_len) are given,
+    whose scores are computed from them as by span_scores, 
+    ignoring skipped positions)
+
+    Note: an E or L tag with no chunk to end raises 
+    UnexpectedLabel (unless a repair policy is given, as for
+    chunk_token_bounds, in which case the repairs over the whole
+    batch are counted in repairs, or the codec's scheme is IOE1 or
+    IOE2, where it is a chunk, and no repair policy may be given),
+    but the token index in the message counts only the tokens
+    which were not skipped.
+    """
+    tag_ids = np.asarray(tag_ids)
+    if tag_ids.ndim != 2:
+        msg = f"expected tag ids of shape (batch, seq_len), got {tag_ids.shape}"
+        raise ValueError(msg)
+    n_docs, seq_len = tag_ids.shape
+    valid : np.ndarray = np.ones(tag_ids.shape, dtype=bool)
+    if attention_mask is not None:
+        valid &= np.asarray(attention_mask).astype(bool)
+    if special_tokens_mask is not None:
+        valid &= ~np.asarray(special_tokens_mask).astype(bool)
+    positions : np.ndarray = np.flatnonzero(valid)
+    docs : np.ndarray = positions // seq_len
+    breaks : np.ndarray = np.ones(len(positions), dtype=bool)
+    breaks[1:] = docs[1:] != docs[:-1]
+    first_tokens, last_tokens, classes = chunk_token_bounds(
+            tag_ids.ravel()[positions], codec, breaks=breaks,
+            repair=repair, repairs=repairs)
+    first_positions : np.ndarray = positions[first_tokens]
+    last_positions : np.ndarray = positions[last_tokens]
+    starts : np.ndarray
+    ends : np.ndarray
+    if offsets is not None:
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        starts = offsets[first_positions, 0]
+        ends = offsets[last_positions, 1]
+    else:
+        starts = first_positions % seq_len
+        ends = last_positions % seq_len + 1
+    scores : Optional[ScoreColumns] = None
+    if token_scores is not None:
+        scores = span_scores(np.asarray(token_scores).ravel()[positions],
+                first_tokens, last_tokens)
+    return BatchSpanTable(docs[first_tokens], starts, ends, classes,
+            codec.classes, scores=scores)
+
+
+# vim: et ai si sts=4
@@ -23,12 +23,13 @@ Supports any of the following schema:
 Note: this state machine is permissive, which allows it 
 to accept any of the schema above.  However, this
 means that it cannot validate any specific scheme
+(for that, see validate.py)
 
 Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
 """
 
 from abc import ABC, abstractmethod
-from typing import Sequence, Mapping, Union, Optional
+from typing import Sequence, Mapping, Union, Optional, Tuple
 
 from .span_annotation import SpanAnnotation
 
@@ -50,6 +51,10 @@ def delim_width_before(token : str,
         which, given the previous and current tokens, will
         return either 0 or 1
 
+        (tok2spans.iob2spans doesn't take such a function, but
+        its subwords argument selects one of the precompiled 
+        rules in subwords.py, for WordPiece, SentencePiece 
+        and byte-level BPE tokens)
     """
     return 1
 
@@ -63,8 +68,8 @@ class IOBState(ABC):
     """
     abstract base class for state in IOB sequence tagging schema
 
-    Note: current implementation assumes that the tokens are 
-    all separated by single spaces
+    Note: unless see() is given the offset of each token, 
+    the tokens are assumed to be separated by single spaces
     """
     def __init__(self, prev_token : Optional[str] = None, 
             end_of_previous : int = 0, 
@@ -96,13 +101,29 @@ class IOBState(ABC):
     @abstractmethod
     def current_annotation(self) -> Optional[SpanAnnotation]:
         return None
-    def new_annotation(self, label : Optional[str] = None) -> SpanAnnotation:
+    def token_bounds(self, token : str,
+            offset : Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
         """
-        create a new 'open' annotation (one with end == -1)
-        starting at the current location
+        start and end of the current token: offset, if given,
+        otherwise one (space) character after the end of the 
+        previous token
         """
+        if offset is not None:
+            return (offset[0], offset[1])
         start = self.end_of_previous + (self.prev_token is not None)
         # handles special case of no delimiter before first token
+        return (start, start + len(token))
+
+    def new_annotation(self, label : Optional[str] = None,
+            start : Optional[int] = None) -> SpanAnnotation:
+        """
+        create a new 'open' annotation (one with end == -1)
+        starting at start (by default, the current location,
+        assuming a single space delimiter)
+        """
+        if start is None:
+            start = self.end_of_previous + (self.prev_token is not None)
+        # handles special case of no delimiter before first token
         return SpanAnnotation.open(
                 start=start,
                 label=label or self.default
@@ -119,9 +140,13 @@ class IOBState(ABC):
 
     @abstractmethod
     def see(self, token : str, 
-            label : Optional[str] = None) -> tuple["IOBState", Optional[SpanAnnotation]]:
+            label : Optional[str] = None,
+            offset : Optional[Tuple[int, int]] = None,
+            ) -> tuple["IOBState", Optional[SpanAnnotation]]:
         """
-        given next token and label,
+        given next token and label (and optionally the 
+        (start, end) character offsets of the token in the
+        original text),
         update the offset of the end of the previous token,
         and return 
         (1) subsequent IOBState (possibly the same state
@@ -165,9 +190,12 @@ class Outside(IOBState):
         return self.pending_anno
 
     def see(self, token : str,
-            label : Optional[str] = None) -> SeeReturn:
+            label : Optional[str] = None,
+            offset : Optional[Tuple[int, int]] = None) -> SeeReturn:
         """
-        given next token and label,
+        given next token and label (and optionally the 
+        (start, end) character offsets of the token in the
+        original text),
         update the offset of the end of the previous token,
         and return 
         (1) subsequent IOBState (possibly the same state
@@ -178,7 +206,7 @@ class Outside(IOBState):
         which : str
         cat : Optional[str]
         which, cat = self.interpret_label(label)
-        end_of_current = self.end_of_previous + len(token) + (self.prev_token is not None)
+        start_of_current, end_of_current = self.token_bounds(token, offset)
         # outside, so possibilities are:
         # 1. stay outside
         # 2. start new chunk and
@@ -204,7 +232,7 @@ class Outside(IOBState):
             raise UnexpectedLabel(msg)
 
         # possibility 2, so create new (incomplete) annotation
-        new_anno = self.new_annotation(label=cat)
+        new_anno = self.new_annotation(label=cat, start=start_of_current)
         if which in "BI":
             # 2.a continue to inside, keeping incomplete
             # annotation, rather than returning it
@@ -249,9 +277,12 @@ class Inside(IOBState):
         return self.current_anno
 
     def see(self, token : str,
-            label : Optional[str] = None) -> SeeReturn:
+            label : Optional[str] = None,
+            offset : Optional[Tuple[int, int]] = None) -> SeeReturn:
         """
-        given next token and label,
+        given next token and label (and optionally the 
+        (start, end) character offsets of the token in the
+        original text),
         update the offset of the end of the previous token,
         and return 
         (1) subsequent IOBState (possibly the same state
@@ -261,7 +292,6 @@ class Inside(IOBState):
         which : str
         cat : Optional[str]
         which, cat = self.interpret_label(label)
-        end_of_current = self.end_of_previous + len(token) + 1
 
         # inside, so possibilities are
         # 1. new label is outside (O), or explicitly ends the 
@@ -284,7 +314,7 @@ class Inside(IOBState):
             raise UnexpectedLabel(msg)
 
         # prepare to update offset
-        end_of_current = self.end_of_previous + len(token) + 1
+        start_of_current, end_of_current = self.token_bounds(token, offset)
         if (
                 which == "I" and
                 (
@@ -316,7 +346,7 @@ class Inside(IOBState):
             return (new_state, to_emit)
 
         current_anno : SpanAnnotation = self.new_annotation(
-                label=cat)
+                label=cat, start=start_of_current)
         if which in "US":
             # possibility 2
             # new anno ends, but we already have an
@@ -335,6 +365,7 @@ class Inside(IOBState):
         # otherwise, possibility 3, new anno starts but
         # doesn't end, so update current Inside, and 
         # emit previous anno 
+        self.current_anno = current_anno
         self.prev_token = token
         self.end_of_previous = end_of_current
 
@@ -0,0 +1,325 @@
+"""
+table-driven equivalent of the state machine in iob_state
+
+Instead of Outside and Inside objects which re-interpret each
+label string and allocate new states and SpanAnnotations as
+they go, TransitionTable interprets each distinct label once,
+and precomputes, for every (state, tag) pair, what to do and
+which state comes next.  Decoding is then one loop with a few
+list lookups per token.
+
+Like iob_state, it accepts IOB1, IOB2, IO, IOBES and BILOU
+(and mixtures of them), and raises UnexpectedLabel in the same
+cases, unless it is compiled for a repair policy (see repair.py),
+in which case the repairs are transitions like any other, so
+labels which need no repair cost nothing extra.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from collections import Counter
+from functools import lru_cache
+from typing import (
+        Sequence, Mapping, Iterable, Iterator,
+        Union, Optional,
+        List, Dict, Tuple, FrozenSet,
+        )
+
+from .iob_state import IOBState, UnexpectedLabel
+from .repair import check_repair, count_repairs
+from .span_annotation import SpanAnnotation
+
+# actions, combined as bit flags
+CLOSE_BEFORE = 1    # close current chunk at end of previous token
+CLOSE_AT = 2        # close current chunk at end of this token
+OPEN = 4            # open a new chunk at this token
+SINGLE = 8          # emit a single-token chunk for this token
+END_OUTSIDE = 16    # error: E/L when outside any chunk
+UNKNOWN = 32        # error: unknown label-type
+ERRORS = END_OUTSIDE | UNKNOWN
+# repairs (only in tables compiled for a repair policy), counted
+REPAIRED_STRAY = 64     # stray E/L, converted or dropped
+REPAIRED_ORPHAN = 128   # orphan I, converted or dropped
+REPAIRED_UNKNOWN = 256  # unknown label-type, treated as O
+REPAIRS = REPAIRED_STRAY | REPAIRED_ORPHAN | REPAIRED_UNKNOWN
+
+# lists of start offsets, end offsets and class indices
+# (into TransitionTable.classes) of decoded chunks
+TableSpans = Tuple[List[int], List[int], List[int]]
+
+
+class TransitionTable:
+    """
+    precomputed transitions for a fixed set of labels
+
+    States are 0 (outside) and 1 + c (inside a chunk of
+    class c), and tags are the indices of the distinct labels
+    in tag_index.  The tables are flat lists indexed by
+    state * n_tags + tag, so the decoding loop can keep
+    the state premultiplied by n_tags.
+
+    With a repair policy, stray E/L, orphan I and unknown labels
+    are repaired as by repair.repair_labels, instead of raising
+    UnexpectedLabel.
+    """
+    def __init__(self, labels : Iterable[Optional[str]],
+            default_class : str = "CHUNK",
+            repair : Optional[str] = None) -> None:
+        self.default : str = default_class
+        self.repair : Optional[str] = (None if repair is None
+                else check_repair(repair))
+        self.tag_index : Dict[Optional[str], int] = {}
+        interpreted : List[Tuple[str, Optional[str]]] = []
+        for label in labels:
+            if label not in self.tag_index:
+                self.tag_index[label] = len(interpreted)
+                interpreted.append(IOBState.interpret_label(label))
+        self.labels : List[Optional[str]] = list(self.tag_index)
+
+        class_index : Dict[str, int] = {default_class : 0}
+        for which, cat in interpreted:
+            if cat is not None:
+                class_index.setdefault(cat, len(class_index))
+        self.classes : List[str] = list(class_index)
+
+        n_tags : int = len(interpreted)
+        n_states : int = 1 + len(self.classes)
+        self.n_tags : int = n_tags
+        self.actions : List[int] = [0] * (n_states * n_tags)
+        self.next_states : List[int] = [0] * (n_states * n_tags)
+        self.new_classes : List[int] = [0] * (n_states * n_tags)
+        for tag, (which, cat) in enumerate(interpreted):
+            new_class : int = class_index[cat or default_class]
+            for state in range(n_states):
+                action, next_state = self._transition(state, which,
+                        None if cat is None else class_index[cat],
+                        new_class, self.repair)
+                i = state * n_tags + tag
+                self.actions[i] = action
+                self.next_states[i] = next_state * n_tags
+                self.new_classes[i] = new_class
+
+    @staticmethod
+    def _transition(state : int, which : str,
+            cat : Optional[int], new_class : int,
+            repair : Optional[str] = None) -> Tuple[int, int]:
+        """
+        action and next state for a label of type which and class
+        cat (new_class when cat is None) seen in state, following
+        Outside.see and Inside.see (and repair.repair_labels, for
+        the labels it repairs with policy repair)
+        """
+        inside : int = 1 + new_class
+        # what O would do in this state
+        as_outside : int = 0 if state == 0 else CLOSE_BEFORE
+        if which not in "BIOUSEL":
+            if repair is not None:
+                return (as_outside | REPAIRED_UNKNOWN, 0)
+            return (UNKNOWN, 0)
+        if state == 0:
+            if which == "O":
+                return (0, 0)
+            if which in "EL":
+                if repair == "drop":
+                    return (REPAIRED_STRAY, 0)
+                if repair == "convert":
+                    return (SINGLE | REPAIRED_STRAY, 0)
+                return (END_OUTSIDE, 0)
+            if which == "I" and repair == "drop":
+                return (REPAIRED_ORPHAN, 0)
+            if which == "I" and repair == "convert":
+                return (OPEN | REPAIRED_ORPHAN, inside)
+            if which in "BI":
+                return (OPEN, inside)
+            # U and S
+            return (SINGLE, 0)
+        if which == "I" and (cat is None or cat == state - 1):
+            return (0, state)
+        if which in "EL":
+            return (CLOSE_AT, 0)
+        if which == "O":
+            return (CLOSE_BEFORE, 0)
+        if which in "US":
+            return (CLOSE_BEFORE | SINGLE, 0)
+        if which == "I" and repair == "drop":
+            return (CLOSE_BEFORE | REPAIRED_ORPHAN, 0)
+        if which == "I" and repair == "convert":
+            return (CLOSE_BEFORE | OPEN | REPAIRED_ORPHAN, inside)
+        # B, or I of another class
+        return (CLOSE_BEFORE | OPEN, inside)
+
+    def run(self, lengths : Iterable[int],
+            tags : Iterable[int],
+            repairs : Optional[Counter] = None) -> TableSpans:
+        """
+        decode a sequence of tags (indices into self.labels) for
+        tokens of the given lengths, with offsets into the string
+        which would result from concatening tokens with a single
+        space as delimiter (as for tok2spans.iob2spans), counting
+        any repairs in repairs (if given)
+        """
+        actions = self.actions
+        next_states = self.next_states
+        new_classes = self.new_classes
+        starts : List[int] = []
+        ends : List[int] = []
+        classes : List[int] = []
+        state : int = 0
+        pos : int = 0
+        prev_end : int = 0
+        chunk_start : int = 0
+        chunk_class : int = 0
+        n_repaired : List[int] = [0, 0, 0]
+        for length, tag in zip(lengths, tags):
+            i = state + tag
+            action = actions[i]
+            end = pos + length
+            if action:
+                if action & ERRORS:
+                    self._raise(action, tag)
+                if action & REPAIRS:
+                    n_repaired[(action & REPAIRS).bit_length() - 7] += 1
+                if action & CLOSE_BEFORE:
+                    starts.append(chunk_start)
+                    ends.append(prev_end)
+                    classes.append(chunk_class)
+                elif action & CLOSE_AT:
+                    starts.append(chunk_start)
+                    ends.append(end)
+                    classes.append(chunk_class)
+                if action & OPEN:
+                    chunk_start = pos
+                    chunk_class = new_classes[i]
+                elif action & SINGLE:
+                    starts.append(pos)
+                    ends.append(end)
+                    classes.append(new_classes[i])
+            state = next_states[i]
+            prev_end = end
+            pos = end + 1
+        if state:
+            starts.append(chunk_start)
+            ends.append(prev_end)
+            classes.append(chunk_class)
+        if repairs is not None:
+            count_repairs(repairs, *n_repaired)
+        return (starts, ends, classes)
+
+    def run_offsets(self, offsets : Iterable[Tuple[int, int]],
+            tags : Iterable[int],
+            repairs : Optional[Counter] = None) -> TableSpans:
+        """
+        decode a sequence of tags (indices into self.labels) for
+        tokens with the given (start, end) character offsets,
+        so that the spans are in the coordinates of those offsets
+
+        (the same loop as run, kept separate so that run doesn't
+        pay for building the offsets of space-delimited tokens)
+        """
+        actions = self.actions
+        next_states = self.next_states
+        new_classes = self.new_classes
+        starts : List[int] = []
+        ends : List[int] = []
+        classes : List[int] = []
+        state : int = 0
+        prev_end : int = 0
+        chunk_start : int = 0
+        chunk_class : int = 0
+        n_repaired : List[int] = [0, 0, 0]
+        for (pos, end), tag in zip(offsets, tags):
+            i = state + tag
+            action = actions[i]
+            if action:
+                if action & ERRORS:
+                    self._raise(action, tag)
+                if action & REPAIRS:
+                    n_repaired[(action & REPAIRS).bit_length() - 7] += 1
+                if action & CLOSE_BEFORE:
+                    starts.append(chunk_start)
+                    ends.append(prev_end)
+                    classes.append(chunk_class)
+                elif action & CLOSE_AT:
+                    starts.append(chunk_start)
+                    ends.append(end)
+                    classes.append(chunk_class)
+                if action & OPEN:
+                    chunk_start = pos
+                    chunk_class = new_classes[i]
+                elif action & SINGLE:
+                    starts.append(pos)
+                    ends.append(end)
+                    classes.append(new_classes[i])
+            state = next_states[i]
+            prev_end = end
+        if state:
+            starts.append(chunk_start)
+            ends.append(prev_end)
+            classes.append(chunk_class)
+        if repairs is not None:
+            count_repairs(repairs, *n_repaired)
+        return (starts, ends, classes)
+
+    def _raise(self, action : int, tag : int) -> None:
+        which, cat = IOBState.interpret_label(self.labels[tag])
+        if action & END_OUTSIDE:
+            msg = f"not expecting {which} (end of anno) when Outside any current SpanAnnotation"
+        else:
+            msg = f"unknown label-type {which}"
+        raise UnexpectedLabel(msg)
+
+    def decode(self, tokens : Iterable[str],
+            labels : Iterable[Optional[str]],
+            offsets : Optional[Iterable[Tuple[int, int]]] = None,
+            repairs : Optional[Counter] = None,
+            ) -> TableSpans:
+        """
+        decode string tokens and labels (which must all be
+        in self.tag_index), using the (start, end) offsets of 
+        the tokens if given, or else assuming single space
+        delimiters, counting any repairs in repairs (if given)
+        """
+        tags = map(self.tag_index.__getitem__, labels)
+        if offsets is not None:
+            return self.run_offsets(offsets, tags, repairs=repairs)
+        return self.run(map(len, tokens), tags, repairs=repairs)
+
+
+@lru_cache(maxsize=64)
+def compiled_table(labels : FrozenSet[Optional[str]],
+        default_class : str = "CHUNK",
+        repair : Optional[str] = None) -> TransitionTable:
+    """
+    TransitionTable for a given set of labels (and repair policy),
+    reused for subsequent sequences with the same set of labels
+    """
+    return TransitionTable(sorted(labels, key=str),
+            default_class=default_class, repair=repair)
+
+def table_spans(tokens : Sequence[str],
+        labels : Sequence[Optional[str]],
+        default_class : str = "CHUNK",
+        offsets : Optional[Iterable[Tuple[int, int]]] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> Iterator[SpanAnnotation]:
+    """
+    same spans as tok2spans.iob2spans (used by iob2spans when
+    engine="table")
+
+    Note: unlike iob2spans with the default engine, this decodes
+    the whole sequence before yielding anything, so an
+    UnexpectedLabel is raised before any spans are yielded.
+    """
+    if not isinstance(labels, Sequence):
+        labels = list(labels)
+    table : TransitionTable = compiled_table(frozenset(labels),
+            default_class, repair)
+    starts, ends, classes = table.decode(tokens, labels, offsets=offsets,
+            repairs=repairs)
+    names : List[str] = table.classes
+    for start, end, class_ix in zip(starts, ends, classes):
+        yield SpanAnnotation(start=start, label=names[class_ix], end=end)
+
+
+# vim: et ai si sts=4
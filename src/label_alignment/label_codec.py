@@ -0,0 +1,173 @@
+"""
+LabelCodec: fixed vocabulary of IOB-style tags (in one of the
+schemes from schemes.py) mapped to small integer ids, so that
+aligned labels can be stored in NumPy arrays instead of
+lists of strings
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from typing import (
+        Sequence, Mapping, Iterable,
+        Union, Optional,
+        List, Dict, Tuple,
+        )
+
+import numpy as np
+
+from .iob_state import IOBState, UnexpectedLabel
+from .schemes import SCHEMES, SPAN_ROLES, PREFIX_ALIASES, check_scheme
+
+# B, I, L and U tag ids for a single class
+SpanTagIds = Tuple[int, int, int, int]
+
+class LabelCodec:
+    """
+    maps IOB-style tags to integer ids and back
+
+    Tag id 0 is always "O".  The tag with the p-th prefix of the
+    scheme (see schemes.SCHEMES) for the c-th class has id
+
+        1 + c * len(prefixes) + p
+
+    so, for example, with scheme "BILOU" and classes ("PER", "LOC"),
+    the tags are O, B-PER, I-PER, L-PER, U-PER, B-LOC, I-LOC, ...
+
+    default_class is used for labels without a class (e.g. a bare "I").
+    If omitted, it defaults to the only class of a single-class codec.
+    """
+    def __init__(self, classes : Sequence[str],
+            scheme : str = "BILOU",
+            default_class : Optional[str] = None) -> None:
+        self.scheme : str = check_scheme(scheme)
+        self.prefixes : str = SCHEMES[self.scheme]
+        self.classes : Tuple[str, ...] = tuple(classes)
+        self.class_index : Dict[str, int] = {
+                label_class : class_ix for class_ix, label_class
+                in enumerate(self.classes)
+                }
+        if len(self.class_index) != len(self.classes):
+            msg = f"duplicate classes in {self.classes}"
+            raise ValueError(msg)
+        if default_class is None and len(self.classes) == 1:
+            default_class = self.classes[0]
+        self.default_class : Optional[str] = default_class
+        self.labels : List[str] = ["O"] + [
+                f"{prefix}-{label_class}" for label_class in self.classes
+                for prefix in self.prefixes
+                ]
+        self.label_index : Dict[str, int] = {
+                label : tag_id for tag_id, label in enumerate(self.labels)
+                }
+        # smallest signed type holding all ids (and negative padding)
+        self.dtype : type = np.int16 if len(self.labels) < 2**15 else np.int32
+        # per tag id, the prefix (as a character code) and the
+        # class index (-1 for O), for decoding arrays of ids
+        self.tag_prefixes : np.ndarray = np.array(
+                [ord("O")] + [ord(prefix) for label_class in self.classes
+                    for prefix in self.prefixes],
+                dtype=np.uint8)
+        self.tag_classes : np.ndarray = np.array(
+                [-1] + [class_ix for class_ix in range(len(self.classes))
+                    for prefix in self.prefixes],
+                dtype=np.int32)
+
+    @classmethod
+    def from_labels(cls, labels : Iterable[Optional[str]],
+            scheme : str = "BILOU") -> "LabelCodec":
+        """
+        create a codec for all the classes used by labels
+        (in order of first appearance)
+        """
+        classes : Dict[str, None] = {}
+        for label in labels:
+            which, label_class = IOBState.interpret_label(label)
+            if label_class is not None:
+                classes.setdefault(label_class)
+        return cls(list(classes), scheme=scheme)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __eq__(self, other) -> bool:
+        return (
+                isinstance(other, LabelCodec)
+                and self.scheme == other.scheme
+                and self.classes == other.classes
+                and self.default_class == other.default_class
+                )
+
+    def __repr__(self) -> str:
+        return f'LabelCodec({list(self.classes)!r}, scheme={self.scheme!r})'
+
+    def tag_id(self, prefix : str, label_class : Optional[str] = None) -> int:
+        """
+        id of the tag with the given prefix and class,
+        raising UnexpectedLabel if the codec has no such tag
+        """
+        if prefix == "O":
+            return 0
+        if label_class is None:
+            label_class = self.default_class
+        class_ix : Optional[int] = self.class_index.get(label_class or "")
+        if class_ix is None:
+            msg = f"unknown class {label_class!r} for {self!r}"
+            raise UnexpectedLabel(msg)
+        prefix_ix : int = self.prefixes.find(prefix)
+        if prefix_ix < 0:
+            prefix_ix = self.prefixes.find(PREFIX_ALIASES.get(prefix, "O"))
+        if prefix_ix < 0:
+            msg = f"prefix {prefix!r} not used by scheme {self.scheme}"
+            raise UnexpectedLabel(msg)
+        return 1 + class_ix * len(self.prefixes) + prefix_ix
+
+    def encode(self, label : Optional[str]) -> int:
+        tag_id : Optional[int] = self.label_index.get(label or "O")
+        if tag_id is not None:
+            return tag_id
+        return self.tag_id(*IOBState.interpret_label(label))
+
+    def decode(self, tag_id : int) -> str:
+        return self.labels[tag_id]
+
+    def encode_many(self, labels : Iterable[Optional[str]]) -> np.ndarray:
+        return np.fromiter((self.encode(label) for label in labels),
+                dtype=self.dtype)
+
+    def decode_many(self, tag_ids : Iterable[int]) -> List[str]:
+        labels = self.labels
+        return [labels[tag_id] for tag_id in tag_ids]
+
+    def check_ids(self, tag_ids : np.ndarray) -> None:
+        """
+        raise ValueError if any of tag_ids is not the id of a tag
+        (e.g. -100 padding which was not masked out), rather than
+        let NumPy indexing wrap it around
+        """
+        bad : np.ndarray = (tag_ids < 0) | (tag_ids >= len(self.labels))
+        if bad.any():
+            token_ix : int = int(np.argmax(bad))
+            msg = (f"tag id {int(tag_ids[token_ix])} (token {token_ix}) "
+                    f"is not in [0, {len(self.labels)})")
+            raise ValueError(msg)
+
+    def span_tag_ids(self, label_class : str) -> SpanTagIds:
+        """
+        ids of the tags used for the first, inside and last tokens
+        of a multi-token chunk of label_class, and for a
+        single-token chunk (i.e. B, I, L and U in BILOU)
+
+        raises ValueError for schemes (IOB1, IOE1) where
+        these depend on the neighbouring chunks
+        """
+        roles : Optional[str] = SPAN_ROLES.get(self.scheme)
+        if roles is None:
+            msg = (f"tags for scheme {self.scheme} depend on neighbouring "
+                    "chunks, so cannot be assigned one chunk at a time")
+            raise ValueError(msg)
+        b_id, i_id, l_id, u_id = (self.tag_id(prefix, label_class)
+                for prefix in roles)
+        return (b_id, i_id, l_id, u_id)
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,189 @@
+"""
+parse a single large annotated XML document in parallel, by
+splitting it at top-level <p> boundaries, parsing the pieces with
+sax2spans.SpanAndText in a process pool, and stitching the
+paragraph offsets back together
+
+Assumes (as the rest of sax2spans does) that paragraphs are
+direct children of the root element and are not nested, that
+no "<p" appears inside comments or CDATA sections within the
+root element, and that the document is in an ASCII-compatible 
+encoding (e.g. UTF-8).
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import mmap
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (Sequence, Mapping, Union, Optional,
+        Tuple, List, Dict,
+        Literal, overload,
+        )
+
+import xml.sax
+
+from .sax2spans import SpanAndText, text_and_spans
+from .span_annotation import SpanAnnotation
+from .span_table import SpanTable
+
+# bytes which can follow "<p" in a paragraph start tag
+_AFTER_P = b'> \t\r\n/'
+
+# (path, header, closing tag of root element, start, end)
+PieceSpec = Tuple[str, bytes, bytes, int, int]
+
+
+def _paragraph_start(data : mmap.mmap, pos : int, end : int) -> int:
+    """
+    offset of the first "<p" start tag at or after pos, or -1
+    """
+    while True:
+        found : int = data.find(b'<p', pos, end)
+        if found < 0 or found + 2 >= end:
+            return -1
+        if data[found + 2] in _AFTER_P:
+            return found
+        pos = found + 2
+
+_NAME = re.compile(rb'[A-Za-z_][\w.:-]*')
+
+def _root_element(data : mmap.mmap) -> Tuple[bytes, int]:
+    """
+    name of the root element, and the offset just past its
+    start tag, skipping the XML declaration, processing 
+    instructions, comments and DOCTYPE (with any internal subset)
+    """
+    pos : int = data.find(b'<')
+    while pos >= 0:
+        close : int
+        if data[pos:pos + 2] == b'<?':
+            close = data.find(b'?>', pos)
+        elif data[pos:pos + 4] == b'<!--':
+            close = data.find(b'-->', pos)
+        elif data[pos:pos + 2] == b'<!':
+            close = data.find(b'>', pos)
+            bracket : int = data.find(b'[', pos, max(close, pos))
+            if bracket >= 0:
+                close = data.find(b'>', data.find(b']', bracket))
+        else:
+            m = _NAME.match(data[pos + 1:pos + 257])
+            close = data.find(b'>', pos)
+            if m is None or close < 0:
+                break
+            return (m.group(), close + 1)
+        if close < 0:
+            break
+        pos = data.find(b'<', close)
+    msg = "no root element found"
+    raise ValueError(msg)
+
+def split_paragraphs(path : Union[Path, str],
+        chunk_bytes : int = 1 << 24) -> Tuple[bytes, bytes, List[Tuple[int, int]]]:
+    """
+    split the document at path into byte ranges of roughly
+    chunk_bytes, each starting at a top-level <p> and containing
+    only whole paragraphs
+
+    returns the header (everything before the first paragraph,
+    including the XML declaration and root start tag), the closing
+    tag of the root element, and the list of (start, end) ranges
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size : int = len(data)
+            root, root_end = _root_element(data)
+            closing : bytes = b'</' + root + b'>'
+            first : int = _paragraph_start(data, root_end, size)
+            if first < 0:
+                return (data[:root_end], closing, [])
+            header : bytes = data[:first]
+            # anything after the last paragraph is ignored by
+            # SpanAndText, so the last piece can run up to the
+            # root closing tag
+            last_end : int = data.rfind(closing)
+            if last_end < first:
+                last_end = size
+            ranges : List[Tuple[int, int]] = []
+            start : int = first
+            while start >= 0 and start < last_end:
+                next_start : int = _paragraph_start(data,
+                        max(start + 1, start + chunk_bytes), last_end)
+                end : int = next_start if next_start >= 0 else last_end
+                ranges.append((start, end))
+                start = next_start
+    return (header, closing, ranges)
+
+def parse_piece(spec : PieceSpec) -> Tuple[str, SpanTable]:
+    """
+    parse the paragraphs in bytes [start, end) of the document
+    at path, wrapped in its header and root closing tag, returning
+    the text and spans as text_and_spans would for those paragraphs
+    alone (runs in the worker processes)
+    """
+    path, header, closing, start, end = spec
+    with open(path, 'rb') as f:
+        f.seek(start)
+        body : bytes = f.read(end - start)
+    sat : SpanAndText = SpanAndText()
+    xml.sax.parseString(header + body + closing, handler=sat)
+    text, table = text_and_spans(sat, table=True)
+    return (text, table)
+
+@overload
+def parallel_span_parsed(p : Union[Path, str],
+        max_workers : Optional[int] = None,
+        chunk_bytes : int = 1 << 24,
+        table : Literal[False] = False,
+        ) -> Tuple[str, List[SpanAnnotation]]: ...
+@overload
+def parallel_span_parsed(p : Union[Path, str],
+        max_workers : Optional[int] = None,
+        chunk_bytes : int = 1 << 24,
+        *,
+        table : Literal[True],
+        ) -> Tuple[str, SpanTable]: ...
+@overload
+def parallel_span_parsed(p : Union[Path, str],
+        max_workers : Optional[int] = None,
+        chunk_bytes : int = 1 << 24,
+        table : bool = False,
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]: ...
+def parallel_span_parsed(p : Union[Path, str],
+        max_workers : Optional[int] = None,
+        chunk_bytes : int = 1 << 24,
+        table : bool = False,
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]:
+    """
+    same (text, spans) as sax2spans.span_parsed(p, table=table),
+    but with pieces of about chunk_bytes bytes parsed in parallel by a
+    ProcessPoolExecutor with max_workers processes
+
+    Documents which fit in a single piece are parsed in this process.
+    """
+    path : str = str(p)
+    header, closing, ranges = split_paragraphs(path, chunk_bytes=chunk_bytes)
+    specs : List[PieceSpec] = [(path, header, closing, start, end)
+            for start, end in ranges]
+    pieces : List[Tuple[str, SpanTable]]
+    if len(specs) <= 1:
+        pieces = [parse_piece(spec) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pieces = list(executor.map(parse_piece, specs))
+    offsets : List[int] = []
+    offset : int = 0
+    for text, piece_table in pieces:
+        offsets.append(offset)
+        offset += len(text)
+    spans : SpanTable = SpanTable.concatenate(
+            [piece_table for text, piece_table in pieces], offsets=offsets)
+    full_text : str = ''.join(text for text, piece_table in pieces)
+    if table:
+        return (full_text, spans)
+    return (full_text, spans.to_annotations())
+
+
+# vim: et ai si sts=4
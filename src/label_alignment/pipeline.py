@@ -0,0 +1,306 @@
+"""
+corpus pipeline: read every annotated XML file in a directory,
+tokenize it, align the annotations with the tokens, and write the
+results as JSON-lines shards, using a pool of worker processes
+
+Each shard covers a fixed group of input files, and is written
+to a temporary file which is renamed only when complete.  The
+manifest in the output directory keeps a key for each shard (a hash
+of the names, sizes and modification times of its files), so a
+re-run with the same settings and output directory skips any shards
+already finished from the same files, and redoes only those whose
+files were added, removed or changed.
+
+Also available from the command line as
+
+    label-alignment-pipeline INPUT_DIR OUTPUT_DIR --tokenizer SPEC
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from concurrent.futures import (ProcessPoolExecutor, Future,
+        wait, FIRST_COMPLETED)
+from pathlib import Path
+from typing import (Sequence, Mapping, Union, Optional, Callable,
+        Tuple, List, Dict, Set, NamedTuple, TypedDict
+        )
+
+from .alignment import align_ranges_bilou
+from .expat2spans import expat_parsed
+from .tokenized import TokenizedWithOffsets
+
+MANIFEST = 'manifest.json'
+
+# called with (shards done, total shards, shards skipped as already done)
+Progress = Callable[[int, int, int], None]
+Tokenize = Callable[[str], TokenizedWithOffsets]
+
+
+def load_tokenizer(spec : str) -> Tokenize:
+    """
+    tokenizer function for a tokenizer spec, which is one of
+
+    "whitespace" or "whitespace_split": the simple_tokenizers
+        pre-tokenizer wrappers
+    "file:PATH": a tokenizers.Tokenizer saved as JSON at PATH
+    "hub:NAME": tokenizers.Tokenizer.from_pretrained(NAME)
+    """
+    if spec in ('whitespace', 'whitespace_split'):
+        from .simple_tokenizers import ws_tokenizer, wss_tokenizer
+        wrapper = ws_tokenizer() if spec == 'whitespace' else wss_tokenizer()
+        return wrapper.tokenize
+    kind, sep, name = spec.partition(':')
+    if sep and kind in ('file', 'hub'):
+        from tokenizers import Tokenizer
+        if kind == 'file':
+            tokenizer = Tokenizer.from_file(name)
+        else:
+            tokenizer = Tokenizer.from_pretrained(name)
+        return tokenizer.encode
+    msg = (f"unknown tokenizer spec {spec!r}, expected 'whitespace', "
+            "'whitespace_split', 'file:PATH' or 'hub:NAME'")
+    raise ValueError(msg)
+
+# tokenizers loaded in this (worker) process, by spec
+_tokenizers : Dict[str, Tokenize] = {}
+
+def cached_tokenizer(spec : str) -> Tokenize:
+    """
+    load_tokenizer(spec), loaded only once per process (e.g. by
+    the worker processes of a ProcessPoolExecutor)
+    """
+    tokenize : Optional[Tokenize] = _tokenizers.get(spec)
+    if tokenize is None:
+        tokenize = _tokenizers[spec] = load_tokenizer(spec)
+    return tokenize
+
+
+class ShardTask(NamedTuple):
+    shard : int
+    files : List[str]
+    input_dir : str
+    output_path : str
+    tokenizer : str
+
+class ShardResult(NamedTuple):
+    shard : int
+    documents : int
+    tokens : int
+
+class AlignedDocument(TypedDict):
+    tokens : List[str]
+    offsets : List[List[int]]
+    labels : List[str]
+
+class ShardRecord(AlignedDocument):
+    """
+    one JSON line of a shard
+    """
+    file : str
+
+
+def shard_name(index : int) -> str:
+    return f'shard-{index:05d}.jsonl'
+
+def shard_key(input_dir : Union[Path, str], files : Sequence[str]) -> str:
+    """
+    hash of the names, sizes and modification times of the files
+    in a shard, which changes if any of them is added, removed
+    or rewritten
+    """
+    root = Path(input_dir)
+    stats : List[Tuple[str, int, int]] = []
+    for name in files:
+        stat : os.stat_result = (root / name).stat()
+        stats.append((name, stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha256(json.dumps(stats).encode('utf-8')).hexdigest()
+
+def align_file(path : Union[Path, str],
+        tokenize : Tokenize) -> AlignedDocument:
+    """
+    parse, tokenize and align a single annotated XML file
+    """
+    text, spans = expat_parsed(path, table=True)
+    tokenized : TokenizedWithOffsets = tokenize(text)
+    labels : List[str] = align_ranges_bilou(tokenized, spans)
+    return {
+            'tokens': list(tokenized.tokens),
+            'offsets': [list(offset) for offset in tokenized.offsets],
+            'labels': labels,
+            }
+
+def process_shard(task : ShardTask) -> ShardResult:
+    """
+    align all files in a shard, writing one JSON line per file
+    (runs in the worker processes)
+    """
+    tokenize : Tokenize = cached_tokenizer(task.tokenizer)
+    partial : str = task.output_path + '.partial'
+    n_tokens : int = 0
+    with open(partial, 'w', encoding='utf-8') as out:
+        for name in task.files:
+            aligned : AlignedDocument = align_file(
+                    Path(task.input_dir) / name, tokenize)
+            record : ShardRecord = {'file': name, **aligned}
+            n_tokens += len(record['labels'])
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write('\n')
+    os.replace(partial, task.output_path)
+    return ShardResult(task.shard, len(task.files), n_tokens)
+
+
+def plan_shards(input_dir : Union[Path, str],
+        files_per_shard : int,
+        pattern : str = '*.xml') -> List[List[str]]:
+    """
+    input files (relative to input_dir, in sorted order) grouped
+    into shards of files_per_shard
+    """
+    root = Path(input_dir)
+    files : List[str] = sorted(str(path.relative_to(root))
+            for path in root.rglob(pattern) if path.is_file())
+    return [files[i:i + files_per_shard]
+            for i in range(0, len(files), files_per_shard)]
+
+def _update_manifest(output_dir : Path, settings : Dict[str, object],
+        keys : Dict[str, str]) -> None:
+    """
+    write the manifest for this run, with the key of each shard
+    by name, first removing any shard which a previous run wrote
+    from other files (or which this run no longer has), so that
+    every shard left in output_dir is up to date
+
+    Raises ValueError if the previous run had different settings.
+    """
+    path : Path = output_dir / MANIFEST
+    previous_keys : Dict[str, str] = {}
+    if path.exists():
+        previous = json.loads(path.read_text(encoding='utf-8'))
+        if previous.get('settings') != settings:
+            msg = (f"{output_dir} holds shards from a run with different "
+                    "settings; use a new output directory")
+            raise ValueError(msg)
+        previous_keys = previous.get('shards', {})
+    for name in set(previous_keys) | set(keys):
+        if previous_keys.get(name) != keys.get(name):
+            (output_dir / name).unlink(missing_ok=True)
+    partial : Path = output_dir / (MANIFEST + '.partial')
+    partial.write_text(json.dumps({'settings': settings, 'shards': keys},
+        indent=1), encoding='utf-8')
+    os.replace(partial, path)
+
+def run_pipeline(input_dir : Union[Path, str],
+        output_dir : Union[Path, str],
+        tokenizer : str = 'whitespace_split',
+        files_per_shard : int = 100,
+        max_workers : Optional[int] = None,
+        max_pending : Optional[int] = None,
+        pattern : str = '*.xml',
+        progress : Optional[Progress] = None,
+        ) -> List[ShardResult]:
+    """
+    align every file matching pattern under input_dir with the
+    tokenizer given by the spec (see load_tokenizer), writing
+    shards of files_per_shard documents to output_dir
+
+    Shards are handed to a ProcessPoolExecutor with max_workers
+    processes, at most max_pending (default: twice the number of
+    workers) at a time.  Shards already in output_dir from a previous
+    run with the same settings are skipped, unless their files were
+    added, removed or changed since (see shard_key), and shards
+    which no longer have any files are removed.
+
+    progress, if given, is called after each shard completes (and
+    once at the start) with the number of shards done, the total,
+    and the number skipped.
+
+    returns results for the shards processed by this run
+    """
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    shards : List[List[str]] = plan_shards(input_dir, files_per_shard,
+            pattern=pattern)
+    _update_manifest(out, {
+        'tokenizer': tokenizer,
+        'files_per_shard': files_per_shard,
+        }, {shard_name(index): shard_key(input_dir, files)
+            for index, files in enumerate(shards)})
+    tasks : List[ShardTask] = [
+            ShardTask(index, files, str(input_dir),
+                str(out / shard_name(index)), tokenizer)
+            for index, files in enumerate(shards)
+            if not (out / shard_name(index)).exists()
+            ]
+    n_skipped : int = len(shards) - len(tasks)
+    n_done : int = n_skipped
+    if progress is not None:
+        progress(n_done, len(shards), n_skipped)
+    results : List[ShardResult] = []
+    if not tasks:
+        return results
+    workers : int = max_workers or os.cpu_count() or 1
+    limit : int = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending : Set[Future] = set()
+        for task in tasks:
+            pending.add(executor.submit(process_shard, task))
+            if len(pending) < limit:
+                continue
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results.append(future.result())
+                n_done += 1
+                if progress is not None:
+                    progress(n_done, len(shards), n_skipped)
+        for future in pending:
+            results.append(future.result())
+            n_done += 1
+            if progress is not None:
+                progress(n_done, len(shards), n_skipped)
+    results.sort()
+    return results
+
+
+def print_progress(done : int, total : int, skipped : int) -> None:
+    print(f'\r{done}/{total} shards ({skipped} already done)', end='',
+            file=sys.stderr, flush=True)
+    if done == total:
+        print(file=sys.stderr)
+
+def main(argv : Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='label-alignment-pipeline',
+            description='align annotated XML files with a tokenizer, '
+            'writing JSON-lines shards')
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--tokenizer', default='whitespace_split',
+            help="'whitespace', 'whitespace_split', 'file:PATH' "
+            "or 'hub:NAME' (default: %(default)s)")
+    parser.add_argument('--files-per-shard', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--pattern', default='*.xml')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+    results = run_pipeline(args.input_dir, args.output_dir,
+            tokenizer=args.tokenizer,
+            files_per_shard=args.files_per_shard,
+            max_workers=args.workers,
+            pattern=args.pattern,
+            progress=None if args.quiet else print_progress)
+    if not args.quiet:
+        n_docs = sum(result.documents for result in results)
+        n_tokens = sum(result.tokens for result in results)
+        print(f'aligned {n_docs} documents ({n_tokens} tokens) '
+                f'in {len(results)} shards', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: et ai si sts=4
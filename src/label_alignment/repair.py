@@ -0,0 +1,130 @@
+"""
+repair policies for noisy label sequences (e.g. model output),
+so that they can be decoded without raising UnexpectedLabel
+
+The labels which iob_state (and the other decoders) can't
+accept, or which suggest a mistake, are
+
+"stray_end": E or L with no current chunk to end
+"orphan_inside": I which doesn't continue the current chunk
+    (after O, or with a different class)
+"unknown": a prefix other than B, I, O, E, L, U or S
+
+and the policies are
+
+"convert": treat a stray E/L as a single-token chunk (S/U)
+    and an orphan I as the start of a chunk (B), as in the
+    permissive decoder
+"drop": treat stray E/L and orphan I tokens as O
+
+With either policy, unknown labels are treated as O.  Note
+that an orphan I is normal in the IO and IOB1 schemes, so
+"drop" only makes sense for schemes like IOB2 and BILOU.
+
+Each repair is counted, by kind, in an optional
+collections.Counter, which can be shared by many calls to
+give aggregate counts over a whole batch or corpus.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from collections import Counter
+from typing import (
+        Sequence, Mapping, Iterable,
+        Union, Optional,
+        List, Tuple,
+        )
+
+from .iob_state import IOBState
+
+REPAIR_POLICIES : Tuple[str, ...] = ("convert", "drop")
+
+STRAY_END = "stray_end"
+ORPHAN_INSIDE = "orphan_inside"
+UNKNOWN = "unknown"
+
+# single-token equivalent of each ending prefix
+_SINGLE = {"E": "S", "L": "U"}
+
+
+def check_repair(policy : str) -> str:
+    """
+    return the policy, raising ValueError if it is not supported
+    """
+    if policy not in REPAIR_POLICIES:
+        msg = (f"unknown repair policy {policy!r}, expected one of "
+                f"{', '.join(REPAIR_POLICIES)}")
+        raise ValueError(msg)
+    return policy
+
+def repair_labels(labels : Iterable[Optional[str]],
+        policy : str,
+        repairs : Optional[Counter] = None,
+        default_class : str = "CHUNK") -> List[Optional[str]]:
+    """
+    labels with any stray E/L, orphan I and unknown labels
+    repaired according to policy, counting the repairs of
+    each kind in repairs (if given)
+
+    Labels which need no repair are passed through unchanged.
+    default_class is the class of labels without one, as
+    for tok2spans.iob2spans.
+    """
+    check_repair(policy)
+    drop : bool = policy == "drop"
+    repaired : List[Optional[str]] = []
+    n_stray : int = 0
+    n_orphan : int = 0
+    n_unknown : int = 0
+    # class of the open chunk (None when outside)
+    current : Optional[str] = None
+    for label in labels:
+        which, cat = IOBState.interpret_label(label)
+        if which == "O":
+            current = None
+        elif which == "B":
+            current = cat or default_class
+        elif which == "I":
+            if current is not None and (cat is None or cat == current):
+                pass
+            else:
+                n_orphan += 1
+                if drop:
+                    label = "O"
+                    current = None
+                else:
+                    label = "B" if cat is None else f"B-{cat}"
+                    current = cat or default_class
+        elif which in "EL":
+            if current is None:
+                n_stray += 1
+                if drop:
+                    label = "O"
+                else:
+                    label = (_SINGLE[which] if cat is None
+                            else f"{_SINGLE[which]}-{cat}")
+            current = None
+        elif which in "US":
+            current = None
+        else:
+            n_unknown += 1
+            label = "O"
+            current = None
+        repaired.append(label)
+    if repairs is not None:
+        count_repairs(repairs, n_stray, n_orphan, n_unknown)
+    return repaired
+
+def count_repairs(repairs : Counter, n_stray : int = 0,
+        n_orphan : int = 0, n_unknown : int = 0) -> None:
+    """
+    add counts to repairs (only for kinds which occurred, so that
+    an empty Counter means nothing needed repair)
+    """
+    for kind, n in ((STRAY_END, n_stray), (ORPHAN_INSIDE, n_orphan),
+            (UNKNOWN, n_unknown)):
+        if n:
+            repairs[kind] += n
+
+
+# vim: et ai si sts=4
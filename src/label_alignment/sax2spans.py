@@ -6,16 +6,19 @@ Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
 
 import re
 
+from collections import deque
 from pathlib import Path
 from typing import (Sequence, Mapping, Union, Optional,
-        Tuple, List, Dict
+        Tuple, List, Dict, Deque, Iterator, BinaryIO,
+        Literal, overload, cast,
         )
 
 import xml.sax
 from xml.sax.handler import ContentHandler
-from xml.sax.xmlreader import Locator, AttributesImpl
+from xml.sax.xmlreader import Locator, AttributesImpl, IncrementalParser
 
 from .span_annotation import SpanAnnotation
+from .span_table import SpanTable, SpanTableBuilder
 from .types import LabeledText
 
 
@@ -127,7 +130,111 @@ class SpanAndText(ContentHandler):
         self.current_text = (self.current_text or '') + ch
 
 
-def text_and_spans(parsed : SpanAndText) -> Tuple[str, List[SpanAnnotation]]:
+class StreamingSpanAndText(SpanAndText):
+    """
+    SpanAndText which, instead of keeping every paragraph until 
+    the end of the document, queues each one as it is completed,
+    for stream_paragraphs to take off the queue
+    """
+    def __init__(self, verbose : int = 0) -> None:
+        super().__init__(verbose=verbose)
+        self.completed : Deque[List[LabeledText]] = deque()
+
+    def endParagraph(self):
+        if self.verbose:
+            print('ending paragraph')
+        self.completed.append(self.current_paragraph)
+        self.current_paragraph = None
+
+
+def paragraph_text_and_spans(paragraph : List[LabeledText]
+        ) -> Tuple[str, List[SpanAnnotation]]:
+    """
+    text of a single paragraph (without the trailing newline
+    added by text_and_spans), and the labeled chunks in it,
+    with offsets relative to the start of the paragraph
+    """
+    annos : List[SpanAnnotation] = []
+    chunks : List[str] = []
+    offset : int = 0
+    for chunk in paragraph:
+        chunk_text : str = chunk.get('text', '')
+        chunks.append(chunk_text)
+        chunk_label = chunk.get('label')
+        if chunk_label:
+            annos.append(SpanAnnotation(start=offset,
+                label=chunk_label,
+                end=offset + len(chunk_text)))
+        offset += len(chunk_text)
+    return (''.join(chunks), annos)
+
+def stream_paragraphs(source : Union[Path, str, BinaryIO],
+        chunk_size : int = 1 << 16,
+        ) -> Iterator[Tuple[str, List[SpanAnnotation], int]]:
+    """
+    parse source (a path, or a file opened in binary mode)
+    incrementally, yielding (paragraph_text, spans, global_offset)
+    for each paragraph as soon as its </p> has been read.
+
+    spans are relative to paragraph_text, and global_offset is the
+    offset of the paragraph in the text that text_and_spans would
+    return for the whole document, so adding it to the span offsets
+    gives the same spans as span_parsed.
+
+    Only chunk_size bytes of input and the paragraphs not yet
+    consumed are held in memory at any time.
+    """
+    handler : StreamingSpanAndText = StreamingSpanAndText()
+    # (make_parser is typed as returning any XMLReader, but the
+    # expat reader it returns also supports feed and close)
+    parser = cast(IncrementalParser, xml.sax.make_parser())
+    parser.setContentHandler(handler)
+    global_offset : int = 0
+    f : BinaryIO
+    if isinstance(source, (str, Path)):
+        f = open(source, 'rb')
+    else:
+        f = source
+    try:
+        completed = handler.completed
+        done : bool = False
+        while not done:
+            block : bytes = f.read(chunk_size)
+            if block:
+                parser.feed(block)
+            else:
+                parser.close()
+                done = True
+            while completed:
+                text, spans = paragraph_text_and_spans(completed.popleft())
+                yield (text, spans, global_offset)
+                # text_and_spans adds a newline after every paragraph
+                global_offset += len(text) + 1
+    finally:
+        if f is not source:
+            f.close()
+
+@overload
+def text_and_spans(parsed : SpanAndText,
+        table : Literal[False] = False) -> Tuple[str, List[SpanAnnotation]]: ...
+@overload
+def text_and_spans(parsed : SpanAndText,
+        table : Literal[True]) -> Tuple[str, SpanTable]: ...
+@overload
+def text_and_spans(parsed : SpanAndText,
+        table : bool = False
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]: ...
+def text_and_spans(parsed : SpanAndText, 
+        table : bool = False
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]:
+    """
+    join the paragraphs of parsed into a single text (with a 
+    newline after each paragraph) and return it along with
+    the offsets of the labeled chunks, as a list of SpanAnnotation,
+    or as a span_table.SpanTable if table is True
+    """
+    if table:
+        return _text_and_table(parsed)
     start_of_paragraph : int = 0
     annos : List[SpanAnnotation] = []
     chunks : List[str] = []
@@ -152,6 +259,26 @@ def text_and_spans(parsed : SpanAndText) -> Tuple[str, List[SpanAnnotation]]:
     text = ''.join(chunks)
     return (''.join(chunks), annos)
 
+def _text_and_table(parsed : SpanAndText) -> Tuple[str, SpanTable]:
+    """
+    text_and_spans, but adding spans to a SpanTableBuilder
+    rather than creating a SpanAnnotation for each
+    """
+    builder : SpanTableBuilder = SpanTableBuilder()
+    chunks : List[str] = []
+    offset : int = 0
+    for paragraph in parsed.paragraphs:
+        for chunk in paragraph:
+            chunk_text : str = chunk.get('text', '')
+            chunks.append(chunk_text)
+            chunk_label = chunk.get('label')
+            if chunk_label:
+                builder.add(offset, offset + len(chunk_text), chunk_label)
+            offset += len(chunk_text)
+        chunks.append('\n')
+        offset += 1
+    return (''.join(chunks), builder.build())
+
 def find_consec_whitespace(text : str) -> List[SpanAnnotation]:
     """
     One of the purposes of text_and_spans is to test round-trips
@@ -171,10 +298,22 @@ def find_consec_whitespace(text : str) -> List[SpanAnnotation]:
     return consec
 
 
-def span_parsed(p : Union[Path, str]) -> Tuple[str, List[SpanAnnotation]]:
+@overload
+def span_parsed(p : Union[Path, str],
+        table : Literal[False] = False) -> Tuple[str, List[SpanAnnotation]]: ...
+@overload
+def span_parsed(p : Union[Path, str],
+        table : Literal[True]) -> Tuple[str, SpanTable]: ...
+@overload
+def span_parsed(p : Union[Path, str],
+        table : bool = False
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]: ...
+def span_parsed(p : Union[Path, str], 
+        table : bool = False
+        ) -> Tuple[str, Union[List[SpanAnnotation], SpanTable]]:
     sat : SpanAndText = SpanAndText()
     xml.sax.parse(p, handler=sat)
-    return text_and_spans(sat)
+    return text_and_spans(sat, table=table)
 
 
 
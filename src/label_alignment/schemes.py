@@ -0,0 +1,67 @@
+"""
+names and label prefixes of the IOB-style tagging schemes
+supported by label_codec.LabelCodec
+
+see
+    https://en.wikipedia.org/wiki/Inside%E2%80%93outside%E2%80%93beginning_(tagging)
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from typing import Sequence, Mapping, Union, Optional, Dict, Tuple
+
+# chunk prefixes (other than O) used by each scheme,
+# in the order in which LabelCodec assigns them ids
+SCHEMES : Dict[str, str] = {
+        "IO": "I",
+        "IOB1": "BI",
+        "IOB2": "BI",
+        "IOE1": "IE",
+        "IOE2": "IE",
+        "IOBES": "BIES",
+        "BILOU": "BILU",
+        }
+
+# for schemes where the prefix of a token depends only on
+# its position within its own chunk, the prefixes used for
+# the first, inside and last tokens of a multi-token chunk,
+# and for a single-token chunk (the B, I, L and U of BILOU).
+#
+# IOB1 and IOE1 are missing because B (E) is only used
+# when the chunk follows (precedes) one of the same class
+SPAN_ROLES : Dict[str, str] = {
+        "IO": "IIII",
+        "IOB2": "BIIB",
+        "IOE2": "IIEE",
+        "IOBES": "BIES",
+        "BILOU": "BILU",
+        }
+
+# schemes in which E marks the last token of a chunk, so that an E
+# with no open chunk of its class before it is a single-token chunk,
+# and an I after O simply starts a chunk (neither needs repair)
+ENDING_SCHEMES : Tuple[str, ...] = ("IOE1", "IOE2")
+
+# equivalent prefixes, used when a label's prefix is not
+# part of a scheme but its alias is (e.g. S-PER in BILOU)
+PREFIX_ALIASES : Dict[str, str] = {
+        "S": "U",
+        "U": "S",
+        "E": "L",
+        "L": "E",
+        }
+
+def check_scheme(scheme : str) -> str:
+    """
+    return canonical (upper case) name of scheme,
+    raising ValueError if it is not supported
+    """
+    canonical : str = scheme.upper()
+    if canonical not in SCHEMES:
+        msg = (f"unknown tagging scheme {scheme!r}, expected one of "
+                f"{', '.join(SCHEMES)}")
+        raise ValueError(msg)
+    return canonical
+
+
+# vim: et ai si sts=4
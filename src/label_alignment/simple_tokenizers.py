@@ -8,12 +8,15 @@ Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
 from typing import (
         Sequence, Mapping, 
         Union, Optional,
-        List, Dict, Tuple
+        List, Dict, Tuple, Iterator
         )
 
 from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from itertools import chain
 
+import numpy as np
+
 from .tokenized import Tokenized
 
 import tokenizers
@@ -25,26 +28,182 @@ def flatten(list_of_lists):
     "Flatten one level of nesting."
     return chain.from_iterable(list_of_lists)
 
+# default memory budget (in bytes) for the dense char -> token map
+# of TokenizedImpl (4 bytes per character of text)
+DENSE_BUDGET : int = 1 << 22
+
 class TokenizedImpl:
-    def __init__(self, tok_out : TokOut) -> None:
-        self.tok_out : TokOut = tok_out
-        self.bounds = list(
-                flatten(
-                    x[1] for x in tok_out
-                    )
-                )
-        self._tokens = tuple(x[0] for x in tok_out)
+    """
+    Tokenized built from pre-tokenizer output, with the token
+    offsets kept in a NumPy array of interleaved start and
+    end bounds
+
+    The first call to char_to_token_many builds a dense array
+    mapping every character to its token (-1 for none), as long
+    as that takes no more than dense_budget bytes (0 to disable).
+    char_to_token bisects a list of the bounds, which is faster
+    than NumPy for a single lookup.
+    """
+    def __init__(self, tok_out : TokOut,
+            dense_budget : Optional[int] = None) -> None:
+        self._init(tuple(x[0] for x in tok_out),
+                np.fromiter(
+                    flatten(
+                        x[1] for x in tok_out
+                        ),
+                    dtype=np.int64, count=2 * len(tok_out)),
+                dense_budget)
+
+    def _init(self, tokens : Tuple[str, ...], bounds : np.ndarray,
+            dense_budget : Optional[int]) -> None:
+        self._tokens = tokens
+        self.bounds : np.ndarray = bounds
+        self.dense_budget : int = (DENSE_BUDGET if dense_budget is None
+                else dense_budget)
+        self._dense : Optional[np.ndarray] = None
+        self._bound_list : Optional[List[int]] = None
+
+    @classmethod
+    def from_arrays(cls, tokens : Sequence[str], bounds : np.ndarray,
+            dense_budget : Optional[int] = None) -> "TokenizedImpl":
+        """
+        TokenizedImpl sharing an existing array of interleaved
+        bounds (e.g. a slice of TokenizedBatch.bounds)
+        """
+        tokenized = cls.__new__(cls)
+        tokenized._init(tuple(tokens), bounds, dense_budget)
+        return tokenized
+
+    @property
+    def tok_out(self) -> TokOut:
+        return list(zip(self._tokens, self.offsets))
     @property
     def tokens(self):
         return self._tokens
+    @property
+    def offsets(self) -> Tuple[tokenizers.Offsets, ...]:
+        return tuple(map(tuple, self.offset_array.tolist()))
+    @property
+    def offset_array(self) -> np.ndarray:
+        """
+        (start, end) offsets as an array of shape (n_tokens, 2)
+        """
+        return self.bounds.reshape(-1, 2)
+
+    def _dense_map(self) -> Optional[np.ndarray]:
+        if self._dense is None:
+            n_chars : int = int(self.bounds[-1]) if len(self.bounds) else 0
+            if n_chars * 4 > self.dense_budget:
+                return None
+            self._dense = self._search(np.arange(n_chars)).astype(np.int32)
+        return self._dense
+
+    def _search(self, char_indices : np.ndarray) -> np.ndarray:
+        i_all : np.ndarray = np.searchsorted(self.bounds, char_indices,
+                side='right')
+        return np.where(i_all % 2 == 1, (i_all - 1) // 2, -1)
 
     def char_to_token(self, char_ix: int) -> Optional[int]:
-        i_all : int = bisect_right(self.bounds, char_ix)
+        if self._bound_list is None:
+            self._bound_list = self.bounds.tolist()
+        i_all : int = bisect_right(self._bound_list, char_ix)
         if i_all % 2 == 0:
             return None
         tok_ix : int = (i_all - 1) // 2
         return tok_ix
 
+    def char_to_token_many(self, char_indices : Sequence[int]) -> np.ndarray:
+        """
+        vectorized char_to_token, returning an int array with
+        the token index of each character index, or -1 where
+        char_to_token would return None
+        """
+        char_array : np.ndarray = np.asarray(char_indices, dtype=np.int64)
+        dense : Optional[np.ndarray] = self._dense_map()
+        if dense is None:
+            return self._search(char_array)
+        inside = (char_array >= 0) & (char_array < len(dense))
+        return np.where(inside,
+                dense[np.where(inside, char_array, 0)] if len(dense) else -1,
+                -1)
+
+
+class TokenizedBatch:
+    """
+    compact tokenization of many texts: the tokens of all texts
+    in one tuple, their interleaved (start, end) bounds in one 
+    int64 array, and the index of the first token of each text
+    (plus the total) in doc_starts
+
+    Indexing or iterating gives a TokenizedImpl per text, sharing
+    the batch's arrays, so a TokenizedBatch can be passed to
+    alignment.align_batch.
+    """
+    def __init__(self, tokens : Tuple[str, ...], bounds : np.ndarray,
+            doc_starts : np.ndarray) -> None:
+        self.tokens : Tuple[str, ...] = tokens
+        self.bounds : np.ndarray = bounds
+        self.doc_starts : np.ndarray = doc_starts
+
+    def __len__(self) -> int:
+        return len(self.doc_starts) - 1
+
+    def __getitem__(self, doc_ix : int) -> TokenizedImpl:
+        if doc_ix < 0:
+            doc_ix += len(self)
+        if not 0 <= doc_ix < len(self):
+            raise IndexError(doc_ix)
+        first : int = int(self.doc_starts[doc_ix])
+        last : int = int(self.doc_starts[doc_ix + 1])
+        return TokenizedImpl.from_arrays(self.tokens[first:last],
+                self.bounds[2 * first:2 * last])
+
+    def __iter__(self) -> Iterator[TokenizedImpl]:
+        for doc_ix in range(len(self)):
+            yield self[doc_ix]
+
+    def lengths(self) -> np.ndarray:
+        """
+        number of tokens in each text
+        """
+        return np.diff(self.doc_starts)
+
+    @classmethod
+    def concatenate(cls, batches : Sequence["TokenizedBatch"]
+            ) -> "TokenizedBatch":
+        """
+        one TokenizedBatch with the texts of all batches, in order
+        """
+        doc_starts : np.ndarray = np.zeros(
+                sum(len(batch) for batch in batches) + 1, dtype=np.int64)
+        np.cumsum(np.concatenate([batch.lengths() for batch in batches]
+            + [np.zeros(0, dtype=np.int64)]), out=doc_starts[1:])
+        return cls(tuple(flatten(batch.tokens for batch in batches)),
+                np.concatenate([batch.bounds for batch in batches]
+                    + [np.zeros(0, dtype=np.int64)]),
+                doc_starts)
+
+
+def _tokenize_texts(pretok : pre_tokenizers.PreTokenizer,
+        texts : Sequence[str]) -> TokenizedBatch:
+    """
+    tokenize texts one after another into a TokenizedBatch
+    (runs in the worker processes of PretokenizerWrapper.tokenize_batch)
+    """
+    tokens : List[str] = []
+    bounds : List[int] = []
+    counts : List[int] = []
+    pre_tokenize_str = pretok.pre_tokenize_str
+    for text in texts:
+        tok_out : TokOut = pre_tokenize_str(text)
+        tokens.extend(x[0] for x in tok_out)
+        bounds.extend(flatten(x[1] for x in tok_out))
+        counts.append(len(tok_out))
+    doc_starts : np.ndarray = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(np.array(counts, dtype=np.int64), out=doc_starts[1:])
+    return TokenizedBatch(tuple(tokens),
+            np.array(bounds, dtype=np.int64), doc_starts)
+
 
 class PretokenizerWrapper:
     def __init__(self, pretok : pre_tokenizers.PreTokenizer) -> None:
@@ -57,6 +216,30 @@ class PretokenizerWrapper:
         pre_tok_output : TokOut = self.raw_tokenize(text)
         return TokenizedImpl(pre_tok_output)
 
+    def tokenize_batch(self, texts : Sequence[str],
+            max_workers : int = 1,
+            chunk_size : int = 1024) -> TokenizedBatch:
+        """
+        tokenize many texts, returning the results as a single
+        TokenizedBatch rather than a TokenizedImpl per text
+
+        With max_workers > 1, chunks of chunk_size texts are
+        tokenized by a ProcessPoolExecutor with max_workers
+        processes, each returning a TokenizedBatch for its chunk.
+        (pre_tokenize_str holds the GIL while it builds its Python
+        result, so threads can't spread the work over several cores.
+        Processes can, but the texts and results have to be pickled
+        on the way, so they pay off only for large batches.)
+        """
+        chunks : List[Sequence[str]] = [texts[i:i + chunk_size]
+                for i in range(0, len(texts), chunk_size)]
+        if max_workers <= 1 or len(chunks) <= 1:
+            return _tokenize_texts(self.pretok, texts)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            batches : List[TokenizedBatch] = list(executor.map(
+                _tokenize_texts, [self.pretok] * len(chunks), chunks))
+        return TokenizedBatch.concatenate(batches)
+
 def ws_tokenizer() -> PretokenizerWrapper:
     return PretokenizerWrapper(pre_tokenizers.Whitespace())
 def wss_tokenizer() -> PretokenizerWrapper:
@@ -5,19 +5,32 @@ Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
 """
 
 from typing import (
-        Sequence, Mapping, Union, Optional,
+        Sequence, Mapping, Union, Optional, NamedTuple,
 #        Sized,
         )
 
 from .types import LabeledSpan
 
+class SpanScores(NamedTuple):
+    """
+    aggregate scores (e.g. probabilities of the predicted tags)
+    of the tokens in a span (see span_table.ScoreColumns for the
+    scores of all the spans of a SpanTable)
+    """
+    mean : float
+    min : float
+    product : float
+
 class SpanAnnotation():
     def __init__(self, start : int,
             label : str,
-            end : int = -1) -> None:
+            end : int = -1,
+            scores : Optional[SpanScores] = None) -> None:
         self.start = start
         self.label = label
         self.end = end
+        # only set by decoders given token scores
+        self.scores = scores
     def __str__(self):
         return f'{self.label}: ({self.start}, {self.end})'
     def __repr__(self):
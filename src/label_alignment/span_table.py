@@ -0,0 +1,317 @@
+"""
+SpanTable: columnar storage for many span annotations,
+as NumPy arrays of start offsets, end offsets and label ids
+plus a vocabulary of labels, instead of one SpanAnnotation
+(or LabeledSpan dict) per span
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from array import array
+from typing import (
+        Sequence, Mapping, Iterable, Iterator,
+        Union, Optional, overload,
+        List, Dict, Tuple, NamedTuple,
+        )
+
+import numpy as np
+
+from .span_annotation import SpanAnnotation, SpanScores
+from .types import LabeledSpan
+
+class ScoreColumns(NamedTuple):
+    """
+    SpanScores of all the spans in a SpanTable, as float64
+    arrays with one entry per span
+    """
+    mean : np.ndarray
+    min : np.ndarray
+    product : np.ndarray
+
+class SpanTable:
+    """
+    immutable table of spans with columns
+
+        starts: start offsets (int64)
+        ends: end offsets (int64)
+        label_ids: indices into labels (int32)
+
+    and optionally scores, a ScoreColumns with the mean, min and
+    product of the scores of the tokens in each span (see 
+    ids2spans.span_scores)
+
+    Indexing with an integer returns a SpanAnnotation,
+    created only when asked for (so iterating over a SpanTable
+    behaves like iterating over a list of SpanAnnotation).
+    Indexing with a slice, or an array of indices or booleans,
+    returns a new SpanTable sharing the same labels.
+    """
+    def __init__(self, starts : Union[Sequence[int], np.ndarray],
+            ends : Union[Sequence[int], np.ndarray],
+            label_ids : Union[Sequence[int], np.ndarray],
+            labels : Sequence[str],
+            scores : Optional[ScoreColumns] = None) -> None:
+        self.starts : np.ndarray = np.asarray(starts, dtype=np.int64)
+        self.ends : np.ndarray = np.asarray(ends, dtype=np.int64)
+        self.label_ids : np.ndarray = np.asarray(label_ids, dtype=np.int32)
+        self.labels : Tuple[str, ...] = tuple(labels)
+        self.scores : Optional[ScoreColumns] = None
+        if scores is not None:
+            self.scores = ScoreColumns(*(np.asarray(column, dtype=np.float64)
+                for column in scores))
+        if not (len(self.starts) == len(self.ends) == len(self.label_ids)
+                and (self.scores is None or all(len(column) == len(self.starts)
+                    for column in self.scores))):
+            msg = (f"columns have different lengths: {len(self.starts)} "
+                    f"starts, {len(self.ends)} ends, "
+                    f"{len(self.label_ids)} label ids")
+            raise ValueError(msg)
+
+    @classmethod
+    def from_annotations(cls,
+            annotations : Iterable[Union[SpanAnnotation, LabeledSpan]],
+            labels : Sequence[str] = ()) -> "SpanTable":
+        """
+        create a SpanTable from SpanAnnotation or LabeledSpan objects
+
+        labels gives an initial vocabulary (e.g. to share label
+        ids with other tables), to which any other labels are added
+
+        The table has scores if every annotation has scores.
+        """
+        builder = SpanTableBuilder(labels)
+        for anno in annotations:
+            if isinstance(anno, SpanAnnotation):
+                builder.add(anno.start, anno.end, anno.label,
+                        scores=anno.scores)
+            else:
+                builder.add(anno["start"], anno["end"], anno["label"])
+        return builder.build()
+
+    @classmethod
+    def concatenate(cls, tables : Sequence["SpanTable"],
+            offsets : Optional[Sequence[int]] = None) -> "SpanTable":
+        """
+        one SpanTable with the spans of all of tables, merging
+        their label vocabularies, and (if given) adding
+        offsets[i] to the starts and ends of tables[i]
+        """
+        label_index : Dict[str, int] = {}
+        starts : List[np.ndarray] = []
+        ends : List[np.ndarray] = []
+        label_ids : List[np.ndarray] = []
+        scored : bool = bool(tables) and all(table.scores is not None
+                for table in tables)
+        for i, table in enumerate(tables):
+            remap = np.array([label_index.setdefault(label, len(label_index))
+                for label in table.labels], dtype=np.int32)
+            shift : int = offsets[i] if offsets is not None else 0
+            starts.append(table.starts + shift)
+            ends.append(table.ends + shift)
+            label_ids.append(remap[table.label_ids] if len(remap)
+                    else table.label_ids)
+        if not tables:
+            return cls([], [], [], [])
+        scores : Optional[ScoreColumns] = None
+        if scored:
+            scores = ScoreColumns(*(np.concatenate(columns) for columns
+                in zip(*(table.scores for table in tables
+                    if table.scores is not None))))
+        return cls(np.concatenate(starts), np.concatenate(ends),
+                np.concatenate(label_ids), list(label_index), scores=scores)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @overload
+    def __getitem__(self, key : int) -> SpanAnnotation: ...
+    @overload
+    def __getitem__(self, key : Union[slice, np.ndarray]) -> "SpanTable": ...
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return SpanAnnotation(start=int(self.starts[key]),
+                    label=self.labels[self.label_ids[key]],
+                    end=int(self.ends[key]),
+                    scores=self._scores_at(key))
+        return SpanTable(self.starts[key], self.ends[key],
+                self.label_ids[key], self.labels,
+                scores=self._scores_of(key))
+
+    def _scores_at(self, key : int) -> Optional[SpanScores]:
+        if self.scores is None:
+            return None
+        return SpanScores(*(float(column[key]) for column in self.scores))
+
+    def _scores_of(self, key) -> Optional[ScoreColumns]:
+        if self.scores is None:
+            return None
+        return ScoreColumns(*(column[key] for column in self.scores))
+
+    def __iter__(self) -> Iterator[SpanAnnotation]:
+        labels = self.labels
+        if self.scores is not None:
+            for start, end, label_id, *scores in zip(self.starts.tolist(),
+                    self.ends.tolist(), self.label_ids.tolist(),
+                    *(column.tolist() for column in self.scores)):
+                yield SpanAnnotation(start=start, label=labels[label_id],
+                        end=end, scores=SpanScores(*scores))
+            return
+        for start, end, label_id in zip(self.starts.tolist(),
+                self.ends.tolist(), self.label_ids.tolist()):
+            yield SpanAnnotation(start=start, label=labels[label_id], end=end)
+
+    def __eq__(self, other) -> bool:
+        """
+        tables are equal if they have the same spans, with the
+        same labels (even if the label ids differ)
+        """
+        if not isinstance(other, SpanTable):
+            return NotImplemented
+        return (
+                len(self) == len(other)
+                and bool((self.starts == other.starts).all())
+                and bool((self.ends == other.ends).all())
+                and self.label_strings() == other.label_strings()
+                )
+
+    def __repr__(self) -> str:
+        return f'SpanTable({len(self)} spans, labels={list(self.labels)!r})'
+
+    @property
+    def nbytes(self) -> int:
+        nbytes : int = (self.starts.nbytes + self.ends.nbytes
+                + self.label_ids.nbytes)
+        if self.scores is not None:
+            nbytes += sum(column.nbytes for column in self.scores)
+        return nbytes
+
+    def label_strings(self) -> List[str]:
+        labels = self.labels
+        return [labels[label_id] for label_id in self.label_ids.tolist()]
+
+    def to_annotations(self) -> List[SpanAnnotation]:
+        return list(self)
+
+    def to_labeled_spans(self) -> List[LabeledSpan]:
+        labels = self.labels
+        return [LabeledSpan(start=start, end=end, label=labels[label_id])
+                for start, end, label_id in zip(self.starts.tolist(),
+                    self.ends.tolist(), self.label_ids.tolist())]
+
+    def shifted(self, offset : int) -> "SpanTable":
+        """
+        the same spans, with offset added to all starts and ends
+        """
+        return SpanTable(self.starts + offset, self.ends + offset,
+                self.label_ids, self.labels, scores=self.scores)
+
+
+class BatchSpanTable(SpanTable):
+    """
+    SpanTable for the spans of a batch of documents, with an
+    extra column
+
+        docs: index of the document containing each span (int64)
+
+    Spans are sorted by document (as produced by
+    ids2spans.iob2spans_batch), which document() relies on.
+    """
+    def __init__(self, docs : Union[Sequence[int], np.ndarray],
+            starts : Union[Sequence[int], np.ndarray],
+            ends : Union[Sequence[int], np.ndarray],
+            label_ids : Union[Sequence[int], np.ndarray],
+            labels : Sequence[str],
+            scores : Optional[ScoreColumns] = None) -> None:
+        super().__init__(starts, ends, label_ids, labels, scores=scores)
+        self.docs : np.ndarray = np.asarray(docs, dtype=np.int64)
+        if len(self.docs) != len(self.starts):
+            msg = (f"columns have different lengths: {len(self.docs)} "
+                    f"docs, {len(self.starts)} starts")
+            raise ValueError(msg)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return super().__getitem__(key)
+        return BatchSpanTable(self.docs[key], self.starts[key],
+                self.ends[key], self.label_ids[key], self.labels,
+                scores=self._scores_of(key))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BatchSpanTable):
+            return NotImplemented
+        return (super().__eq__(other)
+                and bool((self.docs == other.docs).all()))
+
+    def __repr__(self) -> str:
+        return (f'BatchSpanTable({len(self)} spans, '
+                f'labels={list(self.labels)!r})')
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.docs.nbytes
+
+    def document(self, doc_ix : int) -> SpanTable:
+        """
+        SpanTable of the spans in document doc_ix
+        """
+        first, last = np.searchsorted(self.docs, [doc_ix, doc_ix + 1])
+        return SpanTable.__getitem__(self, slice(first, last))
+
+    def documents(self, n_docs : int) -> List[SpanTable]:
+        """
+        one SpanTable per document, for documents 0 to n_docs - 1
+        (including those without spans)
+        """
+        bounds : List[int] = np.searchsorted(self.docs,
+                np.arange(n_docs + 1)).tolist()
+        return [SpanTable.__getitem__(self, slice(first, last))
+                for first, last in zip(bounds[:-1], bounds[1:])]
+
+
+class SpanTableBuilder:
+    """
+    accumulates spans one at a time in compact arrays,
+    then builds a SpanTable (with scores, if every span
+    was added with scores)
+    """
+    def __init__(self, labels : Sequence[str] = ()) -> None:
+        self.starts : array = array('q')
+        self.ends : array = array('q')
+        self.label_ids : array = array('i')
+        self.score_columns : Tuple[array, array, array] = (array('d'),
+                array('d'), array('d'))
+        self.label_index : Dict[str, int] = {}
+        for label in labels:
+            self.label_index.setdefault(label, len(self.label_index))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start : int, end : int, label : str,
+            scores : Optional[SpanScores] = None) -> None:
+        label_id : Optional[int] = self.label_index.get(label)
+        if label_id is None:
+            label_id = self.label_index[label] = len(self.label_index)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.label_ids.append(label_id)
+        if scores is not None:
+            for column, score in zip(self.score_columns, scores):
+                column.append(score)
+
+    def build(self) -> SpanTable:
+        """
+        SpanTable of the spans added so far (copied, so that
+        the builder can go on adding spans)
+        """
+        scores : Optional[ScoreColumns] = None
+        if len(self) and len(self.score_columns[0]) == len(self):
+            scores = ScoreColumns(*(np.frombuffer(column,
+                dtype=np.float64).copy() for column in self.score_columns))
+        return SpanTable(np.frombuffer(self.starts, dtype=np.int64).copy(),
+                np.frombuffer(self.ends, dtype=np.int64).copy(),
+                np.frombuffer(self.label_ids, dtype=np.int32).copy(),
+                list(self.label_index), scores=scores)
+
+
+# vim: et ai si sts=4
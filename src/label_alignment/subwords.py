@@ -0,0 +1,118 @@
+"""
+delimiter rules for sub-word tokenizations, used by
+tok2spans.iob2spans (subwords=...) to work out where each token
+falls in the text, when all we have are the tokens themselves
+
+Each rule is a marker prefix which either flags a token as
+continuing the previous word (WordPiece "##") or as starting a
+new word (SentencePiece "▁", byte-level BPE "Ġ").  Instead of
+calling a delim_width function per token (see
+iob_state.delim_width_before), the rules are applied to the whole
+token sequence at once, giving arrays of delimiter widths and
+token lengths (with the marker removed), and from those the
+(start, end) offsets of every token.
+
+Note: the offsets are into the text the tokens spell out, with a
+single space between words, so they match the original text only
+if it had single spaces between words (and, for byte-level BPE, is
+ASCII).  When the tokenizer provides offsets (e.g.
+tokenizers.Encoding.offsets), use those instead.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from operator import methodcaller
+from typing import (
+        Sequence, Mapping,
+        Union, Optional,
+        Dict, Tuple, NamedTuple,
+        )
+
+import numpy as np
+
+from .ids2spans import token_starts
+
+
+class SubwordRule(NamedTuple):
+    """
+    name: name of the rule (see SUBWORD_RULES)
+    marker: prefix marking tokens (not part of the text)
+    continues: True if marked tokens continue the previous
+        word, False if they start a new word
+    """
+    name : str
+    marker : str
+    continues : bool
+
+    def widths_and_lengths(self, tokens : Sequence[str]
+            ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        arrays of the width of the delimiter before each token
+        (0 or 1, and always 0 for the first token) and of the
+        length of each token in the text (without the marker)
+        """
+        n_tokens : int = len(tokens)
+        lengths : np.ndarray = np.fromiter(map(len, tokens),
+                dtype=np.int64, count=n_tokens)
+        widths : np.ndarray
+        if not self.marker:
+            widths = np.ones(n_tokens, dtype=np.int64)
+        else:
+            marked : np.ndarray = np.fromiter(
+                    map(methodcaller('startswith', self.marker), tokens),
+                    dtype=bool, count=n_tokens)
+            lengths -= len(self.marker) * marked
+            widths = (~marked if self.continues else marked).astype(np.int64)
+        if n_tokens:
+            widths[0] = 0
+        return (widths, lengths)
+
+    def offsets(self, tokens : Sequence[str]) -> np.ndarray:
+        """
+        (start, end) offsets of each token in the text spelled
+        out by tokens, as an array of shape (n_tokens, 2)
+        """
+        widths, lengths = self.widths_and_lengths(tokens)
+        offsets : np.ndarray = np.empty((len(tokens), 2), dtype=np.int64)
+        offsets[:, 0] = token_starts(lengths, widths=widths)
+        offsets[:, 1] = offsets[:, 0] + lengths
+        return offsets
+
+
+SUBWORD_RULES : Dict[str, SubwordRule] = {
+        # every token is a word, with a single space between words
+        # (the assumption of iob2spans without subwords)
+        'space': SubwordRule('space', '', False),
+        # BERT-style WordPiece: "##ing" continues the previous word
+        'wordpiece': SubwordRule('wordpiece', '##', True),
+        # SentencePiece (and tokenizers' Metaspace): "▁the" starts a word
+        'sentencepiece': SubwordRule('sentencepiece', '▁', False),
+        # GPT-2-style byte-level BPE: "Ġthe" starts a word
+        'bytelevel': SubwordRule('bytelevel', 'Ġ', False),
+        }
+SUBWORD_RULES['metaspace'] = SUBWORD_RULES['sentencepiece']
+
+
+def subword_rule(rule : Union[str, SubwordRule]) -> SubwordRule:
+    """
+    the SubwordRule with the given name (or rule itself)
+    """
+    if isinstance(rule, SubwordRule):
+        return rule
+    found : Optional[SubwordRule] = SUBWORD_RULES.get(rule.lower())
+    if found is None:
+        msg = (f"unknown subword rule {rule!r}, expected one of "
+                f"{', '.join(sorted(SUBWORD_RULES))}")
+        raise ValueError(msg)
+    return found
+
+def subword_offsets(tokens : Sequence[str],
+        rule : Union[str, SubwordRule]) -> np.ndarray:
+    """
+    (start, end) offsets of tokens under the given rule
+    (see SubwordRule.offsets)
+    """
+    return subword_rule(rule).offsets(tokens)
+
+
+# vim: et ai si sts=4
@@ -5,17 +5,38 @@ suitable as input to alignment.py
 Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
 """
 
+from collections import Counter
 from typing import (Sequence, Mapping, 
-        Union, Optional, Generator
+        Union, Optional, Generator, List, Tuple, cast,
         )
 
+import numpy as np
+
 from .span_annotation import SpanAnnotation
 
+from .ids2spans import chunk_offsets, span_scores
 from .iob_state import IOBState, Outside
+from .iob_table import TransitionTable, compiled_table, table_spans
+from .repair import repair_labels
+from .span_table import SpanTable
+from .subwords import SubwordRule, subword_offsets
+from .tokenized import TokenizedWithOffsets
+
+# (start, end) character offsets of each token, e.g. the offsets
+# of a tokenizers.Encoding, or an array of shape (n_tokens, 2)
+TokenOffsets = Union[Sequence[Tuple[int, int]], np.ndarray]
+# a score per token, e.g. the probability of its predicted label
+TokenScores = Union[Sequence[float], np.ndarray]
 
 def iob2spans(tokens : Sequence[str], 
         labels : Sequence[str],
-        default_class : str = "CHUNK"
+        default_class : str = "CHUNK",
+        engine : str = "state",
+        offsets : Optional[TokenOffsets] = None,
+        subwords : Optional[Union[str, SubwordRule]] = None,
+        scores : Optional[TokenScores] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
         ) -> Generator[SpanAnnotation, None, None]:
     """
     given a sequence of string tokens and corresponding labels
@@ -23,6 +44,33 @@ def iob2spans(tokens : Sequence[str],
     character offsets into the string which would result from
     concatening tokens with a single space as delimiter.
 
+    If offsets (the (start, end) character offsets of each token
+    in the original text) are given, the annotations are instead
+    in the coordinates of the original text: each starts at the
+    start of its first token and ends at the end of its last.
+    (See also tokenized2spans.)
+
+    For sub-word tokens, subwords names the rule for which
+    tokens continue the previous word (see subwords.SUBWORD_RULES:
+    "wordpiece", "sentencepiece" or "bytelevel"), so that the 
+    annotations are into the text the tokens spell out, with 
+    markers such as "##" removed and no space before 
+    continuation tokens.  subwords and offsets cannot both be given.
+
+    If scores (a score per token, typically the probability of
+    its predicted label) are given, each annotation gets a scores
+    attribute, a SpanScores with the mean, min and product of 
+    the scores of its tokens (see ids2spans.span_scores).  In that
+    case, the whole sequence is decoded before the first 
+    annotation is yielded, whatever the engine.
+
+    Labels which the decoder can't accept (E or L with no chunk 
+    to end, or an unknown prefix) raise UnexpectedLabel, unless 
+    repair gives a policy for them ("convert" or "drop", see 
+    repair.py), in which case they (and orphan I labels) are 
+    repaired, and the repairs counted in the Counter repairs, 
+    if given.
+
     see
     https://en.wikipedia.org/wiki/Inside%E2%80%93outside%E2%80%93beginning_(tagging)
 
@@ -54,20 +102,172 @@ def iob2spans(tokens : Sequence[str],
 
     The "-<class>" suffix is required for B and U, but optional 
     for I (except in the IOB1 and IO cases) and E.
+
+    engine selects the implementation:
+
+    "state" (default) steps through the IOBState classes 
+    from iob_state, one token at a time
+
+    "table" uses the precompiled transition table from
+    iob_table, which produces the same spans without 
+    allocating per token (but decodes the whole sequence
+    before yielding the first span)
     """
+    offsets = _offset_pairs(_subword_offsets(tokens, offsets, subwords))
+    if scores is not None:
+        yield from scored_table(tokens, labels, scores,
+                default_class=default_class, engine=engine, offsets=offsets,
+                repair=repair, repairs=repairs)
+        return
+    if engine == "table":
+        # the table does its own repairs
+        yield from table_spans(tokens, labels, default_class=default_class,
+                offsets=offsets, repair=repair, repairs=repairs)
+        return
+    if engine != "state":
+        msg = f"unknown engine {engine!r}, expected 'state' or 'table'"
+        raise ValueError(msg)
+    state_labels : Sequence[Optional[str]] = labels
+    if repair is not None:
+        state_labels = repair_labels(labels, repair, repairs,
+                default_class=default_class)
     state : IOBState = Outside(default_class=default_class)
     maybe_anno : Optional[SpanAnnotation] = None
     to_emit: SpanAnnotation
-    for token, label in zip(tokens, labels):
-        state, maybe_anno = state.see(token=token, label=label)
-        if maybe_anno is not None:
-            to_emit = maybe_anno
-            yield to_emit
+    if offsets is None:
+        for token, label in zip(tokens, state_labels):
+            state, maybe_anno = state.see(token=token, label=label)
+            if maybe_anno is not None:
+                to_emit = maybe_anno
+                yield to_emit
+    else:
+        for token, label, offset in zip(tokens, state_labels, offsets):
+            state, maybe_anno = state.see(token=token, label=label,
+                    offset=offset)
+            if maybe_anno is not None:
+                to_emit = maybe_anno
+                yield to_emit
     final : Optional[SpanAnnotation] = state.end_of_text()
     if final is not None:
-        if maybe_anno is not None:
-            to_emit = maybe_anno
-            yield to_emit
+        yield final
+
+def scored_table(tokens : Sequence[str],
+        labels : Sequence[str],
+        scores : TokenScores,
+        default_class : str = "CHUNK",
+        engine : str = "state",
+        offsets : Optional[TokenOffsets] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> SpanTable:
+    """
+    decode labels into a SpanTable with scores (as for iob2spans
+    with scores): the chosen engine decodes the labels in token
+    coordinates (each token i having offsets (i, i + 1)), giving 
+    the first and last token of every span, from which the 
+    character offsets and aggregate scores of all the spans 
+    are then found at once (repairing the labels as for 
+    iob2spans, if repair is given)
+    """
+    n_tokens : int = min(len(tokens), len(labels))
+    token_ixs : List[Tuple[int, int]] = list(zip(range(n_tokens),
+        range(1, n_tokens + 1)))
+    table : SpanTable
+    if engine == "state":
+        table = SpanTable.from_annotations(iob2spans(tokens, labels,
+            default_class=default_class, offsets=token_ixs,
+            repair=repair, repairs=repairs))
+    elif engine == "table":
+        table = iob2table(tokens, labels, default_class=default_class,
+                offsets=token_ixs, repair=repair, repairs=repairs)
+    else:
+        msg = f"unknown engine {engine!r}, expected 'state' or 'table'"
+        raise ValueError(msg)
+    first_tokens : np.ndarray = table.starts
+    last_tokens : np.ndarray = table.ends - 1
+    starts, ends = chunk_offsets(first_tokens, last_tokens,
+            lengths=None if offsets is not None
+                else np.fromiter(map(len, tokens), dtype=np.int64,
+                    count=len(tokens)),
+            offsets=None if offsets is None
+                else np.asarray(offsets, dtype=np.int64))
+    return SpanTable(starts, ends, table.label_ids, table.labels,
+            scores=span_scores(np.asarray(scores, dtype=np.float64),
+                first_tokens, last_tokens))
+
+def _offset_pairs(offsets : Optional[TokenOffsets]
+        ) -> Optional[Sequence[Tuple[int, int]]]:
+    """
+    offsets as a sequence of pairs of Python ints (converting
+    NumPy arrays, whose rows would otherwise yield NumPy scalars)
+
+    (the rows of converted arrays are two-element lists, which
+    unpack like pairs wherever offsets are used)
+    """
+    if not isinstance(offsets, np.ndarray):
+        return offsets
+    return cast(Sequence[Tuple[int, int]], offsets.reshape(-1, 2).tolist())
+
+def _subword_offsets(tokens : Sequence[str],
+        offsets : Optional[TokenOffsets],
+        subwords : Optional[Union[str, SubwordRule]],
+        ) -> Optional[TokenOffsets]:
+    if subwords is None:
+        return offsets
+    if offsets is not None:
+        msg = "iob2spans takes either offsets or subwords, not both"
+        raise ValueError(msg)
+    return subword_offsets(tokens, subwords)
+
+def tokenized2spans(tokenized : TokenizedWithOffsets,
+        labels : Sequence[str],
+        default_class : str = "CHUNK",
+        engine : str = "state",
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> Generator[SpanAnnotation, None, None]:
+    """
+    iob2spans for the tokens of a tokenized text (e.g. a 
+    tokenizers.Encoding, or simple_tokenizers.TokenizedImpl) 
+    and a label for each token, yielding annotations in 
+    character offsets into the original text
+
+    Special tokens (such as [CLS] and [SEP], which have 
+    offsets (0, 0)) should be labeled "O".
+    """
+    yield from iob2spans(tokenized.tokens, labels,
+            default_class=default_class, engine=engine,
+            offsets=tokenized.offsets, repair=repair, repairs=repairs)
+
+def iob2table(tokens : Sequence[str],
+        labels : Sequence[str],
+        default_class : str = "CHUNK",
+        offsets : Optional[TokenOffsets] = None,
+        subwords : Optional[Union[str, SubwordRule]] = None,
+        scores : Optional[TokenScores] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> SpanTable:
+    """
+    same spans as iob2spans, but returned as a span_table.SpanTable,
+    decoded with the table engine straight into its columns
+    (so no SpanAnnotation is created), and with scores as for
+    iob2spans if token scores are given, and labels repaired
+    as for iob2spans if a repair policy is given (by the table
+    itself, so labels which need no repair cost nothing extra)
+    """
+    labels = list(labels)
+    if scores is not None:
+        return scored_table(tokens, labels, scores,
+                default_class=default_class, engine="table",
+                offsets=_offset_pairs(_subword_offsets(tokens, offsets,
+                    subwords)), repair=repair, repairs=repairs)
+    table : TransitionTable = compiled_table(frozenset(labels),
+            default_class, repair)
+    offsets = _subword_offsets(tokens, offsets, subwords)
+    starts, ends, classes = table.decode(tokens, labels,
+            offsets=_offset_pairs(offsets), repairs=repairs)
+    return SpanTable(starts, ends, classes, table.classes)
 
 
 # vim: et ai si sts=4
@@ -5,7 +5,7 @@ alignment.align_tokens_and_annotation_bilou
 Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
 """
 
-from typing import Protocol, List, Union, Optional
+from typing import Protocol, List, Union, Optional, Sequence, Tuple
 
 class Tokenized(Protocol):
     """
@@ -13,11 +13,22 @@ class Tokenized(Protocol):
     used by alignment.align_tokens_and_annotation_bilou
     """
     @property
-    def tokens(self) -> List[Union[str,int]]:
+    def tokens(self) -> Sequence[str]:
         pass
     def char_to_token(self, char_ix : int) -> Optional[int]:
         pass
 
+class TokenizedWithOffsets(Tokenized, Protocol):
+    """
+    Tokenized which also exposes the (start, end) character
+    offsets of each token, as tokenizers.Encoding does.
+
+    Used by alignment.align_ranges_bilou to find the tokens
+    covered by an annotation without looking up every character
+    """
+    @property
+    def offsets(self) -> Sequence[Tuple[int, int]]:
+        pass
 
 
 # vim: et ai si sts=4
@@ -0,0 +1,186 @@
+"""
+check label sequences against a specific tagging scheme
+
+iob_state (and the other decoders) are permissive, and accept
+any mixture of schemes, so they can't tell whether a corpus
+really follows the scheme it claims to.  validate checks every
+transition between adjacent tags (including from the start and
+to the end of each sequence) against the strict rules of the
+scheme in viterbi.transition_mask, for a whole corpus at once,
+and reports where the rules are broken rather than raising.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from typing import (
+        Sequence, Mapping, Iterable,
+        Union, Optional,
+        List, Dict, Tuple, NamedTuple, cast,
+        )
+
+import numpy as np
+
+from .label_codec import LabelCodec
+from .viterbi import transition_mask
+
+# tag id reported for labels which the scheme doesn't use
+NOT_IN_SCHEME = -1
+
+
+class Violations(NamedTuple):
+    """
+    one entry per violation, sorted by document and position:
+
+    docs: index of the sequence
+    positions: index of the token within its sequence at which
+        the violation was found, or the length of the sequence
+        if it ends with a tag which can't end a sequence
+    prev_ids: tag id before that position (0, i.e. O, at the
+        start of the sequence)
+    tag_ids: tag id at that position (0 at the end of the
+        sequence, NOT_IN_SCHEME for a label the scheme doesn't use)
+    """
+    docs : np.ndarray
+    positions : np.ndarray
+    prev_ids : np.ndarray
+    tag_ids : np.ndarray
+
+
+def _encode_strings(sequences : Sequence[Sequence[Optional[str]]],
+        codec : LabelCodec) -> np.ndarray:
+    """
+    tag ids of all the labels, in one flat array, with
+    NOT_IN_SCHEME for labels which aren't among codec's own tags
+
+    Unlike codec.encode, this doesn't accept the prefixes of other
+    schemes (schemes.PREFIX_ALIASES, e.g. S- for U- in BILOU), since
+    a corpus using them doesn't follow the scheme.
+    """
+    label_index : Mapping[str, int] = codec.label_index
+    def encode(label : Optional[str]) -> int:
+        return label_index.get(label or "O", NOT_IN_SCHEME)
+    return np.fromiter((encode(label) for labels in sequences
+        for label in labels), dtype=np.int64,
+        count=sum(len(labels) for labels in sequences))
+
+def validate(labels : Union[np.ndarray, Sequence[Sequence[Optional[str]]],
+            Sequence[np.ndarray]],
+        scheme : Union[str, LabelCodec] = "IOB2",
+        lengths : Optional[Union[Sequence[int], np.ndarray]] = None
+        ) -> Violations:
+    """
+    find the places where a corpus of label sequences breaks
+    the rules of scheme, which is either the name of a scheme
+    (for label strings) or a LabelCodec (for tag ids, or strings)
+
+    labels can be
+
+    - a list of sequences of label strings, or
+    - a list of arrays of tag ids from the codec, or
+    - one flat array of the tag ids of all sequences, one
+      after another, with lengths giving the length of each
+      (which avoids concatenating many small arrays)
+
+    returns Violations, which are empty if the whole corpus
+    follows the scheme
+    """
+    codec : LabelCodec
+    tags : np.ndarray
+    seq_lengths : np.ndarray
+    if lengths is not None:
+        if not isinstance(scheme, LabelCodec):
+            msg = "validating tag ids needs the LabelCodec which encoded them"
+            raise ValueError(msg)
+        codec = scheme
+        tags = np.asarray(labels)
+        if tags.dtype.kind not in 'iu':
+            tags = tags.astype(np.int64)
+        seq_lengths = np.asarray(lengths, dtype=np.int64)
+        if seq_lengths.sum() != len(tags):
+            msg = (f"lengths add up to {seq_lengths.sum()}, but there are "
+                    f"{len(tags)} tag ids")
+            raise ValueError(msg)
+    else:
+        seq_lengths = np.fromiter(map(len, labels), dtype=np.int64,
+                count=len(labels))
+        is_ids : bool = any(isinstance(seq, np.ndarray) and seq.dtype.kind in 'iu'
+                for seq in labels)
+        if is_ids:
+            if not isinstance(scheme, LabelCodec):
+                msg = "validating tag ids needs the LabelCodec which encoded them"
+                raise ValueError(msg)
+            codec = scheme
+            tags = (np.concatenate([np.asarray(seq) for seq in labels])
+                if len(labels) else np.zeros(0, dtype=np.int64))
+            if tags.dtype.kind not in 'iu':
+                tags = tags.astype(np.int64)
+        else:
+            strings = cast(Sequence[Sequence[Optional[str]]], labels)
+            codec = (scheme if isinstance(scheme, LabelCodec) else
+                    LabelCodec.from_labels((label for seq in strings
+                        for label in seq), scheme=scheme))
+            tags = _encode_strings(strings, codec)
+    return _violations(tags, seq_lengths, transition_mask(codec))
+
+def _violations(tags : np.ndarray, lengths : np.ndarray,
+        allowed : np.ndarray) -> Violations:
+    n_tags : int = len(allowed)
+    n_tokens : int = len(tags)
+    doc_starts : np.ndarray = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=doc_starts[1:])
+    nonempty : np.ndarray = lengths > 0
+    firsts : np.ndarray = doc_starts[nonempty]
+    lasts : np.ndarray = firsts + lengths[nonempty] - 1
+    # allowed, flattened, with an extra row and column (all True)
+    # standing in for labels not in the scheme, so that the
+    # transitions into and out of them aren't reported as well
+    # as the labels themselves
+    lookup : np.ndarray = np.ones((n_tags + 1, n_tags + 1), dtype=bool)
+    lookup[:n_tags, :n_tags] = allowed
+    lookup = lookup.ravel()
+
+    known : Optional[np.ndarray] = None
+    safe : np.ndarray = tags
+    if n_tokens and (tags.min() < 0 or tags.max() >= n_tags):
+        known = (tags >= 0) & (tags < n_tags)
+        safe = np.where(known, tags, n_tags)
+    # pair index (prev * (n_tags + 1) + tag) of the transition into
+    # each token, from O at the start of each sequence
+    pairs : np.ndarray = np.empty(n_tokens, dtype=np.intp)
+    np.multiply(safe[:-1], n_tags + 1, out=pairs[1:], dtype=np.intp)
+    pairs[firsts] = 0
+    pairs += safe
+    bad : np.ndarray = ~np.take(lookup, pairs)
+    if known is not None:
+        bad |= ~known
+    bad_ixs : np.ndarray = np.flatnonzero(bad)
+    # and out of the last token of each sequence (to O)
+    bad_end : np.ndarray = ~np.take(lookup,
+            safe[lasts].astype(np.intp) * (n_tags + 1))
+    end_ixs : np.ndarray = lasts[bad_end]
+
+    # both lists are in order, so merge them (an end comes after
+    # the last token's own violation, before the next sequence's)
+    order : np.ndarray = np.argsort(np.concatenate([2 * bad_ixs,
+        2 * end_ixs + 1]), kind='stable')
+    token_docs : np.ndarray = (np.searchsorted(doc_starts, bad_ixs,
+        side='right') - 1)
+    # empty sequences share their start with the next, so find
+    # the doc of each end by position among nonempty docs
+    end_docs : np.ndarray = np.flatnonzero(nonempty)[bad_end]
+    docs : np.ndarray = np.concatenate([token_docs, end_docs])
+    positions : np.ndarray = np.concatenate([bad_ixs - doc_starts[token_docs],
+        lengths[end_docs]])
+    reported : np.ndarray = (tags if known is None
+            else np.where(known, tags, NOT_IN_SCHEME))
+    prev_ids : np.ndarray = np.zeros(len(bad_ixs), dtype=np.int64)
+    not_first : np.ndarray = positions[:len(bad_ixs)] > 0
+    prev_ids[not_first] = reported[bad_ixs[not_first] - 1]
+    prev_ids = np.concatenate([prev_ids, reported[end_ixs]])
+    tag_ids : np.ndarray = np.concatenate([reported[bad_ixs],
+        np.zeros(len(end_ixs), dtype=np.int64)])
+    return Violations(docs[order], positions[order], prev_ids[order],
+            tag_ids[order])
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,222 @@
+"""
+constrained Viterbi decoding of per-token tag scores (e.g. the
+log-probabilities from a token classification model) into the
+best sequence of tag ids which is legal in the codec's scheme
+
+Taking the argmax of each token separately can give sequences
+like O, L-PER (which iob_state rejects) or B-PER, I-LOC (which
+it silently splits into fragments).  viterbi_decode instead finds
+the highest scoring sequence using only the transitions allowed by
+transition_mask, for a whole padded batch at once, with NumPy
+operations over the batch and the tags at each position.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from functools import lru_cache
+from typing import (
+        Sequence, Mapping,
+        Union, Optional,
+        List, Dict, Tuple,
+        )
+
+import numpy as np
+
+from .ids2spans import iob2spans_batch
+from .label_codec import LabelCodec
+from .schemes import SCHEMES, SPAN_ROLES
+from .span_table import BatchSpanTable
+
+# number of (position, row, previous tag, tag) scores to compute
+# at a time when finding backpointers
+_CHUNK_CELLS = 1 << 22
+
+
+def _allowed(scheme : str, prev_prefix : str, next_prefix : str,
+        same_class : bool) -> bool:
+    """
+    can a tag with next_prefix follow one with prev_prefix
+    (of the same class, or not) in a strict reading of scheme?
+    """
+    if scheme == "IO":
+        return True
+    if scheme == "IOB1":
+        # B only separates adjacent chunks of the same class
+        return next_prefix != "B" or (prev_prefix in "BI" and same_class)
+    if scheme == "IOB2":
+        return next_prefix != "I" or (prev_prefix in "BI" and same_class)
+    if scheme == "IOE1":
+        # E only separates adjacent chunks of the same class
+        return prev_prefix != "E" or (next_prefix in "IE" and same_class)
+    if scheme == "IOE2":
+        return prev_prefix != "I" or (next_prefix in "IE" and same_class)
+    # IOBES and BILOU: B and I must be followed by I or L (E) of
+    # the same class, and I and L (E) must follow B or I
+    first, inside, last, single = tuple(SPAN_ROLES[scheme])
+    if prev_prefix in (first, inside):
+        return next_prefix in (inside, last) and same_class
+    return next_prefix in ("O", first, single)
+
+@lru_cache(maxsize=32)
+def _transition_mask(scheme : str, n_classes : int) -> np.ndarray:
+    prefixes : str = SCHEMES[scheme]
+    tags : List[Tuple[str, int]] = [("O", -1)] + [(prefix, class_ix)
+            for class_ix in range(n_classes) for prefix in prefixes]
+    mask : np.ndarray = np.array([[_allowed(scheme, prev_prefix,
+        next_prefix, prev_class == next_class)
+        for next_prefix, next_class in tags]
+        for prev_prefix, prev_class in tags], dtype=bool)
+    mask.flags.writeable = False
+    return mask
+
+def transition_mask(codec : LabelCodec) -> np.ndarray:
+    """
+    boolean array of shape (len(codec), len(codec)), True where
+    the tag with the column's id may follow the row's
+
+    The start and end of a sequence are treated as O, so tag id
+    0 (O) also stands for the start (row) and end (column): e.g.
+    in BILOU, row 0 says which tags may start a sequence, and
+    column 0 which may end one.
+    """
+    return _transition_mask(codec.scheme, len(codec.classes))
+
+@lru_cache(maxsize=32)
+def _predecessor_groups(scheme : str,
+        n_classes : int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    the distinct sets of allowed previous tags (columns of the
+    transition mask), as an array of shape (n_groups, group_size)
+    padded with the out-of-range tag id n_tags, and the group of
+    each tag
+    """
+    allowed : np.ndarray = _transition_mask(scheme, n_classes)
+    n_tags : int = len(allowed)
+    groups : Dict[Tuple[int, ...], int] = {}
+    group_of : np.ndarray = np.empty(n_tags, dtype=np.intp)
+    for tag in range(n_tags):
+        previous : Tuple[int, ...] = tuple(np.flatnonzero(
+            allowed[:, tag]).tolist())
+        group_of[tag] = groups.setdefault(previous, len(groups))
+    group_size : int = max(len(previous) for previous in groups)
+    predecessors : np.ndarray = np.full((len(groups), group_size), n_tags,
+            dtype=np.intp)
+    for previous, group in groups.items():
+        predecessors[group, :len(previous)] = previous
+    predecessors.flags.writeable = False
+    group_of.flags.writeable = False
+    return (predecessors, group_of)
+
+def viterbi_decode(log_probs : np.ndarray,
+        codec : LabelCodec,
+        mask : Optional[np.ndarray] = None,
+        pad_id : int = -100) -> np.ndarray:
+    """
+    best legal sequence of tag ids for each row of log_probs,
+    of shape (batch, seq_len, len(codec)), or (seq_len, len(codec))
+    for a single sequence
+
+    mask, if given, of shape (batch, seq_len), marks the positions
+    to decode (e.g. the attention mask, without special tokens).
+    Other positions are skipped (so the constraints apply
+    between the nearest unmasked positions on either side) and
+    get pad_id.
+
+    returns tag ids of shape (batch, seq_len), or (seq_len,)
+
+    Since the constraints are all-or-nothing, tags with the same
+    set of allowed previous tags (e.g. O, B-* and U-* in BILOU) 
+    share the best previous score, so each step only takes the max
+    over those few sets rather than over all pairs of tags.
+    """
+    log_probs = np.asarray(log_probs)
+    if not np.issubdtype(log_probs.dtype, np.floating):
+        log_probs = log_probs.astype(np.float64)
+    single : bool = log_probs.ndim == 2
+    if single:
+        log_probs = log_probs[None]
+        if mask is not None:
+            mask = np.asarray(mask)[None]
+    n_docs, seq_len, n_tags = log_probs.shape
+    if n_tags != len(codec):
+        msg = f"expected scores for {len(codec)} tags, got {n_tags}"
+        raise ValueError(msg)
+    valid : Optional[np.ndarray] = (None if mask is None
+            else np.asarray(mask).astype(bool))
+    predecessors, group_of = _predecessor_groups(codec.scheme,
+            len(codec.classes))
+
+    # scores[t] holds the best score of any path ending in each tag
+    # just before position t (plus a last column, always -inf, for
+    # the padding in predecessors), starting from the virtual O
+    # before the first token (which stays the best path for rows
+    # with nothing to decode).  They are all kept so that the
+    # backpointers can be found for all positions at once after
+    # the forward pass, which then only needs the max at each
+    # position.
+    scores : np.ndarray = np.full((seq_len + 1, n_docs, n_tags + 1),
+            -np.inf, dtype=log_probs.dtype)
+    scores[0, :, 0] = 0.0
+    by_position : np.ndarray = log_probs.transpose(1, 0, 2)
+    for t in range(seq_len):
+        best : np.ndarray = np.take(scores[t], predecessors,
+                axis=1).max(axis=2)
+        np.add(best[:, group_of], by_position[t],
+                out=scores[t + 1, :, :n_tags])
+        if valid is not None:
+            # skipped positions keep the previous score
+            skip : np.ndarray = ~valid[:, t]
+            scores[t + 1, skip] = scores[t, skip]
+    score : np.ndarray = scores[seq_len]
+
+    backpointers : np.ndarray = np.empty((seq_len, n_docs, n_tags),
+            dtype=np.intp)
+    step : int = max(1, _CHUNK_CELLS // max(1, n_docs * predecessors.size))
+    group_ixs : np.ndarray = np.arange(len(predecessors))
+    for t in range(0, seq_len, step):
+        stop : int = min(t + step, seq_len)
+        which : np.ndarray = np.take(scores[t:stop], predecessors,
+                axis=2).argmax(axis=3)
+        backpointers[t:stop] = predecessors[group_ixs, which][..., group_of]
+    if valid is not None:
+        # skipped positions keep the previous tag
+        backpointers[~valid.T] = np.arange(n_tags)
+
+    final : np.ndarray = np.where(transition_mask(codec)[:, 0],
+            score[:, :n_tags], -np.inf)
+    path : np.ndarray = np.empty((n_docs, seq_len), dtype=codec.dtype)
+    current : np.ndarray = final.argmax(axis=1)
+    rows : np.ndarray = np.arange(n_docs)
+    for t in range(seq_len - 1, -1, -1):
+        path[:, t] = current
+        current = backpointers[t, rows, current]
+    if valid is not None:
+        path[~valid] = pad_id
+    return path[0] if single else path
+
+def viterbi_spans(log_probs : np.ndarray,
+        codec : LabelCodec,
+        attention_mask : Optional[np.ndarray] = None,
+        special_tokens_mask : Optional[np.ndarray] = None,
+        offsets : Optional[np.ndarray] = None,
+        ) -> BatchSpanTable:
+    """
+    decode log_probs (of shape (batch, seq_len, len(codec)))
+    with viterbi_decode, skipping padding and special tokens,
+    and return the spans as ids2spans.iob2spans_batch does,
+    scored by the probabilities of the decoded tags
+    """
+    log_probs = np.asarray(log_probs)
+    valid : np.ndarray = np.ones(log_probs.shape[:2], dtype=bool)
+    if attention_mask is not None:
+        valid &= np.asarray(attention_mask).astype(bool)
+    if special_tokens_mask is not None:
+        valid &= ~np.asarray(special_tokens_mask).astype(bool)
+    tag_ids : np.ndarray = viterbi_decode(log_probs, codec, mask=valid)
+    tag_probs : np.ndarray = np.exp(np.take_along_axis(log_probs,
+        np.where(valid, tag_ids, 0)[..., None].astype(np.intp), axis=2)[..., 0])
+    return iob2spans_batch(tag_ids, codec, attention_mask=valid,
+            offsets=offsets, token_scores=tag_probs)
+
+
+# vim: et ai si sts=4
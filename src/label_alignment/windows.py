@@ -0,0 +1,355 @@
+"""
+sliding windows over documents longer than a model's input
+(e.g. 512 tokens): split each document into overlapping windows
+of tokens, label each window, and stitch the per-window
+predictions back together into spans over the whole document
+
+A document of n tokens gets windows starting every stride tokens,
+each max_len tokens long (the last one possibly shorter), just
+enough of them to cover all n tokens.  Where windows overlap, each
+token is owned by the window in which it is furthest from an edge
+(the earlier window on ties), so that merging the predictions of
+all windows takes each token's prediction from exactly one window,
+and the result doesn't depend on the order of the windows.
+
+All the functions work on every window of every document at once,
+with the tokens of all documents numbered one after another (as in
+a flat array of the tag ids, or offsets, of all documents), rather
+than looping over windows in Python.
+
+Copyright (c) 2024-present David C. Fox (talk2dfox@gmail.com)
+"""
+
+from collections import Counter
+from typing import (
+        Sequence, Mapping,
+        Union, Optional,
+        List, Tuple, NamedTuple,
+        )
+
+import numpy as np
+
+from .alignment import Annotations, align_ranges_ids
+from .ids2spans import chunk_token_bounds, span_scores
+from .label_codec import LabelCodec
+from .schemes import SPAN_ROLES
+from .span_table import BatchSpanTable, ScoreColumns
+from .tokenized import TokenizedWithOffsets
+
+_B, _I, _E, _L = (ord(prefix) for prefix in "BIEL")
+
+class Windows(NamedTuple):
+    """
+    windows over a batch of documents, one entry per window
+    (ordered by document, then start):
+
+    docs: index of the document
+    starts, ends: range of tokens [start, end) of the document
+        in the window
+    own_starts, own_ends: range of tokens of the document owned
+        by the window (see merge)
+
+    and one entry per document:
+
+    doc_starts: index of the document's first token among the
+        tokens of all the documents
+    lengths: number of tokens in the document
+    """
+    docs : np.ndarray
+    starts : np.ndarray
+    ends : np.ndarray
+    own_starts : np.ndarray
+    own_ends : np.ndarray
+    doc_starts : np.ndarray
+    lengths : np.ndarray
+
+    @property
+    def width(self) -> int:
+        """
+        number of tokens in the longest window
+        """
+        return int((self.ends - self.starts).max(initial=0))
+
+    def token_index(self) -> np.ndarray:
+        """
+        index of each token of each window among the tokens of
+        all the documents, of shape (n_windows, width), with -1
+        past the end of shorter windows
+        """
+        columns : np.ndarray = np.arange(self.width)
+        index : np.ndarray = ((self.doc_starts[self.docs]
+            + self.starts)[:, None] + columns)
+        index[columns >= (self.ends - self.starts)[:, None]] = -1
+        return index
+
+    def gather(self, values : np.ndarray, pad : int = 0) -> np.ndarray:
+        """
+        per-token values (e.g. token ids or offsets) for all the
+        documents, of shape (n_tokens, ...), as a padded array of
+        shape (n_windows, width, ...) with pad past the end of
+        shorter windows
+        """
+        values = np.asarray(values)
+        index : np.ndarray = self.token_index()
+        gathered : np.ndarray = values[np.maximum(index, 0)]
+        gathered[index < 0] = pad
+        return gathered
+
+    def owned(self) -> np.ndarray:
+        """
+        boolean array of shape (n_windows, width), True for
+        the tokens which each window owns
+        """
+        columns : np.ndarray = np.arange(self.width)
+        return ((columns >= (self.own_starts - self.starts)[:, None])
+                & (columns < (self.own_ends - self.starts)[:, None]))
+
+    def merge(self, window_values : np.ndarray) -> np.ndarray:
+        """
+        inverse of gather: per-window values (e.g. predicted tag
+        ids, scores or log-probabilities) of shape (n_windows,
+        at least width, ...), merged into one value per token of
+        all the documents, taken from the window owning the token
+        """
+        window_values = np.asarray(window_values)[:, :self.width]
+        owned : np.ndarray = self.owned()
+        merged : np.ndarray = np.empty(
+                (int(self.lengths.sum()),) + window_values.shape[2:],
+                dtype=window_values.dtype)
+        merged[self.token_index()[owned]] = window_values[owned]
+        return merged
+
+
+def plan_windows(lengths : Union[Sequence[int], np.ndarray],
+        max_len : int,
+        stride : int) -> Windows:
+    """
+    windows of at most max_len tokens, starting every stride tokens,
+    over documents with the given numbers of tokens (empty documents
+    get no windows)
+
+    stride must be between 1 and max_len, and consecutive windows
+    overlap by max_len - stride tokens.  To leave room for special
+    tokens (e.g. [CLS] and [SEP]), make max_len that much smaller
+    than the model's limit.
+
+    Labels for windows which overlap by less than 2 tokens can't be
+    stitched back exactly by windows2spans: the tokens which
+    window_tag_ids retags at the edges of the windows are then among
+    those owned by them, so chunks crossing an edge may come back
+    split (or, in BILOU and IOBES, raise UnexpectedLabel unless
+    repaired).
+    """
+    if not 0 < stride <= max_len:
+        msg = f"stride must be between 1 and max_len ({max_len}), got {stride}"
+        raise ValueError(msg)
+    doc_lengths : np.ndarray = np.asarray(lengths, dtype=np.int64)
+    n_windows : np.ndarray = np.where(doc_lengths > max_len,
+            -(-(doc_lengths - max_len) // stride) + 1,
+            (doc_lengths > 0).astype(np.int64))
+    docs : np.ndarray = np.repeat(np.arange(len(doc_lengths)), n_windows)
+    first_windows : np.ndarray = np.cumsum(n_windows) - n_windows
+    starts : np.ndarray = (np.arange(len(docs)) - first_windows[docs]) * stride
+    ends : np.ndarray = np.minimum(starts + max_len, doc_lengths[docs])
+    # the boundary between windows of the same document is
+    # the midpoint of their overlap
+    same_doc : np.ndarray = docs[1:] == docs[:-1]
+    boundaries : np.ndarray = (ends[:-1] - 1 + starts[1:]) // 2 + 1
+    own_starts : np.ndarray = np.zeros(len(docs), dtype=np.int64)
+    own_starts[1:] = np.where(same_doc, boundaries, 0)
+    own_ends : np.ndarray = ends.copy()
+    own_ends[:-1] = np.where(same_doc, boundaries, ends[:-1])
+    doc_starts : np.ndarray = np.cumsum(doc_lengths) - doc_lengths
+    return Windows(docs, starts, ends, own_starts, own_ends, doc_starts,
+            doc_lengths)
+
+def _doc_breaks(windows : Windows) -> np.ndarray:
+    """
+    boolean array marking the first token of each document
+    among the tokens of all documents
+    """
+    breaks : np.ndarray = np.zeros(int(windows.lengths.sum()) + 1, dtype=bool)
+    breaks[windows.doc_starts] = True
+    return breaks[:-1]
+
+def _continues(tag_ids : np.ndarray, codec : LabelCodec,
+        token_ixs : np.ndarray) -> np.ndarray:
+    """
+    for each of token_ixs (none of which may be the first token
+    of a document), does the token continue a chunk from the
+    token before it (I, E or L after an open chunk of the same
+    class)?
+    """
+    prefixes : np.ndarray = codec.tag_prefixes[tag_ids[token_ixs]]
+    prev_prefixes : np.ndarray = codec.tag_prefixes[tag_ids[token_ixs - 1]]
+    # in IOE1 and IOE2, E closes the chunk, and B isn't used
+    open_prefixes : Tuple[int, ...] = ((_I,) if codec.scheme.startswith("IOE")
+            else (_B, _I))
+    return (np.isin(prefixes, (_I, _E, _L))
+            & np.isin(prev_prefixes, open_prefixes)
+            & (codec.tag_classes[tag_ids[token_ixs]]
+                == codec.tag_classes[tag_ids[token_ixs - 1]]))
+
+def window_tag_ids(tag_ids : np.ndarray,
+        windows : Windows,
+        codec : LabelCodec,
+        pad_id : int = -100) -> np.ndarray:
+    """
+    tag ids from codec for the tokens of all the documents, one
+    after another, as labels for each window, of shape (n_windows,
+    width), with pad_id past the end of shorter windows
+
+    Chunks cut by the edge of a window are clipped to the window
+    and tagged again (e.g. in BILOU, a chunk running past the end
+    of the window ends with L at its last token), so that the
+    labels of each window are valid on their own.  Only the first
+    and last token of a window can change, so the tags are copied
+    into the windows and just those tokens are fixed.
+    """
+    tag_ids = np.asarray(tag_ids)
+    if len(tag_ids) != windows.lengths.sum():
+        msg = (f"got {len(tag_ids)} tag ids for {windows.lengths.sum()} "
+                "tokens")
+        raise ValueError(msg)
+    labels : np.ndarray = windows.gather(tag_ids.astype(codec.dtype),
+            pad=pad_id)
+    if not len(labels) or codec.scheme == "IO":
+        return labels
+    rows : np.ndarray = np.arange(len(labels))
+    n_tokens : np.ndarray = windows.ends - windows.starts
+    doc_starts : np.ndarray = windows.doc_starts[windows.docs]
+    firsts : np.ndarray = doc_starts + windows.starts
+    lasts : np.ndarray = doc_starts + windows.ends - 1
+    # chunks cut by the start and end of each window
+    cut_before : np.ndarray = windows.starts > 0
+    cut_before[cut_before] = _continues(tag_ids, codec, firsts[cut_before])
+    cut_after : np.ndarray = windows.ends < windows.lengths[windows.docs]
+    cut_after[cut_after] = _continues(tag_ids, codec, lasts[cut_after] + 1)
+
+    n_prefixes : int = len(codec.prefixes)
+    def retag(token_ixs : np.ndarray, prefix : str) -> np.ndarray:
+        return (1 + codec.tag_classes[tag_ids[token_ixs]] * n_prefixes
+                + codec.prefixes.index(prefix))
+
+    roles : Optional[str] = SPAN_ROLES.get(codec.scheme)
+    if roles is None:
+        # IOB1 (IOE1): a B (E) marks a chunk next to one of the
+        # same class, which is cut off at the start (end) of the window
+        prefix : str = "B" if codec.scheme == "IOB1" else "E"
+        edges : np.ndarray
+        columns : np.ndarray
+        fix : np.ndarray
+        if prefix == "B":
+            edges, columns = firsts, np.zeros(len(rows), dtype=np.int64)
+            fix = windows.starts > 0
+        else:
+            edges, columns = lasts, n_tokens - 1
+            fix = windows.ends < windows.lengths[windows.docs]
+        fix &= codec.tag_prefixes[tag_ids[edges]] == ord(prefix)
+        labels[rows[fix], columns[fix]] = retag(edges[fix], "I")
+        return labels
+    first, inside, last, single = tuple(roles)
+    # the chunk cut at the start of the window now starts there,
+    # and is a single token unless the next token continues it
+    multi : np.ndarray = np.zeros(len(rows), dtype=bool)
+    multi[n_tokens > 1] = _continues(tag_ids, codec,
+            firsts[n_tokens > 1] + 1)
+    fix = cut_before & multi
+    labels[rows[fix], 0] = retag(firsts[fix], first)
+    fix = cut_before & ~multi
+    labels[rows[fix], 0] = retag(firsts[fix], single)
+    # the chunk cut at the end of the window now ends there, and
+    # is a single token unless the last token continues it
+    multi[:] = False
+    multi[n_tokens > 1] = _continues(tag_ids, codec, lasts[n_tokens > 1])
+    fix = cut_after & multi
+    labels[rows[fix], n_tokens[fix] - 1] = retag(lasts[fix], last)
+    fix = cut_after & ~multi
+    labels[rows[fix], n_tokens[fix] - 1] = retag(lasts[fix], single)
+    return labels
+
+def align_windows(tokenized_batch : Sequence[TokenizedWithOffsets],
+        annotations_batch : Sequence[Annotations],
+        codec : LabelCodec,
+        max_len : int,
+        stride : int,
+        pad_id : int = -100) -> Tuple[Windows, np.ndarray]:
+    """
+    align a batch of documents with their annotations (as
+    alignment.align_ranges_ids does, so codec.scheme must be one
+    of those in schemes.SPAN_ROLES), and split them into windows
+    (see plan_windows), returning the windows and the tag ids for
+    each (see window_tag_ids)
+
+    The inputs for each window can then be found with
+    Windows.gather, e.g. from the concatenated tokenizers.Encoding.ids
+    of all the documents.
+    """
+    if len(tokenized_batch) != len(annotations_batch):
+        msg = (f"got {len(tokenized_batch)} tokenized documents but "
+                f"{len(annotations_batch)} lists of annotations")
+        raise ValueError(msg)
+    lengths : List[int] = [len(tokenized.tokens)
+            for tokenized in tokenized_batch]
+    windows : Windows = plan_windows(lengths, max_len, stride)
+    tag_ids : np.ndarray = np.zeros(sum(lengths), dtype=codec.dtype)
+    for tokenized, annotations, start, n_tokens in zip(tokenized_batch,
+            annotations_batch, windows.doc_starts.tolist(), lengths):
+        if annotations:
+            align_ranges_ids(tokenized, annotations, codec,
+                    out=tag_ids[start:start + n_tokens])
+    return (windows, window_tag_ids(tag_ids, windows, codec, pad_id=pad_id))
+
+def windows2spans(tag_ids : np.ndarray,
+        windows : Windows,
+        codec : LabelCodec,
+        offsets : Optional[np.ndarray] = None,
+        token_scores : Optional[np.ndarray] = None,
+        repair : Optional[str] = None,
+        repairs : Optional[Counter] = None,
+        ) -> BatchSpanTable:
+    """
+    decode predicted tag ids for each window, of shape
+    (n_windows, at least windows.width), into the spans of each
+    whole document, merging the windows with Windows.merge
+
+    (if the model's inputs had special tokens, drop their columns
+    first, e.g. tag_ids[:, 1:] for a leading [CLS])
+
+    If offsets, the (start, end) character offsets of the tokens of
+    all the documents, one after another, of shape (n_tokens, 2),
+    are given, the spans are in character offsets into each
+    document.  Otherwise, they are in token positions.
+
+    token_scores, of the same shape as tag_ids, repair and
+    repairs are as for ids2spans.iob2spans_batch.  Spans crossing
+    the edges of windows come out whole, and since the windows
+    disagree only where they are merged, any disagreement there
+    can be repaired.  This needs windows overlapping by at least 2
+    tokens (max_len - stride >= 2, see plan_windows).
+    """
+    merged : np.ndarray = windows.merge(tag_ids)
+    first_tokens, last_tokens, classes = chunk_token_bounds(merged, codec,
+            breaks=_doc_breaks(windows), repair=repair, repairs=repairs)
+    # (empty documents share their start with the next, so
+    # side='right' skips them)
+    docs : np.ndarray = np.searchsorted(windows.doc_starts, first_tokens,
+            side='right') - 1
+    starts : np.ndarray
+    ends : np.ndarray
+    if offsets is not None:
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        starts = offsets[first_tokens, 0]
+        ends = offsets[last_tokens, 1]
+    else:
+        starts = first_tokens - windows.doc_starts[docs]
+        ends = last_tokens - windows.doc_starts[docs] + 1
+    scores : Optional[ScoreColumns] = None
+    if token_scores is not None:
+        scores = span_scores(windows.merge(token_scores), first_tokens,
+                last_tokens)
+    return BatchSpanTable(docs, starts, ends, classes, codec.classes,
+            scores=scores)
+
+
+# vim: et ai si sts=4
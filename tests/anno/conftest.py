@@ -81,6 +81,22 @@ def ws_tok():
 def wss_tok():
     return wss_tokenizer()
 
+@pytest.fixture
+def wordlevel_tok():
+    """
+    small in-memory tokenizers.Tokenizer which adds [CLS] and [SEP],
+    for tests which need real tokenizers.Encoding output
+    """
+    from tokenizers import Tokenizer, models, processors
+    import tokenizers.pre_tokenizers as pre_tokenizers
+    vocab = {'[UNK]': 0, '[CLS]': 1, '[SEP]': 2, 'the': 3, 'of': 4}
+    tok = Tokenizer(models.WordLevel(vocab, unk_token='[UNK]'))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.post_processor = processors.TemplateProcessing(
+            single='[CLS] $A [SEP]',
+            special_tokens=[('[CLS]', 1), ('[SEP]', 2)])
+    return tok
+
 def tokenize(src, tokenizer):
     """
     standardize reading from XML-annotated text
@@ -95,4 +111,27 @@ def tokenize(src, tokenizer):
 def wss_tok_verne_ch5(verne_ch5_excerpt, wss_tok):
     text, nized, annos = tokenize(verne_ch5_excerpt, wss_tok)
     return text, nized, annos
+
+@pytest.fixture
+def ws_tok_verne_ch5(verne_ch5_excerpt, ws_tok):
+    text, nized, annos = tokenize(verne_ch5_excerpt, ws_tok)
+    return text, nized, annos
+
+@pytest.fixture
+def verne_ch5_paragraphs(verne_ch5_excerpt):
+    """
+    Verne excerpt split into paragraphs, each with the 
+    annotations falling within it (offsets relative to the paragraph)
+    """
+    text, annos = span_parsed(verne_ch5_excerpt)
+    paragraphs = []
+    start = 0
+    for paragraph in text.split('\n'):
+        end = start + len(paragraph)
+        inside = [SpanAnnotation(start=anno.start - start,
+            end=anno.end - start, label=anno.label) for anno in annos
+            if anno.start >= start and anno.end <= end]
+        paragraphs.append((paragraph, inside))
+        start = end + 1
+    return paragraphs
 # vim: et ai si sts=4   
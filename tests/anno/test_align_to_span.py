@@ -71,6 +71,63 @@ def test_alignment_with_wss_verne(wss_tok_verne_ch5) -> None:
     print(span_annos[:5])
     assert(respanned == nspans)
 
+def test_table_engine_with_wss_verne(wss_tok_verne_ch5) -> None:
+    text, wss_tokenized, span_annos = wss_tok_verne_ch5
+    aligned = get_aligned(text, wss_tokenized, span_annos)
+    nspans = list(tok2spans.iob2spans(wss_tokenized.tokens, aligned))
+    tspans = list(tok2spans.iob2spans(wss_tokenized.tokens, aligned,
+        engine='table'))
+    assert(tspans == nspans)
+
+@pytest.mark.parametrize('engine', ['state', 'table'])
+def test_offsets_with_wss_verne(wss_tok_verne_ch5, engine) -> None:
+    text, wss_tokenized, span_annos = wss_tok_verne_ch5
+    aligned = get_aligned(text, wss_tokenized, span_annos)
+    ospans = list(tok2spans.tokenized2spans(wss_tokenized, aligned,
+        engine=engine))
+    assert(ospans == expand_to_spaces(text, span_annos))
+
+@pytest.mark.parametrize('engine', ['state', 'table'])
+def test_offsets_with_ws_verne(ws_tok_verne_ch5, engine) -> None:
+    # Whitespace splits off punctuation, so the spans in the
+    # space-joined tokens don't match the original text
+    text, ws_tokenized, span_annos = ws_tok_verne_ch5
+    aligned = get_aligned(text, ws_tokenized, span_annos)
+    ospans = list(tok2spans.tokenized2spans(ws_tokenized, aligned,
+        engine=engine))
+    assert(len(ospans) == len(span_annos))
+    for ospan, anno in zip(ospans, span_annos):
+        assert(ospan.label == anno.label)
+        assert(ospan.start <= anno.start and anno.end <= ospan.end)
+        assert(text[ospan.start:ospan.end].strip() == text[ospan.start:ospan.end])
+    table = tok2spans.iob2table(ws_tokenized.tokens, aligned,
+            offsets=ws_tokenized.offset_array)
+    assert(table.to_annotations() == ospans)
+
+def test_offsets_with_encodings(verne_ch5_paragraphs, wordlevel_tok) -> None:
+    texts = [text for text, annos in verne_ch5_paragraphs]
+    encodings = wordlevel_tok.encode_batch(texts)
+    for text, encoding, (_, annos) in zip(texts, encodings,
+            verne_ch5_paragraphs):
+        aligned = get_aligned(text, encoding, annos)
+        ospans = list(tok2spans.tokenized2spans(encoding, aligned))
+        assert(len(ospans) == len(annos))
+        for ospan, anno in zip(ospans, annos):
+            assert(ospan.label == anno.label)
+            assert(ospan.start <= anno.start and anno.end <= ospan.end)
+
+def test_offsets_explicit() -> None:
+    text = "New  York,\tis big"
+    tokens = ["New", "York", ",", "is", "big"]
+    offsets = [(0, 3), (5, 9), (9, 10), (11, 13), (14, 17)]
+    labels = ["B-LOC", "L-LOC", "O", "O", "U-ADJ"]
+    expected = [SpanAnnotation(start=0, end=9, label="LOC"),
+            SpanAnnotation(start=14, end=17, label="ADJ")]
+    for engine in ('state', 'table'):
+        assert(list(tok2spans.iob2spans(tokens, labels, engine=engine,
+            offsets=offsets)) == expected)
+    assert([text[s.start:s.end] for s in expected] == ["New  York", "big"])
+
 
 
 
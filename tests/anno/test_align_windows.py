@@ -0,0 +1,44 @@
+"""
+tests of windows.align_windows on the Verne excerpt
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+import numpy as np
+
+from label_alignment import alignment
+from label_alignment.ids2spans import ids2table
+from label_alignment.label_codec import LabelCodec
+from label_alignment.windows import align_windows, windows2spans
+
+
+@pytest.mark.parametrize('max_len, stride', [(16, 12), (32, 32)])
+def test_align_windows(verne_ch5_paragraphs, wss_tok,
+        max_len : int, stride : int) -> None:
+    tokenized = [wss_tok.tokenize(text) for text, annos
+            in verne_ch5_paragraphs]
+    annotations = [[anno.to_labeled_span() for anno in annos]
+            for text, annos in verne_ch5_paragraphs]
+    codec = LabelCodec(sorted({anno['label'] for annos in annotations
+        for anno in annos}))
+    windows, labels = align_windows(tokenized, annotations, codec,
+            max_len, stride)
+    assert(labels.shape[1] <= max_len)
+    offsets = np.concatenate([t.offset_array for t in tokenized])
+    table = windows2spans(labels, windows, codec, offsets=offsets)
+    for doc, (t, annos) in enumerate(zip(tokenized, annotations)):
+        expected = ids2table(alignment.align_ranges_ids(t, annos, codec),
+                codec, offsets=t.offset_array)
+        assert(table.document(doc) == expected)
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,191 @@
+"""
+tests of alternative alignment engines against
+alignment.align_tokens_and_annotations_bilou
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import random
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+import numpy as np
+
+from label_alignment import alignment
+from label_alignment.label_codec import LabelCodec
+from label_alignment.span_table import SpanTable
+from label_alignment.types import LabeledSpan
+from label_alignment.validate import validate
+
+
+def random_spans(text_len : int, n : int,
+        max_len : int = 200, seed : int = 17) -> List[LabeledSpan]:
+    """
+    random (possibly overlapping) spans, starting and ending
+    anywhere, including inside tokens and on whitespace
+    """
+    rng = random.Random(seed)
+    spans : List[LabeledSpan] = []
+    for i in range(n):
+        start = rng.randrange(text_len)
+        end = min(text_len, start + rng.randint(1, max_len))
+        spans.append(LabeledSpan(start=start, end=end,
+            label=rng.choice(['PER', 'LOC', 'DATE'])))
+    return spans
+
+def test_ranges_match_chars_verne(wss_tok_verne_ch5) -> None:
+    text, wss_tokenized, span_annos = wss_tok_verne_ch5
+    annos = [span_anno.to_labeled_span() for span_anno in span_annos]
+    expected = alignment.align_tokens_and_annotations_bilou(
+            wss_tokenized, annos)
+    assert(alignment.align_ranges_bilou(wss_tokenized, annos) == expected)
+
+@pytest.mark.parametrize('tok_fixture', ['ws_tok', 'wss_tok'])
+def test_ranges_match_chars_random(wss_tok_verne_ch5, tok_fixture,
+        request) -> None:
+    text = wss_tok_verne_ch5[0]
+    tokenized = request.getfixturevalue(tok_fixture).tokenize(text)
+    annos = random_spans(len(text), 300)
+    expected = alignment.align_tokens_and_annotations_bilou(
+            tokenized, annos)
+    assert(alignment.align_ranges_bilou(tokenized, annos) == expected)
+
+def test_ranges_whitespace_only(wss_tok) -> None:
+    tokenized = wss_tok.tokenize('one  two')
+    annos = [LabeledSpan(start=3, end=5, label='GAP')]
+    assert(alignment.align_ranges_bilou(tokenized, annos) == ['O', 'O'])
+
+def test_ranges_zero_length(wss_tok) -> None:
+    # (random_spans never builds these)
+    tokenized = wss_tok.tokenize('\t Land, met')
+    annos = [LabeledSpan(start=5, end=5, label='PER'),
+            LabeledSpan(start=6, end=4, label='LOC')]
+    expected = alignment.align_tokens_and_annotations_bilou(tokenized, annos)
+    assert(expected == ['O', 'O'])
+    assert(alignment.align_ranges_bilou(tokenized, annos) == expected)
+    table = SpanTable.from_annotations(annos)
+    assert(alignment.align_ranges_bilou(tokenized, table) == expected)
+    assert(alignment.align_batch([tokenized], [annos]) == [expected])
+    codec = LabelCodec(['PER', 'LOC'])
+    for spans in (annos, table):
+        assert(not alignment.align_ranges_ids(tokenized, spans, codec).any())
+    assert(not alignment.align_batch_ids([tokenized], [table], codec).any())
+    boundaries = alignment.TokenBoundaries.from_tokenized(tokenized)
+    assert(boundaries.token_indices(5, 5) == [])
+
+def test_token_boundaries_skip_empty() -> None:
+    offsets = [(0, 0), (0, 3), (4, 7), (0, 0)]
+    boundaries = alignment.TokenBoundaries(offsets)
+    assert(boundaries.token_indices(0, 7) == [1, 2])
+    assert(boundaries.token_indices(3, 4) == [])
+    assert(boundaries.token_indices(2, 5) == [1, 2])
+    boundaries = alignment.TokenBoundaries(offsets,
+            sequence_ids=[None, 0, 1, None])
+    assert(boundaries.token_indices(0, 7) == [1])
+
+def test_align_batch_simple_tokenizer(verne_ch5_paragraphs, wss_tok) -> None:
+    tokenized = [wss_tok.tokenize(text) for text, annos
+            in verne_ch5_paragraphs]
+    annotations = [[anno.to_labeled_span() for anno in annos]
+            for text, annos in verne_ch5_paragraphs]
+    expected = [alignment.align_tokens_and_annotations_bilou(t, a)
+            for t, a in zip(tokenized, annotations)]
+    assert(alignment.align_batch(tokenized, annotations) == expected)
+
+def test_align_batch_encodings(verne_ch5_paragraphs, wordlevel_tok) -> None:
+    encodings = wordlevel_tok.encode_batch(
+            [text for text, annos in verne_ch5_paragraphs])
+    annotations = [[anno.to_labeled_span() for anno in annos]
+            for text, annos in verne_ch5_paragraphs]
+    expected = [alignment.align_tokens_and_annotations_bilou(e, a)
+            for e, a in zip(encodings, annotations)]
+    aligned = alignment.align_batch(encodings, annotations)
+    assert(aligned == expected)
+    for labels in aligned:
+        # [CLS] and [SEP] are never labeled
+        assert(labels[0] == 'O' and labels[-1] == 'O')
+
+def test_align_batch_length_mismatch(wss_tok) -> None:
+    with pytest.raises(ValueError):
+        alignment.align_batch([wss_tok.tokenize('a b')], [])
+
+def test_align_ids_match_strings(wss_tok_verne_ch5) -> None:
+    text, wss_tokenized, span_annos = wss_tok_verne_ch5
+    annos = random_spans(len(text), 300)
+    codec = LabelCodec(['PER', 'LOC', 'DATE'])
+    expected = alignment.align_tokens_and_annotations_bilou(
+            wss_tokenized, annos)
+    ids = alignment.align_ranges_ids(wss_tokenized, annos, codec)
+    assert(ids.dtype == codec.dtype)
+    assert(codec.decode_many(ids) == expected)
+    out = np.full(len(ids) + 5, 7, dtype=np.int64)
+    assert(alignment.align_ranges_ids(wss_tokenized, annos, codec,
+        out=out) is out)
+    assert(list(out[:len(ids)]) == list(ids))
+    assert(list(out[len(ids):]) == [7] * 5)
+
+def test_align_ids_other_scheme(wss_tok) -> None:
+    tokenized = wss_tok.tokenize('Ned Land met Commander Farragut today')
+    annos = [LabeledSpan(start=0, end=8, label='PER'),
+            LabeledSpan(start=13, end=31, label='PER')]
+    codec = LabelCodec(['PER'], scheme='IOB2')
+    ids = alignment.align_ranges_ids(tokenized, annos, codec)
+    assert(codec.decode_many(ids) == 
+            ['B-PER', 'I-PER', 'O', 'B-PER', 'I-PER', 'O'])
+
+def test_align_batch_ids(verne_ch5_paragraphs, wordlevel_tok) -> None:
+    encodings = wordlevel_tok.encode_batch(
+            [text for text, annos in verne_ch5_paragraphs])
+    annotations = [[anno.to_labeled_span() for anno in annos]
+            for text, annos in verne_ch5_paragraphs]
+    codec = LabelCodec.from_labels(f'U-{anno["label"]}' 
+            for annos in annotations for anno in annos)
+    expected = alignment.align_batch(encodings, annotations)
+    ids = alignment.align_batch_ids(encodings, annotations, codec)
+    assert(ids.shape == (len(encodings), max(len(e) for e in encodings)))
+    for row, labels in zip(ids, expected):
+        assert(codec.decode_many(row[:len(labels)]) == labels)
+        assert((row[len(labels):] == -100).all())
+
+def test_align_span_table(wss_tok_verne_ch5) -> None:
+    text, wss_tokenized, span_annos = wss_tok_verne_ch5
+    annos = random_spans(len(text), 300)
+    table = SpanTable.from_annotations(annos)
+    expected = alignment.align_tokens_and_annotations_bilou(
+            wss_tokenized, annos)
+    assert(alignment.align_tokens_and_annotations_bilou(
+        wss_tokenized, table) == expected)
+    assert(alignment.align_ranges_bilou(wss_tokenized, table) == expected)
+    assert(alignment.align_batch([wss_tokenized], [table]) == [expected])
+    codec = LabelCodec(['PER', 'LOC', 'DATE'])
+    ids = alignment.align_ranges_ids(wss_tokenized, table, codec)
+    assert(codec.decode_many(ids) == expected)
+    empty = table[:0]
+    assert(alignment.align_ranges_bilou(wss_tokenized, empty) 
+            == ['O'] * len(expected))
+
+@pytest.mark.parametrize('scheme', ['IOB2', 'IOE2', 'IOBES'])
+def test_align_scheme(wss_tok_verne_ch5, scheme : str) -> None:
+    text, wss_tokenized, span_annos = wss_tok_verne_ch5
+    annos = [span_anno.to_labeled_span() for span_anno in span_annos]
+    codec = LabelCodec(sorted({anno['label'] for anno in annos}),
+            scheme=scheme)
+    expected = codec.decode_many(alignment.align_ranges_ids(wss_tokenized,
+        annos, codec))
+    assert(alignment.align_tokens_and_annotations_bilou(wss_tokenized,
+        annos, scheme=scheme) == expected)
+    # overlapping annotations still give labels valid in the scheme
+    overlapping = random_spans(len(text), 300)
+    labels = alignment.align_tokens_and_annotations_bilou(wss_tokenized,
+        overlapping, scheme=scheme)
+    assert(len(validate([labels], scheme=scheme).docs) == 0)
+
+
+# vim: et ai si sts=4
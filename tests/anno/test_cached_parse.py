@@ -0,0 +1,77 @@
+"""
+test the cached parsing and alignment of disk_cache.py on the
+Verne excerpt
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import shutil
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment import alignment
+from label_alignment.cache import tokenizer_fingerprint
+from label_alignment.disk_cache import (DiskCache, cached_span_parsed,
+        cached_align)
+from label_alignment.sax2spans import span_parsed
+
+
+def test_cached_span_parsed(verne_ch5_excerpt, tmp_path) -> None:
+    text, annos = span_parsed(verne_ch5_excerpt)
+    with DiskCache(tmp_path / 'cache') as cache:
+        assert(cached_span_parsed(verne_ch5_excerpt, cache) == (text, annos))
+        assert(cache.misses == 1)
+    with DiskCache(tmp_path / 'cache') as cache:
+        cached_text, table = cached_span_parsed(verne_ch5_excerpt, cache,
+                table=True)
+        assert((cache.hits, cache.misses) == (1, 0))
+        assert(cached_text == text and table.to_annotations() == annos)
+
+def test_cached_align(verne_ch5_excerpt, wss_tok, ws_tok, tmp_path,
+        monkeypatch) -> None:
+    text, annos = span_parsed(verne_ch5_excerpt)
+    expected = alignment.align_tokens_and_annotations_bilou(
+            wss_tok.tokenize(text), [anno.to_labeled_span() for anno in annos])
+    fingerprint = tokenizer_fingerprint(wss_tok)
+    with DiskCache(tmp_path / 'cache') as cache:
+        assert(cached_align(verne_ch5_excerpt, wss_tok.tokenize, fingerprint,
+            cache) == expected)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed or aligned again")
+
+    # an unchanged file (even under another name) is neither parsed nor
+    # aligned again
+    copy = tmp_path / 'copy.xml'
+    shutil.copy(verne_ch5_excerpt, copy)
+    with monkeypatch.context() as patch:
+        patch.setattr('label_alignment.disk_cache.expat_parsed', fail)
+        patch.setattr('label_alignment.disk_cache.'
+                'align_tokens_and_annotations_bilou', fail)
+        with DiskCache(tmp_path / 'cache') as cache:
+            assert(cached_align(copy, fail, fingerprint, cache) == expected)
+
+    # but another tokenizer, scheme or content is a miss
+    with DiskCache(tmp_path / 'cache') as cache:
+        ws_labels = cached_align(copy, ws_tok.tokenize,
+                tokenizer_fingerprint(ws_tok), cache)
+        assert(len(ws_labels) == len(ws_tok.tokenize(text).tokens))
+        iob2 = cached_align(copy, wss_tok.tokenize, fingerprint, cache,
+                scheme='IOB2')
+        assert('L-PER' not in iob2 and len(iob2) == len(expected))
+        # (the parse itself was cached)
+        assert((cache.hits, cache.misses) == (2, 2))
+        copy.write_text(copy.read_text(encoding='utf-8') + '\n',
+                encoding='utf-8')
+        cached_align(copy, wss_tok.tokenize, fingerprint, cache)
+        assert(cache.misses == 4)
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,118 @@
+"""
+test the corpus pipeline on copies of the Verne excerpt
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import json
+import os
+import shutil
+
+from pathlib import Path
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment import alignment
+from label_alignment.pipeline import (
+        run_pipeline, main, shard_name, load_tokenizer,
+        )
+from label_alignment.sax2spans import span_parsed
+
+
+@pytest.fixture
+def verne_corpus(verne_ch5_excerpt, tmp_path) -> Path:
+    corpus = tmp_path / 'corpus'
+    (corpus / 'sub').mkdir(parents=True)
+    for i in range(5):
+        shutil.copy(verne_ch5_excerpt, corpus / f'verne{i}.xml')
+    shutil.copy(verne_ch5_excerpt, corpus / 'sub' / 'verne5.xml')
+    (corpus / 'notes.txt').write_text('not XML')
+    return corpus
+
+def read_shards(out : Path) -> List[Dict]:
+    records : List[Dict] = []
+    for shard in sorted(out.glob('shard-*.jsonl')):
+        with open(shard, encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+def test_pipeline(verne_corpus, verne_ch5_excerpt, wss_tok, tmp_path) -> None:
+    out = tmp_path / 'out'
+    reports = []
+    results = run_pipeline(verne_corpus, out, tokenizer='whitespace_split',
+            files_per_shard=2, max_workers=2, max_pending=1,
+            progress=lambda *args: reports.append(args))
+    assert([result.shard for result in results] == [0, 1, 2])
+    assert(sum(result.documents for result in results) == 6)
+    assert(reports[0] == (0, 3, 0) and reports[-1] == (3, 3, 0))
+
+    text, annos = span_parsed(verne_ch5_excerpt)
+    tokenized = wss_tok.tokenize(text)
+    expected = alignment.align_tokens_and_annotations_bilou(tokenized,
+            [anno.to_labeled_span() for anno in annos])
+    records = read_shards(out)
+    assert([record['file'] for record in records] == 
+            ['sub/verne5.xml'] + [f'verne{i}.xml' for i in range(5)])
+    for record in records:
+        assert(record['labels'] == expected)
+        assert(record['tokens'] == list(tokenized.tokens))
+
+def test_pipeline_resume(verne_corpus, tmp_path) -> None:
+    out = tmp_path / 'out'
+    run_pipeline(verne_corpus, out, files_per_shard=2, max_workers=1)
+    before = read_shards(out)
+    (out / shard_name(1)).unlink()
+    reports = []
+    results = run_pipeline(verne_corpus, out, files_per_shard=2,
+            max_workers=1, progress=lambda *args: reports.append(args))
+    assert([result.shard for result in results] == [1])
+    assert(reports[0] == (2, 3, 2))
+    assert(read_shards(out) == before)
+    # same output directory, different settings
+    with pytest.raises(ValueError):
+        run_pipeline(verne_corpus, out, files_per_shard=3)
+
+def test_pipeline_resume_changed_files(verne_corpus, tmp_path) -> None:
+    out = tmp_path / 'out'
+    run_pipeline(verne_corpus, out, files_per_shard=2, max_workers=1)
+    # sorted: sub/verne5, verne0 | verne1, verne2 | verne3, verne4
+    shutil.copy(verne_corpus / 'verne0.xml', verne_corpus / 'verne6.xml')
+    stat = os.stat(verne_corpus / 'verne1.xml')
+    os.utime(verne_corpus / 'verne1.xml',
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    results = run_pipeline(verne_corpus, out, files_per_shard=2,
+            max_workers=1)
+    assert([result.shard for result in results] == [1, 3])
+    assert([record['file'] for record in read_shards(out)][-1]
+            == 'verne6.xml')
+    # removing the file leaves shard 3 with no files
+    (verne_corpus / 'verne6.xml').unlink()
+    assert(run_pipeline(verne_corpus, out, files_per_shard=2,
+        max_workers=1) == [])
+    assert(not (out / shard_name(3)).exists())
+    assert(len(read_shards(out)) == 6)
+
+def test_pipeline_main(verne_corpus, tmp_path, capsys) -> None:
+    out = tmp_path / 'cli'
+    main([str(verne_corpus), str(out), '--tokenizer', 'whitespace',
+        '--files-per-shard', '4', '--workers', '1'])
+    assert(len(read_shards(out)) == 6)
+    assert('aligned 6 documents' in capsys.readouterr().err)
+
+def test_tokenizer_specs(tmp_path, wordlevel_tok) -> None:
+    path = tmp_path / 'tokenizer.json'
+    wordlevel_tok.save(str(path))
+    encoding = load_tokenizer(f'file:{path}')('the whale')
+    assert(encoding.tokens == ['[CLS]', 'the', '[UNK]', '[SEP]'])
+    with pytest.raises(ValueError):
+        load_tokenizer('sentencepiece')
+
+
+# vim: et ai si sts=4
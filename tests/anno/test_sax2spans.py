@@ -22,11 +22,18 @@ import xml.sax
 from xml.sax.handler import ContentHandler
 
 from label_alignment.span_annotation import SpanAnnotation
+from label_alignment.span_table import SpanTable
+from label_alignment.expat2spans import expat_parsed
+from label_alignment.parallel_sax import (
+        parallel_span_parsed,
+        split_paragraphs,
+        )
 
 from label_alignment.sax2spans import (
         SpanAndText, text_and_spans, 
         find_consec_whitespace,
         span_parsed,
+        stream_paragraphs,
         )
 
 
@@ -54,5 +61,99 @@ def test_parse_verne(verne_ch5_excerpt, v5_by_label) -> None:
 
 
 
+def test_parse_verne_table(verne_ch5_excerpt) -> None:
+    text, annos = span_parsed(verne_ch5_excerpt)
+    table_text, table = span_parsed(verne_ch5_excerpt, table=True)
+    assert(table_text == text)
+    assert(isinstance(table, SpanTable))
+    assert(list(table) == annos)
+
+@pytest.mark.parametrize('chunk_size', [7, 1 << 16])
+def test_stream_verne(verne_ch5_excerpt, chunk_size : int) -> None:
+    text, annos = span_parsed(verne_ch5_excerpt)
+    streamed : List[SpanAnnotation] = []
+    n_paragraphs : int = 0
+    for paragraph, spans, offset in stream_paragraphs(verne_ch5_excerpt,
+            chunk_size=chunk_size):
+        n_paragraphs += 1
+        assert(text[offset:offset + len(paragraph) + 1] == paragraph + '\n')
+        streamed.extend(SpanAnnotation(start=span.start + offset,
+            end=span.end + offset, label=span.label) for span in spans)
+    assert(n_paragraphs == text.count('\n'))
+    assert(streamed == annos)
+
+def test_stream_is_incremental(verne_ch5_excerpt) -> None:
+    """
+    the first paragraph is available before the whole
+    document has been read
+    """
+    with open(verne_ch5_excerpt, 'rb') as f:
+        paragraphs = stream_paragraphs(f, chunk_size=64)
+        first = next(paragraphs)
+        assert(first[0].startswith('The voyage of the Abraham Lincoln'))
+        assert(first[2] == 0)
+        assert(f.tell() < len(verne_ch5_excerpt.read_bytes()))
+
+def test_expat_verne(verne_ch5_excerpt) -> None:
+    text, annos = span_parsed(verne_ch5_excerpt)
+    assert(expat_parsed(verne_ch5_excerpt) == (text, annos))
+    expat_text, table = expat_parsed(verne_ch5_excerpt, table=True)
+    assert(expat_text == text)
+    assert(table == span_parsed(verne_ch5_excerpt, table=True)[1])
+
+def test_expat_odd_structure(tmp_path) -> None:
+    """
+    text outside paragraphs, nested and empty elements, 
+    entities and CDATA are treated as by SpanAndText
+    """
+    xml_text = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<doc>ignored <person>also ignored</person>\n'
+            '<p>A <vessel>big <b>bold</b> ship</vessel> &amp; '
+            '<place>Cape<![CDATA[ <Horn>]]></place><empty/>!</p>\n'
+            'between\n'
+            '<p></p><p><date>1867</date></p>\n'
+            '</doc>\n'
+            )
+    path = tmp_path / 'odd.xml'
+    path.write_text(xml_text, encoding='utf-8')
+    expected = span_parsed(path)
+    assert(expat_parsed(path) == expected)
+    with open(path, 'rb') as f:
+        assert(expat_parsed(f) == expected)
+
+@pytest.mark.parametrize('chunk_bytes', [1, 300, 1 << 24])
+def test_parallel_verne(verne_ch5_excerpt, chunk_bytes : int) -> None:
+    expected = span_parsed(verne_ch5_excerpt)
+    assert(parallel_span_parsed(verne_ch5_excerpt, max_workers=2,
+        chunk_bytes=chunk_bytes) == expected)
+
+def test_parallel_pieces(tmp_path) -> None:
+    """
+    pieces start only at real paragraph tags (not <person> or
+    <pre>), and empty paragraphs and trailing elements are handled
+    """
+    xml_text = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<!-- <p>not a paragraph</p> -->\n'
+            '<doc lang="en">\n'
+            + ''.join(f'<p id="{i}"><person>Ned</person> <pre>{i}</pre> '
+                'harpooned ’em</p>\n<p/>\n' for i in range(20))
+            + '<note>trailing</note>\n</doc>\n'
+            )
+    path = tmp_path / 'many.xml'
+    path.write_text(xml_text, encoding='utf-8')
+    header, closing, ranges = split_paragraphs(path, chunk_bytes=100)
+    assert(closing == b'</doc>')
+    assert(len(ranges) > 5)
+    data = path.read_bytes()
+    for start, end in ranges:
+        assert(data[start:start + 3] in (b'<p ', b'<p/'))
+    expected = span_parsed(path)
+    assert(parallel_span_parsed(path, max_workers=2,
+        chunk_bytes=100) == expected)
+    text, table = parallel_span_parsed(path, chunk_bytes=100, table=True)
+    assert(list(table) == expected[1])
+
 
 # vim: et ai si sts=4   
@@ -15,6 +15,13 @@ from typing import (
         Protocol,
         )
 
+from bisect import bisect_right
+
+import numpy as np
+
+from label_alignment.alignment import align_batch, align_ranges_bilou
+from label_alignment.simple_tokenizers import TokenizedImpl
+
 
 def test_wss_tok(wss_tok_verne_ch5):
     text, wss_tokenized, annos = wss_tok_verne_ch5
@@ -32,8 +39,61 @@ def test_wss_tok(wss_tok_verne_ch5):
         else:
             assert(ti is not None)
 
+def bisect_char_to_token(bounds : List[int], char_ix : int) -> Optional[int]:
+    """
+    original list-based char_to_token, for reference
+    """
+    i_all = bisect_right(bounds, char_ix)
+    if i_all % 2 == 0:
+        return None
+    return (i_all - 1) // 2
+
+@pytest.mark.parametrize('dense_budget', [0, 1 << 22])
+def test_char_to_token_lookups(wss_tok_verne_ch5, dense_budget) -> None:
+    text, wss_tokenized, annos = wss_tok_verne_ch5
+    tokenized = TokenizedImpl(wss_tokenized.tok_out, 
+            dense_budget=dense_budget)
+    bounds = [b for offsets in tokenized.offsets for b in offsets]
+    char_ixs = list(range(-3, len(text) + 3))
+    expected = [bisect_char_to_token(bounds, i) for i in char_ixs]
+    assert([tokenized.char_to_token(i) for i in char_ixs] == expected)
+    # only char_to_token_many uses the dense map
+    assert(tokenized._dense is None)
+    many = tokenized.char_to_token_many(char_ixs)
+    assert((tokenized._dense is not None) == (dense_budget > 0))
+    assert(list(many) == [-1 if t is None else t for t in expected])
+    assert(tokenized.offset_array.shape == (len(tokenized.tokens), 2))
+
+def test_char_to_token_empty() -> None:
+    tokenized = TokenizedImpl([])
+    assert(tokenized.char_to_token(0) is None)
+    assert(list(tokenized.char_to_token_many([0, 1])) == [-1, -1])
 
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_tokenize_batch(verne_ch5_paragraphs, wss_tok, max_workers) -> None:
+    texts = [text for text, annos in verne_ch5_paragraphs] + ['', '  ']
+    batch = wss_tok.tokenize_batch(texts, max_workers=max_workers,
+            chunk_size=2)
+    assert(len(batch) == len(texts))
+    assert(list(batch.lengths()) == [len(wss_tok.tokenize(text).tokens)
+        for text in texts])
+    for text, tokenized in zip(texts, batch):
+        expected = wss_tok.tokenize(text)
+        assert(tokenized.tokens == expected.tokens)
+        assert(tokenized.offsets == expected.offsets)
+        assert(tokenized.tok_out == expected.tok_out)
+        assert(list(tokenized.char_to_token_many(range(len(text))))
+                == list(expected.char_to_token_many(range(len(text)))))
+    assert(batch[-1].tokens == ())
 
+def test_tokenize_batch_align(verne_ch5_paragraphs, wss_tok) -> None:
+    texts = [text for text, annos in verne_ch5_paragraphs]
+    annos = [[anno.to_labeled_span() for anno in annos]
+            for text, annos in verne_ch5_paragraphs]
+    batch = wss_tok.tokenize_batch(texts, max_workers=2, chunk_size=3)
+    assert(align_batch(batch, annos) == [
+        align_ranges_bilou(wss_tok.tokenize(text), anno)
+        for text, anno in zip(texts, annos)])
 
 
 
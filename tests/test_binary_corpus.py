@@ -0,0 +1,95 @@
+"""
+test routines for binary_corpus.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import pickle
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.alignment import align_tokens_and_annotations_bilou
+from label_alignment.binary_corpus import (CorpusReader, CorpusWriter,
+        write_corpus)
+from label_alignment.label_codec import LabelCodec
+from label_alignment.simple_tokenizers import wss_tokenizer
+from label_alignment.types import LabeledSpan
+
+
+def aligned_documents() -> List[Tuple[List[Tuple[int, int]], List[str]]]:
+    tokenizer = wss_tokenizer()
+    texts = [("Captain Nemo met Ned Land in Paris.",
+        [LabeledSpan(start=0, end=12, label='PER'),
+            LabeledSpan(start=17, end=25, label='PER'),
+            LabeledSpan(start=29, end=34, label='LOC')]),
+        ("", []),
+        ("The Nautilus dived.", [])]
+    documents = []
+    for text, spans in texts:
+        tokenized = tokenizer.tokenize(text)
+        documents.append((list(tokenized.offsets),
+            align_tokens_and_annotations_bilou(tokenized, spans)))
+    return documents
+
+def test_round_trip(tmp_path) -> None:
+    documents = aligned_documents()
+    path = tmp_path / 'corpus.bin'
+    assert(write_corpus(path, documents) == 3)
+    corpus = CorpusReader(path)
+    assert(len(corpus) == 3 and corpus.codec is None)
+    assert(corpus.lengths().tolist() == [7, 0, 3])
+    assert(corpus.n_tokens == 10 and corpus.label_ids.dtype == np.int32)
+    for doc_ix, (offsets, labels) in enumerate(documents):
+        doc = corpus[doc_ix]
+        assert(doc.offsets.tolist() == [list(offset) for offset in offsets])
+        assert(corpus.decode(doc_ix) == labels)
+    assert(corpus.decode(-3)[:2] == ['B-PER', 'L-PER'])
+    with pytest.raises(IndexError):
+        corpus[3]
+    # views into the file, not copies
+    assert(not corpus[0].label_ids.flags.writeable)
+    assert(np.shares_memory(corpus[2].offsets, corpus.offsets))
+    assert(not list(tmp_path.glob('*.partial')))
+
+def test_codec_and_ids(tmp_path) -> None:
+    codec = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    documents = aligned_documents()
+    path = tmp_path / 'corpus.bin'
+    with CorpusWriter(path, codec) as writer:
+        offsets, labels = documents[0]
+        writer.add(offsets, labels)
+        writer.add(np.array(offsets), codec.encode_many(labels))
+    corpus = CorpusReader(path)
+    assert(corpus.codec == codec and list(corpus.labels) == codec.labels)
+    assert(corpus.label_ids.dtype == codec.dtype)
+    assert(corpus[1].label_ids.tolist() == codec.encode_many(labels).tolist())
+    assert(corpus.decode(0) == corpus.decode(1) == labels)
+    # e.g. for the worker processes of a data loader
+    copy = pickle.loads(pickle.dumps(corpus))
+    assert(copy.decode(1) == labels)
+
+def test_writer_errors(tmp_path) -> None:
+    path = tmp_path / 'corpus.bin'
+    with pytest.raises(ValueError):
+        with CorpusWriter(path) as writer:
+            writer.add([(0, 3)], ['U-PER', 'O'])
+    # nothing is left behind by a failed write
+    assert(not list(tmp_path.iterdir()))
+    with pytest.raises(ValueError):
+        with CorpusWriter(path) as writer:
+            writer.add([(0, 3)], np.array([1]))
+    (tmp_path / 'other.bin').write_bytes(b'not a corpus' * 10)
+    with pytest.raises(ValueError):
+        CorpusReader(tmp_path / 'other.bin')
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,99 @@
+"""
+test routines for cache.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.alignment import align_tokens_and_annotations_bilou
+from label_alignment.cache import (AlignmentCache, LRUCache,
+        annotations_hash, tokenizer_fingerprint)
+from label_alignment.simple_tokenizers import ws_tokenizer, wss_tokenizer
+from label_alignment.span_table import SpanTable
+from label_alignment.types import LabeledSpan
+
+
+def test_lru_cache() -> None:
+    cache = LRUCache(max_bytes=100)
+    cache.put('a', 1, 40)
+    cache.put('b', 2, 40)
+    assert(cache.get('a') == 1)
+    # 'b' is now least recently used
+    cache.put('c', 3, 40)
+    assert('b' not in cache and 'a' in cache and 'c' in cache)
+    assert(cache.get('b') is None)
+    # replacing an entry frees its bytes
+    cache.put('c', 4, 50)
+    assert(cache.get('c') == 4 and cache.nbytes == 90)
+    # too big for the whole cache
+    cache.put('d', 5, 101)
+    assert('d' not in cache)
+    stats = cache.stats()
+    assert((stats.hits, stats.misses, stats.evictions) == (2, 1, 1))
+    assert((stats.entries, stats.nbytes) == (2, 90))
+
+def test_fingerprints() -> None:
+    assert(tokenizer_fingerprint(wss_tokenizer())
+            == tokenizer_fingerprint(wss_tokenizer()))
+    assert(tokenizer_fingerprint(wss_tokenizer())
+            != tokenizer_fingerprint(ws_tokenizer()))
+    with pytest.raises(ValueError):
+        tokenizer_fingerprint(str.split)
+
+def test_annotations_hash() -> None:
+    spans = [LabeledSpan(start=0, end=3, label='LOC'),
+            LabeledSpan(start=4, end=8, label='PER')]
+    assert(annotations_hash(spans) == annotations_hash(list(spans)))
+    assert(annotations_hash(spans) != annotations_hash(spans[:1]))
+    relabeled = [LabeledSpan(start=0, end=3, label='ORG'), spans[1]]
+    assert(annotations_hash(spans) != annotations_hash(relabeled))
+    # separators inside labels don't shift the field boundaries
+    shifted = [LabeledSpan(start=0, end=3, label='A\n4\t8\tB'),
+            LabeledSpan(start=9, end=9, label='C')]
+    joined = [LabeledSpan(start=0, end=3, label='A'),
+            LabeledSpan(start=4, end=8, label='B\n9\t9\tC')]
+    assert(annotations_hash(shifted) != annotations_hash(joined))
+    newlines = SpanTable.from_annotations([
+        LabeledSpan(start=0, end=3, label='A\nB'),
+        LabeledSpan(start=4, end=8, label='C')])
+    split = SpanTable.from_annotations([
+        LabeledSpan(start=0, end=3, label='A'),
+        LabeledSpan(start=4, end=8, label='B\nC')])
+    assert(annotations_hash(newlines) != annotations_hash(split))
+    table = SpanTable.from_annotations(spans)
+    assert(annotations_hash(table) == annotations_hash(table[:]))
+
+def test_alignment_cache() -> None:
+    text = 'New York is big and Ned Land is not'
+    spans = [LabeledSpan(start=0, end=8, label='LOC'),
+            LabeledSpan(start=20, end=28, label='PER')]
+    cache = AlignmentCache(wss_tokenizer())
+    expected = align_tokens_and_annotations_bilou(
+            wss_tokenizer().tokenize(text), spans)
+    labels = cache.align(text, spans)
+    assert(labels == expected)
+    # the returned list is a copy
+    labels[0] = 'O'
+    assert(cache.align(text, spans) == expected)
+    # a different annotation set reuses the tokenization
+    assert(cache.align(text, spans[:1]) == expected[:2] + ['O'] * 7)
+    assert(cache.align(text, spans, scheme='IOB2')[:2] == ['B-LOC', 'I-LOC'])
+    stats = cache.stats()
+    assert(stats.entries == 4)
+    # labels: miss, hit, miss, miss; tokens: miss, hit, hit
+    assert((stats.hits, stats.misses) == (3, 4))
+    assert(cache.tokenize(text) is cache.tokenize(text))
+    cache.clear()
+    assert(cache.stats().entries == 0)
+
+
+
+# vim: et ai si sts=4
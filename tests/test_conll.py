@@ -0,0 +1,107 @@
+"""
+test routines for conll.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import gzip
+
+from collections import Counter
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.conll import (read_conll, conll_spans, write_conll,
+        align_conll_files)
+
+CONLL = """-DOCSTART- -X- -X- O
+
+Captain NNP B-NP B-PER
+Nemo NNP I-NP I-PER
+met VBD B-VP O
+Ned NNP B-NP B-PER
+Land, NNP I-NP I-PER
+
+Paris. NNP B-NP B-LOC
+
+
+"""
+
+def test_read_conll(tmp_path) -> None:
+    path = tmp_path / 'sample.conll'
+    path.write_text(CONLL, encoding='utf-8')
+    sentences = list(read_conll(path))
+    assert(sentences == [
+        (['Captain', 'Nemo', 'met', 'Ned', 'Land,'],
+            ['B-PER', 'I-PER', 'O', 'B-PER', 'I-PER']),
+        (['Paris.'], ['B-LOC'])])
+    chunks = [tags for tokens, tags in read_conll(path, label_column=2)]
+    assert(chunks[0][:3] == ['B-NP', 'I-NP', 'B-VP'])
+    # gzip-compressed files are recognized by their content
+    gzipped = tmp_path / 'sample'
+    gzipped.write_bytes(gzip.compress(CONLL.encode('utf-8')))
+    assert(list(read_conll(gzipped)) == sentences)
+    with pytest.raises(ValueError):
+        list(read_conll(path, label_column=4))
+
+def test_conll_spans(tmp_path) -> None:
+    path = tmp_path / 'sample.conll'
+    path.write_text(CONLL.replace('O\nNed', 'I-PER\nNed'), encoding='utf-8')
+    text, spans = next(conll_spans(path))
+    assert(text == 'Captain Nemo met Ned Land,')
+    assert([(text[anno.start:anno.end], anno.label) for anno in spans] ==
+            [('Captain Nemo met', 'PER'), ('Ned Land,', 'PER')])
+    repairs : Counter = Counter()
+    text, table = list(conll_spans(path, table=True, repair='drop',
+        repairs=repairs))[1]
+    assert(table.to_annotations()[0].label == 'LOC')
+    for (text, spans), (table_text, table) in zip(conll_spans(path),
+            conll_spans(path, table=True)):
+        assert(table_text == text and table.to_annotations() == spans)
+
+def test_write_conll(tmp_path) -> None:
+    path = tmp_path / 'sample.conll'
+    path.write_text(CONLL, encoding='utf-8')
+    for name in ('copy.conll', 'copy.conll.gz'):
+        copy = tmp_path / name
+        sentences = list(read_conll(path))
+        empty : List[Tuple[List[str], List[str]]] = [([], [])]
+        assert(write_conll(copy, empty + sentences) == 2)
+        assert(list(read_conll(copy)) == sentences)
+    assert(gzip.decompress((tmp_path / 'copy.conll.gz').read_bytes())
+            == (tmp_path / 'copy.conll').read_bytes())
+    with pytest.raises(ValueError):
+        write_conll(tmp_path / 'bad.conll', [(['a', 'b'], ['O'])])
+    assert(not list(tmp_path.glob('bad*')))
+    # the error from opening the file isn't masked by cleaning up
+    with pytest.raises(FileNotFoundError) as excinfo:
+        write_conll(tmp_path / 'missing' / 'bad.conll', sentences)
+    assert(excinfo.value.__context__ is None)
+
+def test_align_conll_files(tmp_path) -> None:
+    inputs = []
+    for name in ('a.conll', 'b.conll.gz'):
+        path = tmp_path / name
+        data = CONLL.encode('utf-8')
+        path.write_bytes(gzip.compress(data) if name.endswith('.gz') else data)
+        inputs.append(path)
+    results = align_conll_files(inputs, tmp_path / 'out',
+            tokenizer='whitespace', scheme='IOB2', max_workers=2)
+    assert([result.sentences for result in results] == [2, 2])
+    assert([result.tokens for result in results] == [8, 8])
+    for result in results:
+        assert(list(read_conll(result.output_path)) == [
+            (['Captain', 'Nemo', 'met', 'Ned', 'Land', ','],
+                ['B-PER', 'I-PER', 'O', 'B-PER', 'I-PER', 'I-PER']),
+            (['Paris', '.'], ['B-LOC', 'I-LOC'])])
+    with pytest.raises(ValueError):
+        align_conll_files(inputs + [inputs[0]], tmp_path / 'out')
+
+
+# vim: et ai si sts=4
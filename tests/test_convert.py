@@ -0,0 +1,106 @@
+"""
+test routines for convert.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.convert import convert, convert_ids, encode_chunks
+from label_alignment.ids2spans import chunk_token_bounds
+from label_alignment.label_codec import LabelCodec
+from label_alignment.schemes import SCHEMES
+from label_alignment.validate import validate
+
+
+def random_chunks(rng, n_tokens : int, n_classes : int
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    random non-overlapping chunks, often adjacent
+    """
+    firsts, lasts, classes = [], [], []
+    i = int(rng.integers(0, 3))
+    while i < n_tokens:
+        last = min(n_tokens - 1, i + int(rng.integers(0, 3)))
+        firsts.append(i)
+        lasts.append(last)
+        classes.append(int(rng.integers(0, n_classes)))
+        i = last + 1 + int(rng.integers(0, 2))
+    return (np.array(firsts, dtype=np.int64), np.array(lasts, dtype=np.int64),
+            np.array(classes, dtype=np.int64))
+
+@pytest.mark.parametrize('source', sorted(set(SCHEMES) - {'IO'}))
+@pytest.mark.parametrize('target', sorted(set(SCHEMES) - {'IO'}))
+def test_convert_keeps_chunks(source : str, target : str) -> None:
+    rng = np.random.default_rng(20)
+    source_codec = LabelCodec(['PER', 'LOC'], scheme=source)
+    target_codec = LabelCodec(['PER', 'LOC'], scheme=target)
+    chunks = random_chunks(rng, 200, 2)
+    tag_ids = encode_chunks(*chunks, 200, source_codec)
+    assert(len(validate([tag_ids], source_codec).docs) == 0)
+    converted = convert_ids(tag_ids, source_codec, target)
+    assert(len(validate([converted], target_codec).docs) == 0)
+    bilou_codec = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    found = chunk_token_bounds(convert_ids(converted, target_codec,
+        bilou_codec), bilou_codec)
+    for expected, actual in zip(chunks, found):
+        assert(expected.tolist() == actual.tolist())
+
+def test_convert_strings() -> None:
+    bilou = [['B-PER', 'I-PER', 'L-PER', 'U-PER', 'U-PER', 'O', 'U-LOC'],
+            ['U-PER'], []]
+    assert(convert(bilou, 'BILOU', 'IOB1') == [
+        ['I-PER', 'I-PER', 'I-PER', 'B-PER', 'B-PER', 'O', 'I-LOC'],
+        ['I-PER'], []])
+    assert(convert(bilou, 'BILOU', 'IOE1') == [
+        ['I-PER', 'I-PER', 'E-PER', 'E-PER', 'I-PER', 'O', 'I-LOC'],
+        ['I-PER'], []])
+    iobes = convert(bilou, 'BILOU', 'IOBES')
+    assert(iobes[0][:4] == ['B-PER', 'I-PER', 'E-PER', 'S-PER'])
+    assert(convert(iobes, 'IOBES', 'BILOU') == bilou)
+    # adjacent chunks of the same class merge in IO
+    io = convert(bilou, 'BILOU', 'IO')
+    assert(convert(io, 'IO', 'BILOU')[0][:5] ==
+            ['B-PER', 'I-PER', 'I-PER', 'I-PER', 'L-PER'])
+
+def test_convert_ids_forms() -> None:
+    source = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    target = LabelCodec(['LOC', 'PER', 'ORG'], scheme='IOB2')
+    bilou = [['B-PER', 'L-PER', 'U-LOC'], ['U-LOC', 'B-PER', 'L-PER']]
+    sequences = [source.encode_many(labels) for labels in bilou]
+    converted = convert(sequences, source, target)
+    expected = [['B-PER', 'I-PER', 'B-LOC'], ['B-LOC', 'B-PER', 'I-PER']]
+    assert([target.decode_many(ids) for ids in converted] == expected)
+    flat = convert(np.concatenate(sequences), source, target, lengths=[3, 3])
+    assert(target.decode_many(flat) == expected[0] + expected[1])
+    with pytest.raises(ValueError):
+        convert(sequences, source, LabelCodec(['PER'], scheme='IOB2'))
+    with pytest.raises(ValueError):
+        convert(sequences, 'BILOU', 'IOB2')
+
+def test_convert_sequence_breaks() -> None:
+    # chunks at the end of one sequence and the start of the next
+    # are not adjacent
+    labels = [['I-PER'], ['I-PER', 'B-PER']]
+    assert(convert(labels, 'IOB1', 'BILOU') == [['U-PER'], ['U-PER', 'U-PER']])
+    assert(convert([['U-PER'], ['U-PER']], 'BILOU', 'IOB1') ==
+            [['I-PER'], ['I-PER']])
+    assert(convert([['E-PER'], ['I-PER', 'E-PER']], 'IOE2', 'BILOU') ==
+            [['U-PER'], ['B-PER', 'L-PER']])
+    # (a lone E is a chunk, not a stray, so there is nothing to repair)
+    for policy in ('convert', 'drop'):
+        with pytest.raises(ValueError):
+            convert([['E-PER']], 'IOE2', 'BILOU', repair=policy)
+
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,124 @@
+"""
+test routines for the DiskCache store in disk_cache.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import multiprocessing
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.disk_cache import (DiskCache, cache_key,
+        pack_labels, unpack_labels, SEGMENT_SUFFIX)
+
+
+def test_disk_cache_round_trip(tmp_path) -> None:
+    with DiskCache(tmp_path) as cache:
+        assert(cache.get(b'a') is None)
+        cache.put(b'a', b'alpha')
+        cache.put(b'b', b'')
+        cache.put(b'a', b'ignored')
+        assert(cache.get(b'a') == b'alpha' and cache.get(b'b') == b'')
+        assert((cache.hits, cache.misses, len(cache)) == (2, 1, 2))
+    # a new DiskCache (e.g. on a re-run) sees the same entries, and
+    # writes to a segment of its own
+    with DiskCache(tmp_path) as cache:
+        assert(cache.get(b'a') == b'alpha')
+        cache.put(b'c', b'gamma')
+    assert(len(list(tmp_path.glob('*' + SEGMENT_SUFFIX))) == 2)
+    with DiskCache(tmp_path) as cache:
+        assert(cache.get(b'c') == b'gamma' and len(cache) == 3)
+
+def test_disk_cache_torn_record(tmp_path) -> None:
+    with DiskCache(tmp_path) as cache:
+        cache.put(b'a', b'alpha')
+        cache.put(b'b', b'beta')
+    segment, = tmp_path.glob('*' + SEGMENT_SUFFIX)
+    complete = segment.read_bytes()
+    # as if the writer were still in the middle of the second record
+    segment.write_bytes(complete[:-2])
+    reader = DiskCache(tmp_path)
+    assert(reader.get(b'a') == b'alpha' and b'b' not in reader)
+    segment.write_bytes(complete)
+    reader.refresh()
+    assert(reader.get(b'b') == b'beta')
+    reader.close()
+
+def test_disk_cache_corrupt_record(tmp_path) -> None:
+    with DiskCache(tmp_path) as cache:
+        cache.put(b'a', b'alpha')
+        cache.put(b'b', b'beta')
+    segment, = tmp_path.glob('*' + SEGMENT_SUFFIX)
+    data = bytearray(segment.read_bytes())
+    data[data.index(b'alpha')] ^= 1
+    segment.write_bytes(bytes(data))
+    with DiskCache(tmp_path) as cache:
+        # (the CRC is only checked when the record is read)
+        assert(b'a' in cache)
+        assert(cache.get(b'a') is None and cache.get(b'b') == b'beta')
+        assert((cache.hits, cache.misses) == (1, 1))
+        cache.put(b'a', b'alpha')
+        assert(cache.get(b'a') == b'alpha')
+
+def test_disk_cache_compact(tmp_path) -> None:
+    for i in range(3):
+        with DiskCache(tmp_path) as cache:
+            cache.put(str(i).encode('ascii'), b'x' * i)
+    assert(len(list(tmp_path.glob('*' + SEGMENT_SUFFIX))) == 3)
+    with DiskCache(tmp_path) as cache:
+        cache.compact()
+        assert(len(cache.segments()) == 1)
+        assert(cache.get(b'2') == b'xx')
+        cache.put(b'3', b'xxx')
+    with DiskCache(tmp_path) as cache:
+        assert(len(cache) == 4 and len(cache.segments()) == 2)
+        assert([cache.get(str(i).encode('ascii')) for i in range(4)]
+                == [b'', b'x', b'xx', b'xxx'])
+
+def test_disk_cache_readers_see_writers(tmp_path) -> None:
+    writer = DiskCache(tmp_path)
+    reader = DiskCache(tmp_path)
+    writer.put(b'a', b'alpha')
+    assert(reader.get(b'a') is None)
+    reader.refresh()
+    assert(reader.get(b'a') == b'alpha')
+    writer.put(b'b', b'beta' * 1000)
+    reader.refresh()
+    assert(reader.get(b'b') == b'beta' * 1000)
+    writer.close()
+    reader.close()
+
+def _fill(directory : str, worker : int) -> None:
+    with DiskCache(directory) as cache:
+        for i in range(50):
+            cache.put(cache_key('test', str(i)), f'{i}'.encode('ascii'))
+            cache.put(cache_key('worker', str(worker), str(i)), b'x' * i)
+
+def test_disk_cache_processes(tmp_path) -> None:
+    processes = [multiprocessing.Process(target=_fill,
+        args=(str(tmp_path), worker)) for worker in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    with DiskCache(tmp_path) as cache:
+        assert(len(cache) == 50 + 3 * 50)
+        assert(cache.get(cache_key('test', '7')) == b'7')
+        assert(cache.get(cache_key('worker', '2', '9')) == b'x' * 9)
+
+def test_cache_key_and_labels() -> None:
+    assert(cache_key('a', 'bc') != cache_key('ab', 'c'))
+    assert(cache_key('a', b'b') == cache_key('a', 'b'))
+    labels = ['O', 'B-PER', 'L-PER', 'O', 'U-LOC']
+    assert(unpack_labels(pack_labels(labels)) == labels)
+    assert(unpack_labels(pack_labels([])) == [])
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,280 @@
+"""
+Testing array-based decoding in ids2spans against
+tok2spans.iob2spans
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import random
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.iob_state import UnexpectedLabel
+from label_alignment.label_codec import LabelCodec
+from label_alignment.span_annotation import SpanAnnotation, SpanScores
+from label_alignment.span_table import SpanTable, ScoreColumns
+from label_alignment.tok2spans import iob2spans
+from label_alignment.ids2spans import (ids2spans, ids2table,
+        chunk_token_bounds, iob2spans_batch, span_scores)
+from label_alignment.validate import validate
+
+
+def random_words(n : int, rng : random.Random) -> List[str]:
+    return [''.join(rng.choice('abcdefg') for i in range(rng.randint(1, 8)))
+            for j in range(n)]
+
+def state_machine_spans(tokens : Sequence[str],
+        labels : Sequence[str]) -> Optional[List[SpanAnnotation]]:
+    """
+    spans from iob2spans, or None if it raises UnexpectedLabel
+    """
+    try:
+        return list(iob2spans(tokens, labels))
+    except UnexpectedLabel:
+        return None
+
+def array_spans(tokens : Sequence[str], tag_ids : np.ndarray,
+        codec : LabelCodec) -> Optional[List[SpanAnnotation]]:
+    lengths = np.array([len(token) for token in tokens])
+    try:
+        starts, ends, classes = ids2spans(tag_ids, codec, lengths=lengths)
+    except UnexpectedLabel:
+        return None
+    return [SpanAnnotation(start=int(start), end=int(end),
+        label=codec.classes[class_ix])
+        for start, end, class_ix in zip(starts, ends, classes)]
+
+@pytest.mark.parametrize('scheme', ['IO', 'IOB2', 'IOBES', 'BILOU'])
+def test_ids2spans_matches_iob2spans(scheme : str) -> None:
+    rng = random.Random(scheme)
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    n_raised = 0
+    for trial in range(300):
+        n_tokens = rng.randint(0, 12)
+        tokens = random_words(n_tokens, rng)
+        # mostly O, so that chunks of all kinds turn up
+        tag_ids : np.ndarray = np.array([rng.randrange(len(codec))
+            if rng.random() < 0.6 else 0 for i in range(n_tokens)],
+            dtype=codec.dtype)
+        expected = state_machine_spans(tokens, codec.decode_many(tag_ids))
+        n_raised += expected is None
+        assert(array_spans(tokens, tag_ids, codec) == expected)
+    if scheme in ('BILOU', 'IOBES'):
+        assert(n_raised > 0)
+
+def ending_chunks(labels : Sequence[str]) -> List[Tuple[int, int, str]]:
+    """
+    (first token, last token, class) of each chunk in IOE1 or IOE2
+    labels, one token at a time: I continues an I of the same class
+    or starts a chunk, and E does the same but also closes it
+    """
+    chunks = []
+    open_chunk = None
+    for i, label in enumerate(labels):
+        prefix, sep, label_class = label.partition('-')
+        if (open_chunk is not None and prefix != 'O'
+                and open_chunk[1] == label_class):
+            first = open_chunk[0]
+        else:
+            if open_chunk is not None:
+                chunks.append((open_chunk[0], i - 1, open_chunk[1]))
+            first = i
+        open_chunk = None
+        if prefix == 'E':
+            chunks.append((first, i, label_class))
+        elif prefix == 'I':
+            open_chunk = (first, label_class)
+    if open_chunk is not None:
+        chunks.append((open_chunk[0], len(labels) - 1, open_chunk[1]))
+    return chunks
+
+@pytest.mark.parametrize('scheme', ['IOE1', 'IOE2'])
+def test_chunk_token_bounds_ending_schemes(scheme : str) -> None:
+    rng = random.Random(scheme)
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    for trial in range(300):
+        n_tokens = rng.randint(0, 12)
+        tag_ids : np.ndarray = np.array([rng.randrange(len(codec))
+            if rng.random() < 0.6 else 0 for i in range(n_tokens)],
+            dtype=codec.dtype)
+        firsts, lasts, classes = chunk_token_bounds(tag_ids, codec)
+        found = [(first, last, codec.classes[class_ix]) for first, last,
+                class_ix in zip(firsts.tolist(), lasts.tolist(),
+                    classes.tolist())]
+        assert(found == ending_chunks(codec.decode_many(tag_ids)))
+    # a lone E is a single-token chunk (valid in IOE2, and in IOE1
+    # when the next chunk is of the same class)
+    tag_ids = codec.encode_many(['E-PER', 'O', 'I-PER', 'E-PER', 'E-PER'])
+    if scheme == 'IOE2':
+        assert(len(validate([tag_ids], codec).docs) == 0)
+    firsts, lasts, classes = chunk_token_bounds(tag_ids, codec)
+    assert((firsts.tolist(), lasts.tolist()) == ([0, 2, 4], [0, 3, 4]))
+    # and an E after an I of another class starts a chunk of its own
+    tag_ids = codec.encode_many(['I-LOC', 'E-PER'])
+    firsts, lasts, classes = chunk_token_bounds(tag_ids, codec)
+    assert((firsts.tolist(), classes.tolist()) == ([0, 1], [1, 0]))
+    batch = iob2spans_batch(codec.encode_many(['E-PER', 'O'])[None, :], codec)
+    assert((batch.starts.tolist(), batch.ends.tolist()) == ([0], [1]))
+
+def test_ids2spans_offsets() -> None:
+    codec = LabelCodec(['PER'])
+    tag_ids = codec.encode_many(['B-PER', 'L-PER', 'O', 'U-PER'])
+    offsets = np.array([(0, 3), (5, 9), (10, 12), (14, 20)])
+    starts, ends, classes = ids2spans(tag_ids, codec, offsets=offsets)
+    assert(list(starts) == [0, 14])
+    assert(list(ends) == [9, 20])
+    assert(list(classes) == [0, 0])
+    with pytest.raises(ValueError):
+        ids2spans(tag_ids, codec)
+
+def test_chunk_token_bounds() -> None:
+    codec = LabelCodec(['PER', 'LOC'], scheme='IOB2')
+    tag_ids = codec.encode_many(['I-PER', 'I-PER', 'I-LOC', 'B-LOC', 'O'])
+    firsts, lasts, classes = chunk_token_bounds(tag_ids, codec)
+    assert(list(firsts) == [0, 2, 3])
+    assert(list(lasts) == [1, 2, 3])
+    assert(list(classes) == [0, 1, 1])
+
+def test_iob2spans_ends() -> None:
+    """
+    chunks which run to the end of the text, and chunks following
+    B inside another chunk, are emitted once each
+    """
+    tokens = ['a', 'bb', 'c', 'dd']
+    assert(list(iob2spans(tokens, ['B-X', 'I-X', 'B-Y', 'I-Y'])) == [
+        SpanAnnotation(start=0, end=4, label='X'),
+        SpanAnnotation(start=5, end=9, label='Y'),
+        ])
+    assert(list(iob2spans(tokens, ['U-X', 'O', 'O', 'U-Y'])) == [
+        SpanAnnotation(start=0, end=1, label='X'),
+        SpanAnnotation(start=7, end=9, label='Y'),
+        ])
+
+@pytest.mark.parametrize('scheme', ['IOB2', 'BILOU'])
+def test_iob2spans_batch_matches_rows(scheme : str) -> None:
+    rng = np.random.default_rng(15)
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    if scheme == 'BILOU':
+        # only B, U and O, so no sequence raises UnexpectedLabel
+        allowed = codec.encode_many(['O', 'B-PER', 'U-PER', 'B-LOC', 'U-LOC'])
+    else:
+        allowed = np.arange(len(codec))
+    n_docs, seq_len = 20, 16
+    tag_ids = rng.choice(allowed, size=(n_docs, seq_len))
+    lengths = rng.integers(0, seq_len + 1, size=n_docs)
+    attention_mask = np.arange(seq_len)[None, :] < lengths[:, None]
+    tag_ids[~attention_mask] = -100
+    special = np.zeros_like(attention_mask)
+    special[:, 0] = True
+    special[np.arange(n_docs), np.maximum(lengths - 1, 0)] = True
+    offsets = np.stack([np.arange(seq_len) * 3, np.arange(seq_len) * 3 + 2],
+            axis=-1)[None].repeat(n_docs, axis=0)
+    for with_offsets in (False, True):
+        table = iob2spans_batch(tag_ids, codec, attention_mask=attention_mask,
+                special_tokens_mask=special,
+                offsets=offsets if with_offsets else None)
+        assert(list(table.docs) == sorted(table.docs))
+        for doc, doc_table in enumerate(table.documents(n_docs)):
+            keep = np.flatnonzero(attention_mask[doc] & ~special[doc])
+            firsts, lasts, classes = chunk_token_bounds(tag_ids[doc, keep],
+                    codec)
+            if with_offsets:
+                expected = (offsets[doc, keep[firsts], 0],
+                        offsets[doc, keep[lasts], 1])
+            else:
+                expected = (keep[firsts], keep[lasts] + 1)
+            assert(list(doc_table.starts) == list(expected[0]))
+            assert(list(doc_table.ends) == list(expected[1]))
+            assert(list(doc_table.label_ids) == list(classes))
+            assert(doc_table == table.document(doc))
+    # -100 padding left unmasked is an error, not a wrapped-around tag
+    with pytest.raises(ValueError):
+        iob2spans_batch(tag_ids, codec)
+    with pytest.raises(ValueError):
+        chunk_token_bounds(np.array([0, len(codec)]), codec)
+
+def test_iob2spans_batch_breaks() -> None:
+    # a chunk running to the end of one row doesn't continue
+    # into the next
+    codec = LabelCodec(['PER'], scheme='IOB2')
+    tag_ids = np.array([codec.encode_many(['O', 'B-PER', 'I-PER']),
+        codec.encode_many(['I-PER', 'I-PER', 'O'])])
+    table = iob2spans_batch(tag_ids, codec)
+    assert(list(table.docs) == [0, 1])
+    assert(list(table.starts) == [1, 0])
+    assert(list(table.ends) == [3, 2])
+    assert(len(table[table.docs == 1]) == 1)
+    with pytest.raises(ValueError):
+        iob2spans_batch(tag_ids[0], codec)
+
+def test_span_scores() -> None:
+    token_scores = np.array([0.5, 0.9, 0.8, 0.2, 1.0, 0.4])
+    scores = span_scores(token_scores, np.array([0, 2, 3, 5]),
+            np.array([1, 2, 4, 5]))
+    for i, (first, last) in enumerate([(0, 1), (2, 2), (3, 4), (5, 5)]):
+        expected = token_scores[first:last + 1]
+        assert(scores.mean[i] == pytest.approx(expected.mean()))
+        assert(scores.min[i] == expected.min())
+        assert(scores.product[i] == pytest.approx(expected.prod()))
+    no_tokens = np.zeros(0, dtype=np.int64)
+    assert(len(span_scores(token_scores, no_tokens, no_tokens).mean) == 0)
+
+def span_scores_of(span : SpanAnnotation) -> SpanScores:
+    assert(span.scores is not None)
+    return span.scores
+
+def table_scores_of(table : SpanTable) -> ScoreColumns:
+    assert(table.scores is not None)
+    return table.scores
+
+def test_scores_in_tables() -> None:
+    codec = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    labels = ['B-PER', 'L-PER', 'O', 'U-LOC', 'B-LOC', 'I-LOC', 'L-LOC']
+    tag_ids = codec.encode_many(labels)
+    token_scores = np.array([0.9, 0.5, 0.7, 0.6, 0.8, 1.0, 0.5])
+    table = ids2table(tag_ids, codec, lengths=np.ones(7),
+            token_scores=token_scores)
+    assert(table.scores is not None)
+    assert(list(table.scores.min) == [0.5, 0.6, 0.5])
+    assert(list(table.scores.product) == pytest.approx([0.45, 0.6, 0.4]))
+    assert(span_scores_of(table[2]).mean == pytest.approx(2.3 / 3))
+    assert(table_scores_of(table[1:]).min[0] == 0.6)
+    # as a padded batch, with the same sequence shifted by one
+    # and a padded position in the middle of the last chunk
+    batch = np.zeros((2, 8), dtype=np.int64)
+    batch[0, :7] = tag_ids
+    batch[1, 1:] = tag_ids
+    batch_scores = np.zeros((2, 8))
+    batch_scores[0, :7] = token_scores
+    batch_scores[1, 1:] = token_scores
+    mask = np.ones((2, 8), dtype=bool)
+    mask[0, 7] = False
+    batch_table = iob2spans_batch(batch, codec, attention_mask=mask,
+            token_scores=batch_scores)
+    for doc_table in batch_table.documents(2):
+        assert(list(table_scores_of(doc_table).min) == list(table.scores.min))
+        assert(list(table_scores_of(doc_table).mean)
+                == pytest.approx(list(table.scores.mean)))
+    spans = list(iob2spans(['a'] * 7, labels, scores=token_scores))
+    assert([span_scores_of(span).product for span in spans]
+            == pytest.approx(list(table.scores.product)))
+    assert(spans == list(iob2spans(['a'] * 7, labels)))
+    offsets = [(2 * i, 2 * i + 1) for i in range(7)]
+    for engine in ('state', 'table'):
+        scored = list(iob2spans(['a'] * 7, labels, engine=engine,
+            offsets=offsets, scores=token_scores))
+        assert(scored == list(iob2spans(['a'] * 7, labels, offsets=offsets)))
+        assert([span_scores_of(span).min for span in scored]
+                == [0.5, 0.6, 0.5])
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,79 @@
+"""
+Testing the table-driven decoder from iob_table against
+the state machine from iob_state
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import random
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        cast,
+        )
+
+from label_alignment.iob_state import UnexpectedLabel
+from label_alignment.iob_table import TransitionTable, compiled_table
+from label_alignment.span_annotation import SpanAnnotation
+from label_alignment.tok2spans import iob2spans
+
+
+SCHEME_LABELS : Dict[str, List[Optional[str]]] = {
+        'IO': ['O', 'I-PER', 'I-LOC'],
+        'IOB1': ['O', 'I-PER', 'I-LOC', 'B-PER', 'B-LOC'],
+        'IOB2': ['O', 'B-PER', 'I-PER', 'I', 'B-LOC', 'I-LOC'],
+        'IOBES': ['O', 'B-PER', 'I-PER', 'E-PER', 'S-PER', 'B-LOC', 'E'],
+        'BILOU': ['O', 'B-PER', 'I-PER', 'L-PER', 'U-PER', 'U-LOC', 'L'],
+        # anything goes, including labels the state machine rejects
+        'mixed': ['O', '', ' ', None, 'B', 'I', 'B-PER', 'I-LOC', 'E-LOC',
+            'S-PER', 'U', 'L-PER', 'X-PER', 'B-FOO-BAR'],
+        }
+
+def decoded(tokens : Sequence[str], labels : Sequence[Optional[str]],
+        engine : str) -> Union[List[SpanAnnotation], str]:
+    """
+    spans from iob2spans, or the message if it raises UnexpectedLabel
+
+    (labels may include None, which iob2spans isn't typed for, but
+    both engines must still handle it the same way)
+    """
+    try:
+        return list(iob2spans(tokens, cast(Sequence[str], labels),
+            engine=engine))
+    except UnexpectedLabel as e:
+        return str(e)
+
+@pytest.mark.parametrize('scheme', list(SCHEME_LABELS))
+def test_table_matches_state(scheme : str) -> None:
+    rng = random.Random(scheme)
+    vocab = SCHEME_LABELS[scheme]
+    for trial in range(300):
+        n_tokens = rng.randint(0, 12)
+        tokens = [rng.choice(['a', 'bb', 'ccc', 'Ned', 'Land'])
+                for i in range(n_tokens)]
+        labels = [rng.choice(vocab) for i in range(n_tokens)]
+        assert(decoded(tokens, labels, 'table')
+                == decoded(tokens, labels, 'state'))
+
+def test_table_transitions() -> None:
+    table = TransitionTable(['O', 'B-PER', 'I', 'L-LOC'])
+    assert(table.classes == ['CHUNK', 'PER', 'LOC'])
+    starts, ends, classes = table.decode(['Ned', 'Land', 'sailed'],
+            ['B-PER', 'I', 'O'])
+    assert((starts, ends, classes) == ([0], [8], [1]))
+    with pytest.raises(KeyError):
+        table.decode(['Ned'], ['B-ORG'])
+    assert(compiled_table(frozenset(['O', 'U-X']))
+            is compiled_table(frozenset(['U-X', 'O'])))
+
+def test_unknown_engine() -> None:
+    with pytest.raises(ValueError):
+        list(iob2spans(['a'], ['O'], engine='fast'))
+
+
+# vim: et ai si sts=4
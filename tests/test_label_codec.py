@@ -0,0 +1,76 @@
+"""
+Testing LabelCodec from label_codec
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.iob_state import UnexpectedLabel
+from label_alignment.label_codec import LabelCodec
+
+
+@pytest.fixture
+def bilou_codec() -> LabelCodec:
+    return LabelCodec(['PER', 'LOC'], scheme='BILOU')
+
+def test_codec_vocabulary(bilou_codec : LabelCodec) -> None:
+    assert(bilou_codec.labels == ['O',
+        'B-PER', 'I-PER', 'L-PER', 'U-PER',
+        'B-LOC', 'I-LOC', 'L-LOC', 'U-LOC'])
+    assert(len(bilou_codec) == 9)
+    for tag_id, label in enumerate(bilou_codec.labels):
+        assert(bilou_codec.encode(label) == tag_id)
+        assert(bilou_codec.decode(tag_id) == label)
+    assert(chr(bilou_codec.tag_prefixes[7]) == 'L')
+    assert(bilou_codec.tag_classes[7] == 1)
+    assert(bilou_codec.tag_classes[0] == -1)
+
+def test_codec_aliases(bilou_codec : LabelCodec) -> None:
+    assert(bilou_codec.encode('S-LOC') == bilou_codec.encode('U-LOC'))
+    assert(bilou_codec.encode('E-PER') == bilou_codec.encode('L-PER'))
+    assert(bilou_codec.encode(None) == 0)
+    iobes = LabelCodec(['PER'], scheme='iobes')
+    assert(iobes.scheme == 'IOBES')
+    assert(iobes.encode('U-PER') == iobes.encode('S-PER'))
+    # single class codec, so bare labels get that class
+    assert(iobes.encode('I') == iobes.encode('I-PER'))
+
+def test_codec_errors(bilou_codec : LabelCodec) -> None:
+    with pytest.raises(UnexpectedLabel):
+        bilou_codec.encode('B-ORG')
+    with pytest.raises(UnexpectedLabel):
+        bilou_codec.encode('I')
+    with pytest.raises(UnexpectedLabel):
+        LabelCodec(['PER'], scheme='IOB2').encode('L-PER')
+    with pytest.raises(ValueError):
+        LabelCodec(['PER'], scheme='IOX')
+    with pytest.raises(ValueError):
+        LabelCodec(['PER', 'PER'])
+    with pytest.raises(ValueError):
+        LabelCodec(['PER'], scheme='IOB1').span_tag_ids('PER')
+
+def test_codec_many(bilou_codec : LabelCodec) -> None:
+    labels = ['O', 'B-PER', 'L-PER', 'O', 'U-LOC']
+    ids = bilou_codec.encode_many(labels)
+    assert(ids.dtype == bilou_codec.dtype)
+    assert(list(ids) == [0, 1, 3, 0, 8])
+    assert(bilou_codec.decode_many(ids) == labels)
+
+def test_codec_from_labels() -> None:
+    codec = LabelCodec.from_labels(['O', 'B-LOC', 'I', 'U-PER', 'L-LOC'],
+            scheme='IOB2')
+    assert(codec == LabelCodec(['LOC', 'PER'], scheme='IOB2'))
+    assert(codec.span_tag_ids('PER') == (3, 4, 4, 3))
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,135 @@
+"""
+test routines for repair.py, and the repair option of
+iob2spans and the ids2spans decoders
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import random
+
+from collections import Counter
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.ids2spans import ids2table, iob2spans_batch
+from label_alignment.iob_state import UnexpectedLabel
+from label_alignment.label_codec import LabelCodec
+from label_alignment.repair import repair_labels
+from label_alignment.span_annotation import SpanAnnotation
+from label_alignment.tok2spans import iob2spans, iob2table
+
+
+def test_repair_labels() -> None:
+    labels = ['O', 'L-PER', 'I-LOC', 'L-LOC', 'X-LOC', 'B-PER', 'I-LOC', 'E']
+    repairs : Counter = Counter()
+    assert(repair_labels(labels, 'convert', repairs) == [
+        'O', 'U-PER', 'B-LOC', 'L-LOC', 'O', 'B-PER', 'B-LOC', 'E'])
+    assert(repairs == Counter(stray_end=1, orphan_inside=2, unknown=1))
+    assert(repair_labels(labels, 'drop', repairs) == [
+        'O', 'O', 'O', 'O', 'O', 'B-PER', 'O', 'O'])
+    # drop: the L-LOC and E are stray once the I before them is dropped
+    assert(repairs == Counter(stray_end=4, orphan_inside=4, unknown=2))
+    with pytest.raises(ValueError):
+        repair_labels(labels, 'ignore')
+
+def test_iob2spans_repair() -> None:
+    tokens = ['a', 'b', 'c', 'd']
+    labels = ['L-PER', 'O', 'B-LOC', 'L-LOC']
+    with pytest.raises(UnexpectedLabel):
+        list(iob2spans(tokens, labels))
+    repairs : Counter = Counter()
+    for engine in ('state', 'table'):
+        assert(list(iob2spans(tokens, labels, engine=engine,
+            repair='convert', repairs=repairs)) == [
+                SpanAnnotation(start=0, end=1, label='PER'),
+                SpanAnnotation(start=4, end=7, label='LOC'),
+                ])
+    assert(list(iob2spans(tokens, labels, repair='drop', repairs=repairs))
+            == [SpanAnnotation(start=4, end=7, label='LOC')])
+    assert(repairs == Counter(stray_end=3))
+    assert(iob2table(tokens, labels, repair='drop').to_annotations()
+            == [SpanAnnotation(start=4, end=7, label='LOC')])
+
+@pytest.mark.parametrize('policy', ['convert', 'drop'])
+def test_table_repair_matches_state(policy : str) -> None:
+    # the table engine repairs in its transitions, without repair_labels
+    rng = random.Random(policy)
+    pool = ['O', 'B-PER', 'I-PER', 'E-PER', 'L-LOC', 'I-LOC', 'U-LOC',
+            'B', 'I', 'E', 'I-CHUNK', 'X-PER', 'S-PER']
+    for trial in range(300):
+        n_tokens = rng.randint(0, 12)
+        tokens = ['ab'] * n_tokens
+        labels = [rng.choice(pool) for i in range(n_tokens)]
+        expected_repairs : Counter = Counter()
+        expected = list(iob2spans(tokens, labels, engine='state',
+            repair=policy, repairs=expected_repairs))
+        repairs : Counter = Counter()
+        assert(list(iob2spans(tokens, labels, engine='table',
+            repair=policy, repairs=repairs)) == expected)
+        assert(iob2table(tokens, labels, repair=policy,
+            repairs=repairs).to_annotations() == expected)
+        assert(repairs == expected_repairs + expected_repairs)
+
+@pytest.mark.parametrize('scheme', ['IOB2', 'IOBES', 'BILOU'])
+@pytest.mark.parametrize('policy', ['convert', 'drop'])
+def test_ids_repair_matches_labels(scheme : str, policy : str) -> None:
+    rng = random.Random(scheme + policy)
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    for trial in range(200):
+        n_tokens = rng.randint(0, 12)
+        tag_ids : np.ndarray = np.array([rng.randrange(len(codec))
+            for i in range(n_tokens)], dtype=codec.dtype)
+        labels = codec.decode_many(tag_ids)
+        expected_repairs : Counter = Counter()
+        expected = list(iob2spans(['x'] * n_tokens, labels, repair=policy,
+            repairs=expected_repairs))
+        repairs : Counter = Counter()
+        table = ids2table(tag_ids, codec, lengths=np.ones(n_tokens),
+                repair=policy, repairs=repairs)
+        assert(table.to_annotations() == expected)
+        assert(repairs == expected_repairs)
+
+@pytest.mark.parametrize('scheme', ['IOE1', 'IOE2'])
+@pytest.mark.parametrize('policy', ['convert', 'drop'])
+def test_ids_repair_ending_schemes(scheme : str, policy : str) -> None:
+    # a lone E, or an I after O, is normal in IOE1 and IOE2, so
+    # there is nothing to repair
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    tag_ids = codec.encode_many(['E-PER', 'O', 'I-LOC', 'O', 'I-PER', 'E-LOC'])
+    table = ids2table(tag_ids, codec, lengths=np.ones(len(tag_ids)))
+    assert(len(table) == 4)
+    with pytest.raises(ValueError):
+        ids2table(tag_ids, codec, lengths=np.ones(len(tag_ids)),
+                repair=policy)
+    with pytest.raises(ValueError):
+        iob2spans_batch(tag_ids[None, :], codec, repair=policy)
+
+@pytest.mark.parametrize('policy', ['convert', 'drop'])
+def test_batch_repair(policy : str) -> None:
+    rng = np.random.default_rng(18)
+    codec = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    tag_ids = rng.integers(0, len(codec), size=(30, 10))
+    mask = rng.random((30, 10)) < 0.8
+    batch_repairs : Counter = Counter()
+    table = iob2spans_batch(tag_ids, codec, attention_mask=mask,
+            repair=policy, repairs=batch_repairs)
+    assert(sum(batch_repairs.values()) > 0)
+    row_repairs : Counter = Counter()
+    for doc, doc_table in enumerate(table.documents(len(tag_ids))):
+        keep = np.flatnonzero(mask[doc])
+        expected = ids2table(tag_ids[doc, keep], codec, offsets=np.stack(
+            [keep, keep + 1], axis=-1), repair=policy, repairs=row_repairs)
+        assert(doc_table == expected)
+    assert(batch_repairs == row_repairs)
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,96 @@
+"""
+Testing SpanTable from span_table
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.span_annotation import SpanAnnotation, SpanScores
+from label_alignment.span_table import SpanTable, SpanTableBuilder
+from label_alignment.tok2spans import iob2spans, iob2table
+from label_alignment.types import LabeledSpan
+
+
+@pytest.fixture
+def annos() -> List[SpanAnnotation]:
+    return [SpanAnnotation(start=0, end=8, label='person'),
+            SpanAnnotation(start=20, end=26, label='vessel'),
+            SpanAnnotation(start=30, end=38, label='person')]
+
+def test_table_from_annotations(annos : List[SpanAnnotation]) -> None:
+    table = SpanTable.from_annotations(annos)
+    assert(len(table) == 3)
+    assert(table.labels == ('person', 'vessel'))
+    assert(list(table.label_ids) == [0, 1, 0])
+    assert(table[1] == annos[1])
+    assert(list(table) == annos)
+    assert(table.to_annotations() == annos)
+    labeled = [anno.to_labeled_span() for anno in annos]
+    assert(table.to_labeled_spans() == labeled)
+    assert(SpanTable.from_annotations(labeled) == table)
+    assert(table.nbytes == 3 * (8 + 8 + 4))
+
+def test_table_from_scored_annotations(annos : List[SpanAnnotation]
+        ) -> None:
+    scored = [SpanAnnotation(start=a.start, end=a.end, label=a.label,
+        scores=SpanScores(0.5 + i / 10, 0.5, 0.25))
+        for i, a in enumerate(annos)]
+    table = SpanTable.from_annotations(scored)
+    assert(table.scores is not None)
+    assert(list(table.scores.mean) == [0.5, 0.6, 0.7])
+    assert([anno.scores for anno in table] == [a.scores for a in scored])
+    # scores only if every annotation has them
+    assert(SpanTable.from_annotations(scored[:2] + annos[2:]).scores is None)
+    assert(SpanTable.from_annotations(annos).scores is None)
+
+def test_table_slicing(annos : List[SpanAnnotation]) -> None:
+    table = SpanTable.from_annotations(annos)
+    assert(list(table[1:]) == annos[1:])
+    people = table[table.label_ids == 0]
+    assert(list(people) == [annos[0], annos[2]])
+    assert(list(table.shifted(5)) == [SpanAnnotation(start=a.start + 5,
+        end=a.end + 5, label=a.label) for a in annos])
+
+def test_table_equality(annos : List[SpanAnnotation]) -> None:
+    table = SpanTable.from_annotations(annos)
+    other = SpanTable.from_annotations(annos, labels=['vessel', 'person'])
+    assert(list(other.label_ids) == [1, 0, 1])
+    assert(table == other)
+    assert(table != table[:2])
+
+def test_table_concatenate(annos : List[SpanAnnotation]) -> None:
+    first = SpanTable.from_annotations(annos[:2])
+    second = SpanTable.from_annotations(annos[2:] 
+            + [SpanAnnotation(start=40, end=41, label='date')])
+    joined = SpanTable.concatenate([first, second], offsets=[0, 100])
+    assert(joined.labels == ('person', 'vessel', 'date'))
+    assert(joined.label_strings() == ['person', 'vessel', 'person', 'date'])
+    assert(list(joined.starts) == [0, 20, 130, 140])
+    assert(len(SpanTable.concatenate([])) == 0)
+
+def test_builder() -> None:
+    builder = SpanTableBuilder()
+    builder.add(0, 3, 'X')
+    first = builder.build()
+    builder.add(4, 5, 'Y')
+    assert(len(first) == 1)
+    assert(len(builder.build()) == 2)
+
+def test_iob2table() -> None:
+    tokens = ['Ned', 'Land', 'boarded', 'the', 'Monroe']
+    labels = ['B-person', 'L-person', 'O', 'O', 'U-vessel']
+    table = iob2table(tokens, labels)
+    assert(list(table) == list(iob2spans(tokens, labels)))
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,72 @@
+"""
+test routines for subwords.py (and iob2spans with subwords)
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+from typing import (
+        Sequence, Mapping, 
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+import numpy as np
+
+from label_alignment.span_annotation import SpanAnnotation
+from label_alignment.subwords import (SUBWORD_RULES, subword_offsets,
+        subword_rule)
+from label_alignment.tok2spans import iob2spans, iob2table
+
+TEXT = "Nemo commanded the Nautilus"
+
+# the same text, as each kind of tokenizer might split it
+TOKENIZED = {
+        'space': ["Nemo", "commanded", "the", "Nautilus"],
+        'wordpiece': ["Nemo", "command", "##ed", "the", "Na", "##ut", "##ilus"],
+        'sentencepiece': ["▁Nemo", "▁command", "ed", "▁the", "▁Na", "ut", "ilus"],
+        'bytelevel': ["Nemo", "Ġcommand", "ed", "Ġthe", "ĠNa", "ut", "ilus"],
+        }
+
+@pytest.mark.parametrize('rule', sorted(TOKENIZED))
+def test_subword_offsets(rule) -> None:
+    tokens = TOKENIZED[rule]
+    offsets = subword_offsets(tokens, rule)
+    assert(offsets.shape == (len(tokens), 2))
+    marker = SUBWORD_RULES[rule].marker
+    for token, (start, end) in zip(tokens, offsets.tolist()):
+        if marker and token.startswith(marker):
+            token = token[len(marker):]
+        assert(TEXT[start:end] == token)
+
+@pytest.mark.parametrize('engine', ['state', 'table'])
+def test_iob2spans_subwords(engine) -> None:
+    tokens = TOKENIZED['wordpiece']
+    labels = ["U-PER", "O", "O", "O", "B-SHIP", "I-SHIP", "L-SHIP"]
+    expected = [SpanAnnotation(start=0, end=4, label="PER"),
+            SpanAnnotation(start=19, end=27, label="SHIP")]
+    spans = list(iob2spans(tokens, labels, engine=engine,
+        subwords='wordpiece'))
+    assert(spans == expected)
+    assert([TEXT[s.start:s.end] for s in spans] == ["Nemo", "Nautilus"])
+    table = iob2table(tokens, labels, subwords=SUBWORD_RULES['wordpiece'])
+    assert(table.to_annotations() == expected)
+
+def test_space_rule_matches_default() -> None:
+    tokens = ["A", "bb", "ccc", "d"]
+    labels = ["B-X", "I-X", "O", "U-Y"]
+    assert(list(iob2spans(tokens, labels, subwords='space'))
+            == list(iob2spans(tokens, labels)))
+
+def test_subwords_errors() -> None:
+    with pytest.raises(ValueError):
+        subword_rule('morfessor')
+    with pytest.raises(ValueError):
+        list(iob2spans(["a"], ["O"], offsets=[(0, 1)], subwords='wordpiece'))
+    assert(subword_offsets([], 'wordpiece').shape == (0, 2))
+
+
+
+# vim: et ai si sts=4   
@@ -0,0 +1,101 @@
+"""
+test routines for validate.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.label_codec import LabelCodec
+from label_alignment.schemes import SCHEMES
+from label_alignment.validate import NOT_IN_SCHEME, validate
+from label_alignment.viterbi import transition_mask
+
+
+def naive_violations(sequences : Sequence[np.ndarray],
+        codec : LabelCodec) -> List[Tuple[int, int, int, int]]:
+    allowed = transition_mask(codec)
+    found : List[Tuple[int, int, int, int]] = []
+    for doc, seq in enumerate(sequences):
+        tags : List[int] = [int(tag) for tag in seq]
+        for position, tag in enumerate(tags):
+            prev = tags[position - 1] if position else 0
+            if not allowed[prev, tag]:
+                found.append((doc, position, prev, tag))
+        if tags and not allowed[tags[-1], 0]:
+            found.append((doc, len(tags), tags[-1], 0))
+    return found
+
+def as_tuples(violations) -> List[Tuple[int, int, int, int]]:
+    return list(zip(*(column.tolist() for column in violations)))
+
+@pytest.mark.parametrize('scheme', sorted(SCHEMES))
+def test_validate_matches_naive(scheme : str) -> None:
+    rng = np.random.default_rng(19)
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    sequences = [rng.integers(0, len(codec), size=rng.integers(0, 8))
+            for i in range(300)]
+    expected = naive_violations(sequences, codec)
+    if scheme != 'IO':
+        assert(expected)
+    assert(as_tuples(validate(sequences, codec)) == expected)
+    flat = np.concatenate(sequences)
+    lengths = [len(tags) for tags in sequences]
+    assert(as_tuples(validate(flat, codec, lengths=lengths)) == expected)
+    strings = [codec.decode_many(tags) for tags in sequences]
+    assert(as_tuples(validate(strings, codec)) == expected)
+
+def test_validate_strings() -> None:
+    labels = [['B-PER', 'I-PER', 'O'], ['O', 'I-LOC'], [], ['B-LOC', 'L-LOC']]
+    violations = validate(labels, scheme='IOB2')
+    assert(list(violations.docs) == [1, 3])
+    assert(list(violations.positions) == [1, 1])
+    assert(violations.tag_ids[-1] == NOT_IN_SCHEME)
+    assert(len(validate(labels[:1], scheme='IOB2').docs) == 0)
+    bilou = validate([['B-PER', 'I-PER']], scheme='BILOU')
+    # a chunk left open at the end of the sequence
+    assert(list(bilou.positions) == [2])
+    assert(list(bilou.tag_ids) == [0])
+    with pytest.raises(ValueError):
+        validate([np.array([0, 1])], scheme='IOB2')
+
+def test_validate_other_prefixes() -> None:
+    # codec.encode accepts S/U and E/L for each other, but
+    # validation doesn't
+    iobes = [['S-PER', 'O', 'B-PER', 'E-PER']]
+    bilou = [['U-PER', 'O', 'B-PER', 'L-PER']]
+    assert(len(validate(iobes, scheme='IOBES').docs) == 0)
+    assert(len(validate(bilou, scheme='BILOU').docs) == 0)
+    violations = validate(iobes, scheme='BILOU')
+    assert(list(violations.positions) == [0, 3])
+    assert(list(violations.tag_ids) == [NOT_IN_SCHEME] * 2)
+    violations = validate(bilou, LabelCodec(['PER'], scheme='IOBES'))
+    assert(list(violations.positions) == [0, 3])
+    assert(list(violations.tag_ids) == [NOT_IN_SCHEME] * 2)
+
+def test_validate_many_classes() -> None:
+    # enough tags that pairs of tag ids overflow the codec's dtype
+    codec = LabelCodec([f'C{i}' for i in range(100)], scheme='IOBES')
+    rng = np.random.default_rng(20)
+    sequences : List[np.ndarray] = [
+            rng.integers(0, len(codec), size=6).astype(codec.dtype)
+            for i in range(50)]
+    expected = naive_violations(sequences, codec)
+    assert(as_tuples(validate(sequences, codec)) == expected)
+    # ids outside the codec are reported as not in the scheme
+    flat : np.ndarray = np.array([0, 0, len(codec) + 5, 0], dtype=codec.dtype)
+    violations = validate(flat, codec, lengths=[4])
+    assert(NOT_IN_SCHEME in violations.tag_ids.tolist())
+    assert(list(violations.positions) == [2])
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,121 @@
+"""
+test routines for viterbi.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import itertools
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.ids2spans import chunk_token_bounds, iob2spans_batch
+from label_alignment.label_codec import LabelCodec
+from label_alignment.schemes import SCHEMES
+from label_alignment.viterbi import (transition_mask, viterbi_decode,
+        viterbi_spans)
+
+
+def is_legal(path : Sequence[int], allowed : np.ndarray) -> bool:
+    tags = [0] + list(path) + [0]
+    return all(allowed[prev, tag] for prev, tag in zip(tags[:-1], tags[1:]))
+
+def path_score(path : Sequence[int], log_probs : np.ndarray) -> float:
+    return float(sum(log_probs[t, tag] for t, tag in enumerate(path)))
+
+def random_log_probs(rng, shape) -> np.ndarray:
+    logits = rng.normal(size=shape)
+    return logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+
+@pytest.mark.parametrize('scheme', sorted(SCHEMES))
+def test_viterbi_matches_brute_force(scheme : str) -> None:
+    rng = np.random.default_rng(16)
+    codec = LabelCodec(['PER', 'LOC'] if len(SCHEMES[scheme]) < 4
+            else ['PER'], scheme=scheme)
+    allowed = transition_mask(codec)
+    for n_tokens in range(5):
+        log_probs = random_log_probs(rng, (3, n_tokens, len(codec)))
+        paths = viterbi_decode(log_probs, codec)
+        assert(paths.shape == (3, n_tokens))
+        for row, path in zip(log_probs, paths):
+            assert(is_legal(path, allowed))
+            best = max(path_score(p, row) for p in
+                    itertools.product(range(len(codec)), repeat=n_tokens)
+                    if is_legal(p, allowed))
+            assert(path_score(path, row) == pytest.approx(best))
+
+@pytest.mark.parametrize('scheme', ['IOB2', 'BILOU'])
+def test_viterbi_mask(scheme : str) -> None:
+    rng = np.random.default_rng(17)
+    codec = LabelCodec(['PER', 'LOC', 'ORG'], scheme=scheme)
+    log_probs = random_log_probs(rng, (6, 20, len(codec)))
+    mask = rng.random((6, 20)) < 0.7
+    mask[0] = False
+    paths = viterbi_decode(log_probs, codec, mask=mask)
+    assert((paths[~mask] == -100).all())
+    for row, row_mask, path in zip(log_probs, mask, paths):
+        # same as decoding only the unmasked positions
+        assert(list(path[row_mask]) == list(viterbi_decode(row[row_mask],
+            codec)))
+
+def test_viterbi_repairs_argmax() -> None:
+    codec = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    labels = ['O', 'L-PER', 'B-PER', 'I-LOC', 'L-PER', 'O']
+    # argmax gives an illegal sequence, but only just
+    log_probs = np.full((len(labels), len(codec)), np.log(0.05))
+    for t, label in enumerate(labels):
+        log_probs[t, codec.encode(label)] = np.log(0.4)
+    log_probs[1, codec.encode('O')] = np.log(0.3)
+    log_probs[3, codec.encode('I-PER')] = np.log(0.3)
+    path = viterbi_decode(log_probs, codec)
+    assert(codec.decode_many(path)
+            == ['O', 'O', 'B-PER', 'I-PER', 'L-PER', 'O'])
+    with pytest.raises(ValueError):
+        viterbi_decode(log_probs[:, :-1], codec)
+
+def test_viterbi_spans() -> None:
+    rng = np.random.default_rng(18)
+    codec = LabelCodec(['PER', 'LOC'], scheme='BILOU')
+    log_probs = random_log_probs(rng, (8, 32, len(codec)))
+    attention_mask = np.arange(32)[None, :] < rng.integers(2, 33, 8)[:, None]
+    special = np.zeros_like(attention_mask)
+    special[:, 0] = True
+    table = viterbi_spans(log_probs, codec, attention_mask=attention_mask,
+            special_tokens_mask=special)
+    valid = attention_mask & ~special
+    expected = iob2spans_batch(viterbi_decode(log_probs, codec, mask=valid),
+            codec, attention_mask=valid)
+    assert(table == expected)
+    assert(table.scores is not None)
+    assert(((0 < table.scores.product) & (table.scores.product <= table.scores.min)
+        & (table.scores.min <= table.scores.mean) & (table.scores.mean <= 1)).all())
+
+@pytest.mark.parametrize('scheme', ['IOE1', 'IOE2'])
+def test_viterbi_spans_ending_schemes(scheme : str) -> None:
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    if scheme == 'IOE2':
+        # the best path starts with a (legal) single-token E
+        log_probs = np.full((1, 3, len(codec)), np.log(0.05))
+        for t, label in enumerate(['E-PER', 'O', 'O']):
+            log_probs[0, t, codec.encode(label)] = np.log(0.8)
+        table = viterbi_spans(log_probs, codec)
+        assert((table.starts.tolist(), table.ends.tolist()) == ([0], [1]))
+        assert(table.labels[table.label_ids[0]] == 'PER')
+    # decoding never rejects the constrained paths
+    rng = np.random.default_rng(19)
+    log_probs = random_log_probs(rng, (16, 12, len(codec)))
+    table = viterbi_spans(log_probs, codec)
+    paths = viterbi_decode(log_probs, codec)
+    assert(len(table) == sum(len(chunk_token_bounds(path, codec)[0])
+        for path in paths))
+
+
+# vim: et ai si sts=4
@@ -0,0 +1,130 @@
+"""
+test routines for windows.py
+
+Copyright (C) 2024-present David C. Fox <talk2dfox@gmail.com>
+"""
+import pytest
+
+import numpy as np
+
+from typing import (
+        Sequence, Mapping,
+        Callable,
+        Union, Optional,
+        Dict, Set, List, Tuple,
+        Protocol,
+        )
+
+from label_alignment.convert import encode_chunks
+from label_alignment.ids2spans import iob2spans_batch
+from label_alignment.label_codec import LabelCodec
+from label_alignment.schemes import SCHEMES
+from label_alignment.validate import validate
+from label_alignment.windows import (plan_windows, window_tag_ids,
+        windows2spans)
+
+
+def random_tag_ids(rng, n_tokens : int, codec : LabelCodec) -> np.ndarray:
+    """
+    well-formed tag ids with chunks of up to 12 tokens
+    """
+    firsts, lasts, classes = [], [], []
+    i = 0
+    while i < n_tokens:
+        i += int(rng.integers(0, 4))
+        if i >= n_tokens:
+            break
+        last = min(n_tokens - 1, i + int(rng.integers(0, 12)))
+        firsts.append(i)
+        lasts.append(last)
+        classes.append(int(rng.integers(0, len(codec.classes))))
+        i = last + 1
+    return encode_chunks(np.array(firsts, dtype=np.int64),
+            np.array(lasts, dtype=np.int64), np.array(classes), n_tokens, codec)
+
+@pytest.mark.parametrize('max_len, stride', [(8, 8), (8, 5), (8, 1), (7, 4)])
+def test_plan_windows(max_len : int, stride : int) -> None:
+    lengths = [0, 1, 7, 8, 9, 30, 0]
+    windows = plan_windows(lengths, max_len, stride)
+    assert(0 not in windows.docs.tolist() and 6 not in windows.docs.tolist())
+    assert((windows.ends - windows.starts <= max_len).all())
+    for doc, n_tokens in enumerate(lengths):
+        mine = windows.docs == doc
+        starts = windows.starts[mine]
+        if not n_tokens:
+            continue
+        assert(starts.tolist() == list(range(0, len(starts) * stride, stride)))
+        assert(windows.ends[mine][-1] == n_tokens)
+        # owned ranges tile the document, inside their windows
+        own_starts = windows.own_starts[mine]
+        own_ends = windows.own_ends[mine]
+        assert(own_starts[0] == 0 and own_ends[-1] == n_tokens)
+        assert((own_starts[1:] == own_ends[:-1]).all())
+        assert((own_starts >= starts).all())
+        assert((own_ends <= windows.ends[mine]).all())
+    with pytest.raises(ValueError):
+        plan_windows(lengths, 4, 5)
+
+def test_gather_merge() -> None:
+    windows = plan_windows([5, 0, 12], 4, 3)
+    values = np.arange(17) * 10
+    gathered = windows.gather(values, pad=-1)
+    assert(gathered.shape == (len(windows.docs), 4))
+    assert(gathered[0].tolist() == [0, 10, 20, 30])
+    assert(gathered[1].tolist() == [30, 40, -1, -1])
+    assert((windows.merge(gathered) == values).all())
+    offsets = np.stack([values, values + 5], axis=1)
+    assert((windows.merge(windows.gather(offsets)) == offsets).all())
+
+@pytest.mark.parametrize('stride', [1, 7, 10, 14])
+@pytest.mark.parametrize('scheme', sorted(SCHEMES))
+def test_windows_round_trip(scheme : str, stride : int) -> None:
+    rng = np.random.default_rng(21)
+    codec = LabelCodec(['PER', 'LOC'], scheme=scheme)
+    lengths = rng.integers(0, 100, size=20)
+    docs = [random_tag_ids(rng, n, codec) for n in lengths.tolist()]
+    tag_ids = np.concatenate(docs)
+    # (windows overlapping by at least 2 tokens, from 15 down to 2)
+    windows = plan_windows(lengths, 16, stride)
+    labels = window_tag_ids(tag_ids, windows, codec)
+    assert(labels.shape == (len(windows.docs), 16))
+    # each window is valid on its own
+    rows = [row[row != -100] for row in labels]
+    assert(len(validate(rows, codec).docs) == 0)
+    # perfect predictions decode to the spans of whole documents
+    padded = np.full((len(docs), max(lengths)), -100)
+    for row, doc_ids in zip(padded, docs):
+        row[:len(doc_ids)] = doc_ids
+    expected = iob2spans_batch(padded, codec, attention_mask=padded != -100)
+    assert(windows2spans(labels, windows, codec) == expected)
+
+def test_windows2spans_ioe() -> None:
+    # window_tag_ids cuts the I-PER, E-PER chunk into single-token
+    # chunks, whose E must decode (and merge back) too
+    codec = LabelCodec(['PER'], scheme='IOE2')
+    tag_ids = codec.encode_many(['O', 'E-PER', 'O', 'I-PER', 'E-PER', 'O'])
+    windows = plan_windows([6], 4, 2)
+    labels = window_tag_ids(tag_ids, windows, codec)
+    assert(codec.decode_many(labels[0]) == ['O', 'E-PER', 'O', 'E-PER'])
+    table = windows2spans(labels, windows, codec)
+    assert((table.starts.tolist(), table.ends.tolist()) == ([1, 3], [2, 5]))
+
+def test_windows2spans_offsets_scores() -> None:
+    codec = LabelCodec(['PER'], scheme='BILOU')
+    labels = ['O', 'B-PER', 'I-PER', 'I-PER', 'I-PER', 'L-PER', 'O']
+    tag_ids = codec.encode_many(labels)
+    windows = plan_windows([7], 4, 2)
+    # the last window disagrees, but only where it doesn't own tokens
+    predictions = window_tag_ids(tag_ids, windows, codec)
+    predictions[-1, 0] = codec.encode('U-PER')
+    offsets = np.stack([np.arange(7) * 4, np.arange(7) * 4 + 3], axis=1)
+    scores = np.full(predictions.shape, 0.5)
+    table = windows2spans(predictions, windows, codec, offsets=offsets,
+            token_scores=scores)
+    assert(table.starts.tolist() == [4] and table.ends.tolist() == [23])
+    assert(table.scores is not None)
+    assert(table.scores.mean.tolist() == [0.5])
+
+
+
+# vim: et ai si sts=4